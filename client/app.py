@@ -7,6 +7,8 @@ The client is also capable to handle commands from the server and interacts with
 containers.
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from logging import getLogger
 import threading
 from uuid import getnode
@@ -16,15 +18,33 @@ import socketio
 from socketio.exceptions import BadNamespaceError, ConnectionError as SocketConnectionError
 from decentralized_logger import setup_logging, disable_loggers, level_translator
 
-from device import Device
+from backoff import Backoff, time_to_next_push
+from device import Device, parse_labels
+from profiler import SamplingProfiler
+from telemetry_buffer import TelemetryBuffer
+from tracing import Tracer
+import wire_format
 
 APPLICATION_NAME = "fleet-manager-client"
 
 # Environment variables
 PUSH_INTERVAL = int(os.getenv("PUSH_INTERVAL", "60"))
 DEVICE_NAME = os.getenv("DEVICE_NAME", "John Doe")
+DEVICE_LABELS = parse_labels(os.getenv("DEVICE_LABELS", ""))
+CONTAINER_STATS_WINDOW = float(os.getenv("CONTAINER_STATS_WINDOW", "60"))
 FM_SERVER_ADDRESS = os.getenv("FLEET_MANAGER_SERVER_ADDRESS", "127.0.0.1")
 FM_SERVER_PORT = os.getenv("FLEET_MANAGER_SERVER_PORT", "5010")
+RECONNECT_DELAY_MIN = float(os.getenv("RECONNECT_DELAY_MIN", "1"))
+RECONNECT_DELAY_MAX = float(os.getenv("RECONNECT_DELAY_MAX", "60"))
+COMMAND_CONCURRENCY = int(os.getenv("COMMAND_CONCURRENCY", "4"))
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "1000"))
+TELEMETRY_BUFFER_FILE = os.getenv("TELEMETRY_BUFFER_FILE")
+TELEMETRY_BUFFER_FILE_SIZE = int(os.getenv("TELEMETRY_BUFFER_FILE_SIZE", str(1024 * 1024)))
+ROLLBACK_DEPTH = int(os.getenv("ROLLBACK_DEPTH", "2"))
+ROLLBACK_DISK_BUDGET = int(os.getenv("ROLLBACK_DISK_BUDGET", str(2 * 1024**3)))
+ROLLBACK_FILE = os.getenv("ROLLBACK_FILE")
+TRACE_FILE = os.getenv("TRACE_FILE")
+DISK_USAGE_INTERVAL = float(os.getenv("DISK_USAGE_INTERVAL", "300"))
 
 ENABLE_LOG_SERVER = os.getenv("ENABLE_LOG_SERVER", "False").lower() in ("true", "1")
 LOG_SERVER_IP = os.getenv("LOG_SERVER_IP", "127.0.0.1")
@@ -49,40 +69,129 @@ setup_logging(
 )
 
 log = getLogger(APPLICATION_NAME) # pylint: disable=invalid-name
-socket_io = socketio.Client() # pylint: disable=invalid-name
+socket_io = socketio.Client(    # pylint: disable=invalid-name
+    reconnection_delay=RECONNECT_DELAY_MIN,
+    reconnection_delay_max=RECONNECT_DELAY_MAX,
+    randomization_factor=0.5
+)
 
-class FleetManagerClient(threading.Thread):
+class FleetManagerClient(threading.Thread): # pylint: disable=too-many-instance-attributes
     """Handles telemetry events and sends telemetry to the server based on the push interval.
 
-    New thread is started to handle the push events
+    New thread is started to handle the push events. Pushes are made in a fixed slot within
+    the push interval, derived from the device ID, to spread the pushes across the fleet.
 
     Args:
         push_interval (int): Push interval for the telemetry
+        device_id (str): Device ID, used to select the push slot
     """
 
     SERVER_ENDPOINT = "entry"
 
-    def __init__(self, push_interval) -> None:
+    def __init__(self, push_interval, device_id) -> None:
         threading.Thread.__init__(self)
 
+        self.configured_push_interval = push_interval
         self.push_interval = push_interval
+        self.heartbeat_interval = None
+        self.device_id = device_id
         self.event = threading.Event()
+        self._reschedule = False
+        # Filled from the socket and command threads, taken by the push thread
+        self._pending_lock = threading.Lock()
+        self.traces = []
+        self.refresh_ids = []
         self.log = getLogger(self.__class__.__name__)
 
     def run(self):
         self.log.info("Starting fleet manager client")
         while True:
-            start = time.time()
+            timeout = time_to_next_push(self.device_id, self.push_interval)
+            send_heartbeat = self.heartbeat_interval is not None and \
+                self.heartbeat_interval < timeout
+            if send_heartbeat:
+                timeout = self.heartbeat_interval
+
+            if self.event.wait(timeout=timeout):
+                self.event.clear()
+                if self._reschedule:
+                    self._reschedule = False
+                    continue
+            elif send_heartbeat:
+                heartbeat({"id": self.device_id})
+                continue
 
             device.update()
             device_summary_object = device.information()
             device_summary_object["push_interval"] =  self.push_interval
+            device_summary_object["configured_push_interval"] = self.configured_push_interval
+            with self._pending_lock:
+                traces, self.traces = self.traces, []
+                refresh_ids, self.refresh_ids = self.refresh_ids, []
+            if traces:
+                device_summary_object["traces"] = traces
+            if refresh_ids:
+                device_summary_object["refresh_ids"] = refresh_ids
 
             self.log.debug("New device object created: %s", device_summary_object)
             telemetry(device_summary_object)
 
-            self.event.clear()
-            self.event.wait(timeout=max(self.push_interval - (time.time() - start), 0))
+    def set_intervals(self, push_interval: float, heartbeat_interval: float = None) -> None:
+        """Sets the push interval and heartbeat interval decided by the server
+
+        Args:
+            push_interval (float): Push interval in seconds
+            heartbeat_interval (float, optional): Heartbeat interval in seconds.
+                Defaults to None, no heartbeats.
+        """
+        if (push_interval, heartbeat_interval) == (self.push_interval, self.heartbeat_interval):
+            return
+        self.log.info('Push interval set to %s s, heartbeat interval set to %s s',
+            push_interval, heartbeat_interval)
+        self.push_interval = push_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._reschedule = True
+        self.event.set()
+
+    def reset_intervals(self) -> None:
+        """Reverts to the configured push interval, for example when the connection
+        to the server is lost"""
+        self.set_intervals(self.configured_push_interval)
+
+    def trace_telemetry(self, context: dict) -> None:
+        """Adds a trace context to the next telemetry post, which ends the trace of a command
+        on the server when the telemetry reflects the result of the command
+
+        Args:
+            context (dict): Trace context, with the time the command ended as ``ended``
+        """
+        with self._pending_lock:
+            self.traces.append(context)
+
+    def refresh_telemetry(self, refresh_id: str) -> None:
+        """Sends a telemetry post right away, as answer to a refresh request from the server
+
+        Args:
+            refresh_id (str): Refresh ID, returned in the telemetry post
+        """
+        with self._pending_lock:
+            self.refresh_ids.append(refresh_id)
+        self.event.set()
+
+    def retry_telemetry(self, telemetry_post: dict, delay: float) -> None:
+        """Sends a new telemetry post after a delay, when the server rejected a post. The trace
+        contexts and refresh IDs of the rejected post are carried over to the new post
+
+        Args:
+            telemetry_post (dict): Rejected telemetry post
+            delay (float): Delay in seconds
+        """
+        with self._pending_lock:
+            self.traces.extend(telemetry_post.get("traces", []))
+            self.refresh_ids.extend(telemetry_post.get("refresh_ids", []))
+        timer = threading.Timer(delay, self.send_telemetry)
+        timer.daemon = True
+        timer.start()
 
     def send_telemetry(self):
         """
@@ -96,8 +205,87 @@ def fleet_manager_server_url():
     return f'http://{FM_SERVER_ADDRESS}:{FM_SERVER_PORT}'
 
 
-fleet_manager = FleetManagerClient(PUSH_INTERVAL)
-device = Device(fleet_manager_server_url(), DEVICE_NAME, DEVICE_ID)
+def send_span(span):
+    """Exports a finished span to the server
+
+    Args:
+        span (dict): Finished span
+    """
+    try:
+        socket_io.emit('spans', [span])
+    except BadNamespaceError:
+        log.debug('Could not send span to server at %s', fleet_manager_server_url())
+
+
+fleet_manager = FleetManagerClient(PUSH_INTERVAL, DEVICE_ID)
+tracer = Tracer(APPLICATION_NAME, send_span, TRACE_FILE, {"device_id": DEVICE_ID}) # pylint: disable=invalid-name
+device = Device(
+    fleet_manager_server_url(), DEVICE_NAME, DEVICE_ID, DEVICE_LABELS, CONTAINER_STATS_WINDOW,
+    {"depth": ROLLBACK_DEPTH, "disk_budget": ROLLBACK_DISK_BUDGET, "path": ROLLBACK_FILE}, tracer,
+    DISK_USAGE_INTERVAL
+)
+profiler = SamplingProfiler() # pylint: disable=invalid-name
+telemetry_encoder = wire_format.TelemetryEncoder()   # pylint: disable=invalid-name
+telemetry_buffer = TelemetryBuffer(   # pylint: disable=invalid-name
+    TELEMETRY_BUFFER_SIZE, TELEMETRY_BUFFER_FILE, TELEMETRY_BUFFER_FILE_SIZE
+)
+telemetry_retry_backoff = Backoff(RECONNECT_DELAY_MIN, RECONNECT_DELAY_MAX) # pylint: disable=invalid-name
+use_binary_telemetry = False    # pylint: disable=invalid-name
+first_connection = True # pylint: disable=invalid-name
+
+@socket_io.event
+def connect():
+    """Connection established. The string dictionary of the binary wire format is per
+    connection and JSON is used until the server announces that it supports the binary format
+    """
+    global use_binary_telemetry, first_connection # pylint: disable=global-statement, invalid-name
+    use_binary_telemetry = False
+    telemetry_encoder.reset()
+    # A heartbeat registers the device right away. After startup the full telemetry post
+    # follows as soon as the containers have been inspected, after a reconnect the device
+    # keeps its push slot to spread the load on the server
+    heartbeat({"id": DEVICE_ID})
+    if first_connection:
+        first_connection = False
+        fleet_manager.send_telemetry()
+
+@socket_io.event
+def disconnect():
+    """Connection lost, push settings from the server no longer apply"""
+    fleet_manager.reset_intervals()
+
+@socket_io.event
+def flow_control(settings):
+    """Push settings decided by the server
+
+    Args:
+        settings (dict): Push interval and heartbeat interval in seconds
+    """
+    fleet_manager.set_intervals(settings["push_interval"], settings.get("heartbeat_interval"))
+
+@socket_io.event
+def refresh(refresh_request):
+    """Refresh request from the server, sent to all devices
+
+    Args:
+        refresh_request (dict): Refresh ID and the devices which should answer,
+            None for all devices
+    """
+    devices = refresh_request.get("devices")
+    if devices is None or DEVICE_ID in devices:
+        fleet_manager.refresh_telemetry(refresh_request["refresh_id"])
+
+@socket_io.event
+def wire_format_announcement(announcement):
+    """Server announcement of which telemetry encodings it supports
+
+    Args:
+        announcement (dict): Announcement with the supported encodings
+    """
+    global use_binary_telemetry # pylint: disable=global-statement, invalid-name
+    use_binary_telemetry = wire_format.available() and \
+        wire_format.ENCODING in announcement.get("encodings", [])
+    log.info('Binary telemetry %s', "enabled" if use_binary_telemetry else "disabled")
 
 
 @socket_io.event
@@ -109,9 +297,82 @@ def telemetry(telemetry_post):
     """
     log.debug('Sending telemetry: %s', telemetry_post)
     try:
-        socket_io.emit('telemetry', telemetry_post)
+        socket_io.emit(
+            'telemetry',
+            telemetry_encoder.encode(telemetry_post) if use_binary_telemetry else telemetry_post,
+            callback=lambda accepted: telemetry_acknowledged(telemetry_post, accepted)
+        )
     except BadNamespaceError:
-        log.warning("Could not send telemetry to server at %s", fleet_manager_server_url())
+        # The server never received the strings defined in the post
+        telemetry_encoder.reset()
+        telemetry_buffer.record(telemetry_post)
+        log.warning("Could not send telemetry to server at %s, %s posts buffered",
+            fleet_manager_server_url(), len(telemetry_buffer))
+
+def telemetry_acknowledged(telemetry_post: dict, accepted: bool) -> None:
+    """Server acknowledgement of a telemetry post. The server rejects posts when its telemetry
+    queue is full, the post is then retried with backoff
+
+    Args:
+        telemetry_post (dict): Acknowledged telemetry post
+        accepted (bool): If the server accepted the post. None from servers that do not
+            acknowledge posts, which are accepted
+    """
+    if accepted is not False:
+        telemetry_retry_backoff.reset()
+        # The device is known to the server once a post is accepted, which the history in
+        # the backlog is added to
+        send_telemetry_backlog()
+        return
+    delay = telemetry_retry_backoff.next_delay()
+    log.warning('Telemetry post rejected by server at %s, retrying in %.1f s',
+        fleet_manager_server_url(), delay)
+    fleet_manager.retry_telemetry(telemetry_post, delay)
+
+def send_telemetry_backlog():
+    """Sends the telemetry buffered while the server was unreachable in one compressed batch"""
+    if len(telemetry_buffer) == 0:
+        return
+    entries = telemetry_buffer.drain()
+    if len(entries) == 0:
+        return
+
+    log.info('Sending telemetry backlog of %s entries', len(entries))
+    try:
+        socket_io.emit(
+            'telemetry_backlog', TelemetryBuffer.encode(DEVICE_ID, entries),
+            callback=lambda accepted: telemetry_backlog_acknowledged(entries, accepted)
+        )
+    except BadNamespaceError:
+        telemetry_buffer.restore(entries)
+        log.warning("Could not send telemetry backlog to server at %s", fleet_manager_server_url())
+
+def telemetry_backlog_acknowledged(entries: list, accepted: bool) -> None:
+    """Server acknowledgement of a telemetry backlog. A rejected backlog is put back in the
+    buffer and sent again after the next accepted telemetry post
+
+    Args:
+        entries (list[dict]): Entries of the acknowledged backlog
+        accepted (bool): If the server accepted the backlog
+    """
+    if accepted is False:
+        telemetry_buffer.restore(entries)
+        log.warning('Telemetry backlog of %s entries rejected by server at %s, kept buffered',
+            len(entries), fleet_manager_server_url())
+
+def heartbeat(heartbeat_post):
+    """Sends a heartbeat to the server, keeps the device online between telemetry posts
+
+    Args:
+        heartbeat_post (dict): Heartbeat post to be sent to server
+    """
+    try:
+        socket_io.emit('heartbeat', heartbeat_post)
+    except BadNamespaceError:
+        log.debug("Could not send heartbeat to server at %s", fleet_manager_server_url())
+
+handled_commands = deque(maxlen=100)
+command_executor = ThreadPoolExecutor(max_workers=COMMAND_CONCURRENCY) # pylint: disable=invalid-name
 
 @socket_io.on(f'command_{DEVICE_ID}')
 def command(cmd):
@@ -121,39 +382,149 @@ def command(cmd):
         cmd (dict): Command for the client
     """
     log.debug('Command received: %s', cmd)
-    command_interpreter(cmd)
+    if cmd['command'] == 'batch':
+        threading.Thread(target=run_command_batch, args=(cmd['commands'],), daemon=True).start()
+        return
+
+    if accept_command(cmd):
+        run_command(cmd)
+        fleet_manager.send_telemetry()
+
+def accept_command(cmd) -> bool:
+    """Acknowledges a command and checks that it has not already been handled
+
+    Args:
+        cmd (dict): Command for the client
+
+    Returns:
+        bool: If the command should be run
+    """
+    command_status(cmd, 'acknowledged')
+
+    command_id = cmd.get('command_id')
+    if command_id in handled_commands:
+        # Resent by the server as the acknowledgement was lost
+        return False
+    if command_id is not None:
+        handled_commands.append(command_id)
+    return True
+
+def run_command(cmd):
+    """Runs a command and reports the result to the server. The command is traced as a child
+    of the trace context sent by the server, if any.
+
+    Args:
+        cmd (dict): Command for the client
+    """
+    span = tracer.span(
+        'command', cmd.get('trace'),
+        command=cmd['command'], container_name=cmd.get('container_name')
+    )
+    try:
+        with span:
+            result = command_interpreter(
+                cmd, lambda detail: command_status(cmd, 'running', detail)
+            )
+    except Exception as error:  # pylint: disable=broad-except
+        log.exception('Command "%s" failed', cmd['command'])
+        command_status(cmd, 'failed', str(error))
+    else:
+        command_status(cmd, 'succeeded', result=result)
+    fleet_manager.trace_telemetry({**span.context(), "ended": time.time()})
+
+def run_command_batch(commands):
+    """Runs a batch of commands as a unit. Commands for different containers are run
+    concurrently, commands for the same container are run in order. One telemetry
+    post is sent when the entire batch is done.
+
+    Args:
+        commands (list[dict]): Commands for the client
+    """
+    container_commands = {}
+    for cmd in commands:
+        if accept_command(cmd):
+            container_commands.setdefault(cmd.get('container_name'), []).append(cmd)
+
+    def run_in_order(cmds):
+        for cmd in cmds:
+            run_command(cmd)
+
+    wait([command_executor.submit(run_in_order, cmds) for cmds in container_commands.values()])
     fleet_manager.send_telemetry()
 
-def command_interpreter(command_dict):
+def command_status(cmd, state, detail=None, result=None):
+    """Reports the state of a command to the server
+
+    Args:
+        cmd (dict): Command the state belongs to
+        state (str): Command state (acknowledged, running, succeeded or failed)
+        detail (str, optional): Progress or error information. Defaults to None.
+        result (object, optional): Result of a succeeded command. Defaults to None.
+    """
+    if cmd.get('command_id') is None:
+        return
+    try:
+        socket_io.emit('command_status', {
+            'command_id': cmd['command_id'],
+            'state': state,
+            'detail': detail,
+            'result': result
+        })
+    except BadNamespaceError:
+        log.warning('Could not send command status to server at %s', fleet_manager_server_url())
+
+def command_interpreter(command_dict, progress=None):
     """Command interpreter. Read incomming command dict and translate it
     into real actions
 
     Args:
         command_dict (dict): Command dictionary
+        progress (callable, optional): Called with a description of the current step
+            of long running commands. Defaults to None.
+
+    Returns:
+        object: Result of the command, the collapsed stacks for ``profile`` and the
+            reclaimed space for ``garbage_collect``. None for the container commands
+
+    Raises:
+        ValueError: If the command doesn't exist
     """
     if command_dict['command'] == 'stop_container':
         device.stop_container(command_dict['container_name'])
     elif command_dict['command'] == 'start_container':
         device.start_container(command_dict['container_name'])
     elif command_dict['command'] == 'update_container':
-        device.update_container(command_dict['container_name'])
-    #TODO: Add handling for if the command doesn't exist
+        device.update_container(command_dict['container_name'], progress)
+    elif command_dict['command'] == 'rollback_container':
+        device.rollback_container(command_dict['container_name'], progress)
+    elif command_dict['command'] == 'garbage_collect':
+        return device.garbage_collect(progress)
+    elif command_dict['command'] == 'profile':
+        return profiler.profile(
+            command_dict.get('duration', 10), command_dict.get('interval', 0.01)
+        )
+    else:
+        raise ValueError(f'Unknown command "{command_dict["command"]}"')
+    return None
 
 def main():
     """Main function"""
     disable_loggers(DISABLE_LOGGERS)
 
-    device.update()
+    # The containers are listed when the first telemetry post is built, after connecting
     fleet_manager.start()
 
+    backoff = Backoff(RECONNECT_DELAY_MIN, RECONNECT_DELAY_MAX)
     while True:
         try:
             socket_io.connect(fleet_manager_server_url() +'?ignore-me=True', transports='websocket')
         except SocketConnectionError:
-            log.warning('Could not connect to log server')
-            time.sleep(PUSH_INTERVAL)
+            delay = backoff.next_delay()
+            log.warning('Could not connect to server, retrying in %.1f s', delay)
+            time.sleep(delay)
         else:
             log.info('Connected to server')
+            backoff.reset()
             socket_io.wait()
 
 
@@ -0,0 +1,65 @@
+"""Module to spread out connection attempts and telemetry pushes across the fleet"""
+
+from hashlib import sha256
+import random
+import time
+
+class Backoff():
+    """Exponential backoff with jitter. The delay is doubled for every attempt up to the
+    maximum delay, the returned delay is randomized between half and the full delay.
+
+    Args:
+        base_delay (float): Delay in seconds for the first attempt
+        max_delay (float): Maximum delay in seconds
+        rand (callable, optional): Random number generator in [0, 1). Defaults to random.random.
+    """
+    def __init__(self, base_delay: float, max_delay: float, rand: object = random.random) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rand = rand
+
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        """Delay before the next attempt
+
+        Returns:
+            float: Delay in seconds
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** self.attempt)
+        self.attempt += 1
+        return delay / 2 + self.rand() * delay / 2
+
+    def reset(self) -> None:
+        """Resets the backoff after a successful attempt"""
+        self.attempt = 0
+
+def push_phase(device_id: str, push_interval: float) -> float:
+    """Phase of the push schedule for a device. The phase is derived from the device ID,
+    which spreads the pushes of the fleet evenly over the push interval and keeps them
+    the same between restarts.
+
+    Args:
+        device_id (str): Device ID
+        push_interval (float): Push interval in seconds
+
+    Returns:
+        float: Phase in seconds, between 0 and the push interval
+    """
+    digest = sha256(device_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 * push_interval
+
+def time_to_next_push(device_id: str, push_interval: float, now: float = None) -> float:
+    """Time until the next push slot of the device
+
+    Args:
+        device_id (str): Device ID
+        push_interval (float): Push interval in seconds
+        now (float, optional): Current time as a timestamp. Defaults to time.time().
+
+    Returns:
+        float: Time in seconds until the next push, in (0, push_interval]
+    """
+    if now is None:
+        now = time.time()
+    return push_interval - (now - push_phase(device_id, push_interval)) % push_interval
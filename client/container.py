@@ -1,9 +1,120 @@
 """Module to handle docker container instances"""
 
-class Container():
-    """Class that wrap a docker container"""
+from collections import namedtuple
+
+DOCKER_HUB_REGISTRIES = ("docker.io", "index.docker.io", "registry-1.docker.io")
+
+ImageReference = namedtuple("ImageReference", ["registry", "repository", "tag", "digest"])
+
+def parse_image_reference(reference: str) -> ImageReference:
+    """Parses an image reference in the form ``[registry[:port]/]repository[:tag][@digest]``.
+
+    The first path component is the registry if it contains a ``.`` or a ``:``, or is
+    ``localhost``. The tag defaults to ``latest`` if neither tag nor digest is given.
+
+    Args:
+        reference (str): Image reference, for example ``registry:5000/rikpet/easy-living:beta``
+
+    Returns:
+        ImageReference: Registry (None for Docker hub), repository, tag and digest. Tag and
+            digest are None when not in the reference
+    """
+    name, _, digest = reference.partition("@")
+
+    registry = None
+    first, separator, rest = name.partition("/")
+    if separator and ("." in first or ":" in first or first == "localhost"):
+        registry, name = first, rest
+
+    # A colon after the last slash separates the tag, a colon before it is part of the path
+    last_slash = name.rfind("/")
+    tag_separator = name.rfind(":")
+    tag = None
+    if tag_separator > last_slash:
+        name, tag = name[:tag_separator], name[tag_separator + 1:]
+
+    if tag is None and not digest:
+        tag = "latest"
+    if registry in DOCKER_HUB_REGISTRIES:
+        registry = None
+    return ImageReference(registry, name, tag, digest or None)
+
+class ContainerSnapshot(): # pylint: disable=too-many-instance-attributes, too-few-public-methods
+    """Fields of a container, parsed once from the container attributes
+
+    Args:
+        attributes (dict): Container attributes from the Docker API
+    """
+    __slots__ = (
+        "full_id", "id", "name", "image_sha", "image_name", "image", "running", "status",
+        "volumes", "environment", "ports", "restart_policy"
+    )
+
+    def __init__(self, attributes: dict) -> None:
+        self.full_id = attributes["Id"]
+        self.id = self.full_id[:10]  # pylint: disable=invalid-name
+        self.name = attributes["Name"][1:]
+        self.image_sha = attributes["Image"]
+        self.image_name = attributes["Config"]["Image"]
+        self.image = parse_image_reference(self.image_name)
+        self.running = attributes["State"]["Running"]
+        self.status = attributes["State"]["Status"]
+        self.restart_policy = attributes["HostConfig"]["RestartPolicy"]
+
+        # Docker reports empty lists and maps as null for some containers, for example
+        # without environment, with host networking or when stopped
+        self.volumes = [
+            f'{volume["Source"]}:{volume["Destination"]}'
+            for volume in attributes.get('Mounts') or []
+        ]
+
+        # Only environment variables added by the user, the ones added by docker follow PATH
+        self.environment = []
+        for env_var in attributes['Config'].get('Env') or []:
+            if env_var[:4] == "PATH":
+                break
+            self.environment.append(env_var)
+
+        self.ports = {}
+        for key, value in (attributes["NetworkSettings"].get("Ports") or {}).items():
+            try:
+                self.ports[key] = value[0]["HostPort"]
+            except TypeError:
+                continue
+
+    @property
+    def image_repo(self) -> str:
+        """Image repository, prefixed with the registry if it is not Docker hub
+
+        Returns:
+            str: Image repository
+        """
+        if self.image.registry is None:
+            return self.image.repository
+        return f'{self.image.registry}/{self.image.repository}'
+
+class Container(): # pylint: disable=too-many-public-methods
+    """Class that wrap a docker container. The attributes are parsed into a
+    :class:`ContainerSnapshot` when first used and after each reload."""
     def __init__(self, container) -> None:
         self.container = container
+        self._snapshot = None
+
+    @property
+    def snapshot(self) -> ContainerSnapshot:
+        """Parsed container attributes
+
+        Returns:
+            ContainerSnapshot: Container fields
+        """
+        if self._snapshot is None:
+            self._snapshot = ContainerSnapshot(self.attr)
+        return self._snapshot
+
+    def reload(self) -> None:
+        """Reloads the container attributes from the Docker API"""
+        self.container.reload()
+        self._snapshot = ContainerSnapshot(self.attr)
 
     @property
     def id(self) -> str:   # pylint: disable=invalid-name
@@ -12,7 +123,7 @@ class Container():
         Returns:
             str: Container ID
         """
-        return self.full_id[:10]
+        return self.snapshot.id
 
     @property
     def full_id(self) -> str:
@@ -21,7 +132,7 @@ class Container():
         Returns:
             str: Container full ID
         """
-        return self.attr["Id"]
+        return self.snapshot.full_id
 
     @property
     def attr(self):
@@ -39,7 +150,7 @@ class Container():
         Returns:
             str: Container name
         """
-        return self.attr["Name"][1:]
+        return self.snapshot.name
 
     @property
     def image_sha(self) -> str:
@@ -48,7 +159,7 @@ class Container():
         Returns:
             str: Image SHA
         """
-        return self.attr["Image"]
+        return self.snapshot.image_sha
 
     @property
     def image_name(self) -> str:
@@ -57,25 +168,25 @@ class Container():
         Returns:
             str: Container name
         """
-        return self.attr["Config"]["Image"]
+        return self.snapshot.image_name
 
     @property
     def image_repo(self) -> str:
-        """Image repository
+        """Image repository, prefixed with the registry if it is not Docker hub
 
         Returns:
             str: Image repository
         """
-        return self.image_name.split(':')[0]
+        return self.snapshot.image_repo
 
     @property
     def image_tag(self) -> str:
         """Image tag which the container is based on
 
         Returns:
-            str: image tag
+            str: image tag. None if the image is referenced by digest only
         """
-        return self.image_name.split(':')[-1]
+        return self.snapshot.image.tag
 
     @property
     def running(self) -> bool:
@@ -84,7 +195,7 @@ class Container():
         Returns:
             bool: Runninge status of the container
         """
-        return self.attr["State"]["Running"]
+        return self.snapshot.running
 
     @property
     def status(self) -> str:
@@ -93,7 +204,7 @@ class Container():
         Returns:
             str: Status of the container
         """
-        return self.attr["State"]["Status"]
+        return self.snapshot.status
 
     @property
     def volumes(self):
@@ -102,10 +213,7 @@ class Container():
         Returns:
             list(str): List of the mounted volumes
         """
-        _volumes = []
-        for volume in self.attr['Mounts']:
-            _volumes.append(f'{volume["Source"]}:{volume["Destination"]}')
-        return _volumes
+        return self.snapshot.volumes
 
     @property
     def environment(self):
@@ -115,12 +223,7 @@ class Container():
         Returns:
             list(str): Environment variables in the container
         """
-        _environment = []
-        for env_var in self.attr['Config']['Env']:
-            if env_var[:4] == "PATH":
-                break
-            _environment.append(env_var)
-        return _environment
+        return self.snapshot.environment
 
     @property
     def ports(self) -> dict:
@@ -129,16 +232,7 @@ class Container():
         Returns:
             dict: Port bindings
         """
-        _port_settings = self.attr["NetworkSettings"]["Ports"]
-
-        _ports = {}
-
-        for key, value in _port_settings.items():
-            try:
-                _ports[key] = value[0]["HostPort"]
-            except TypeError:
-                continue
-        return _ports
+        return self.snapshot.ports
 
     @property
     def restart_policy(self) -> dict:
@@ -147,7 +241,7 @@ class Container():
         Returns:
             dict: Restart policy for container<
         """
-        return self.attr["HostConfig"]["RestartPolicy"]
+        return self.snapshot.restart_policy
 
     def start(self) -> None:
         """Start the container"""
@@ -169,7 +263,7 @@ class Container():
         Returns:
             dict: Information about the container
         """
-        self.container.reload()
+        self.reload()
 
         return \
         {
@@ -5,17 +5,52 @@ import threading
 import requests
 import psutil
 from container import Container
+from disk_usage import DiskUsage
+from rollback import RollbackStore
+from stats import StatsCollector
+from tracing import Span, Tracer
 import docker
 
+def _no_progress(_detail: str) -> None:
+    pass
+
+def parse_labels(labels: str) -> dict:
+    """Parses device labels in the form ``key=value,key=value``
+
+    Args:
+        labels (str): Labels
+
+    Returns:
+        dict: Label key mapped to value
+    """
+    parsed = {}
+    for label in labels.split(","):
+        key, _, value = label.partition("=")
+        if key.strip():
+            parsed[key.strip()] = value.strip()
+    return parsed
+
 class Device(): # pylint: disable=too-many-instance-attributes
     """Class to handle and bundle device information"""
-    def __init__(self, server_url: str, device_name: str, device_id: str) -> None:
+    def __init__(   self, server_url: str, device_name: str, device_id: str, # pylint: disable=too-many-arguments
+                    labels: dict = None, stats_window: float = 60, rollback: dict = None,
+                    tracer: Tracer = None, disk_usage_interval: float = 300) -> None:
         self.server_url = server_url
         self.device_name = device_name
         self.device_id = device_id
+        self.labels = {} if labels is None else labels
 
-        self.client = docker.from_env()
+        self.stats_window = stats_window
+        self.rollback_settings = {} if rollback is None else rollback
+        self.tracer = Tracer() if tracer is None else tracer
+        self.disk_usage_interval = disk_usage_interval
+        self._client = None
+        self._stats = None
+        self._rollback = None
+        self._disk_usage = None
         self.lock = threading.Lock()
+        self._rollback_lock = threading.Lock()
+        self._container_locks = {}
 
         self.log = getLogger(f'{self.__class__.__name__}')
         self.log.info('Device ID: %s', self.device_id)
@@ -23,6 +58,53 @@ class Device(): # pylint: disable=too-many-instance-attributes
         self._cached_ip_address = None
         self.containers = []
 
+    @property
+    def client(self) -> docker.DockerClient:
+        """Docker client, created on first use so that the client can connect to the server
+        before talking to the Docker daemon
+
+        Returns:
+            docker.DockerClient: Docker client
+        """
+        if self._client is None:
+            self._client = docker.from_env()
+        return self._client
+
+    @property
+    def stats(self) -> StatsCollector:
+        """Collector for the container resource usage, created on first use
+
+        Returns:
+            StatsCollector: Stats collector. None if disabled
+        """
+        if self._stats is None and self.stats_window > 0:
+            self._stats = StatsCollector(self.client, self.stats_window)
+        return self._stats
+
+    @property
+    def rollback(self) -> RollbackStore:
+        """Store for the images and settings replaced by updates, created on first use
+
+        Returns:
+            RollbackStore: Rollback store
+        """
+        # Creating the store lists the retained images, which must not hold the device lock
+        with self._rollback_lock:
+            if self._rollback is None:
+                self._rollback = RollbackStore(self.client.images, **self.rollback_settings)
+            return self._rollback
+
+    @property
+    def disk_usage(self) -> DiskUsage:
+        """Disk usage of the device, collected periodically. Created on first use
+
+        Returns:
+            DiskUsage: Disk usage
+        """
+        if self._disk_usage is None:
+            self._disk_usage = DiskUsage(self.client, self.disk_usage_interval)
+        return self._disk_usage
+
     def update(self) -> None:
         """Updating list of containers"""
         with self.lock:
@@ -42,13 +124,30 @@ class Device(): # pylint: disable=too-many-instance-attributes
             device_object = {
                 "name": self.device_name,
                 "id": self.device_id,
+                "labels": self.labels,
                 "cpu_load": self.cpu_load(),
                 "memory_usage": self.memory_usage(),
+                "disk": self.disk_usage.summary(),
                 "containers": []
             }
 
+            running_container_ids = []
             for container in self.containers:
-                device_object["containers"].append(container.information())
+                try:
+                    container_object = container.information()
+                except docker.errors.NotFound:
+                    # Removed by a command running at the same time
+                    continue
+
+                if self.stats is not None and container.running:
+                    running_container_ids.append(container.full_id)
+                    stats = self.stats.summary(container.full_id)
+                    if stats is not None:
+                        container_object["stats"] = stats
+                device_object["containers"].append(container_object)
+
+            if self.stats is not None:
+                self.stats.sync(running_container_ids)
 
             return device_object
 
@@ -73,7 +172,7 @@ class Device(): # pylint: disable=too-many-instance-attributes
         """
         return psutil.virtual_memory()[2]
 
-    def update_container(self, container_name: str) -> None:
+    def update_container(self, container_name: str, progress: object = None) -> None:
         """Updating specified container.
         Reuses the settings from existing container, updates the image and
         starts a new container with the same settings.
@@ -82,31 +181,119 @@ class Device(): # pylint: disable=too-many-instance-attributes
         See :func:`container.Container.settings` for information about which settings
         are transferrable.
 
+        The previous image and settings are retained, see :func:`rollback_container`.
+
         Args:
             container_name (str): Name of the container that are being updated
+            progress (callable, optional): Called with a description of each step of the
+                update. Defaults to None.
         """
         #TODO: Add error handling
         self.log.info('Updating container "%s" with latest image from remote repository',
             container_name)
+        if progress is None:
+            progress = _no_progress
 
-        with self.lock, Container(self._get_container_obj(container_name)) as container_client:
+        with self.container_lock(container_name), \
+                Container(self._get_container_obj(container_name)) as container_client:
             container_settings = container_client.settings()
             image_name = container_client.image_name
 
             self.log.debug('Pulling new image from remote repository')
-            self.client.images.pull(image_name)
+            with self._step(progress, 'pulling', image_name=image_name) as span:
+                image = self.client.images.pull(image_name)
+                span.attributes["image_changed"] = image.id != container_client.image_sha
+            if image.id != container_client.image_sha:
+                self.rollback.record(container_name, container_client.image_sha, image_name,
+                                     container_settings)
 
             self.log.debug('Stopping container "%s"', container_name)
-            container_client.stop()
+            with self._step(progress, 'stopping'):
+                container_client.stop()
             self.log.debug('Removing container "%s"', container_name)
-            container_client.remove()
+            with self._step(progress, 'removing'):
+                container_client.remove()
 
             self.log.debug('Starting the new image with name "%s"', container_name)
-            self._start_new_container(image_name, container_settings)
+            with self._step(progress, 'starting'):
+                self._start_new_container(image_name, container_settings)
 
-        self.client.images.prune()
+        # The replaced image is removed by the garbage collection scheduled by the server
         self.log.info('Update of container "%s" complete', container_name)
 
+    def rollback_container(self, container_name: str, progress: object = None) -> None:
+        """Restores the image and settings a container had before its last update, from the
+        images retained on the device. Nothing is pulled from the remote repository.
+
+        Args:
+            container_name (str): Name of the container to roll back
+            progress (callable, optional): Called with a description of each step of the
+                rollback. Defaults to None.
+
+        Raises:
+            ValueError: If no previous image is retained for the container
+        """
+        self.log.info('Rolling back container "%s"', container_name)
+        if progress is None:
+            progress = _no_progress
+
+        entry = self.rollback.latest(container_name)
+        if entry is None:
+            raise ValueError(f'No previous image retained for container "{container_name}"')
+
+        with self.container_lock(container_name):
+            with self._step(progress, 'restoring', image_id=entry["image_id"]):
+                self.rollback.restore_image(entry)
+
+            try:
+                container = self._get_container_obj(container_name)
+            except docker.errors.NotFound:
+                # Removed by an update which failed to start the new container
+                container = None
+            if container is not None:
+                with Container(container) as container_client:
+                    self.log.debug('Stopping container "%s"', container_name)
+                    with self._step(progress, 'stopping'):
+                        container_client.stop()
+                    with self._step(progress, 'removing'):
+                        container_client.remove()
+
+            self.log.debug('Starting the previous image with name "%s"', container_name)
+            with self._step(progress, 'starting'):
+                self._start_new_container(entry["image_name"], entry["settings"])
+
+        self.rollback.discard(entry)
+        self.log.info('Rollback of container "%s" to image "%s" complete', container_name,
+                      entry["image_id"])
+
+    def garbage_collect(self, progress: object = None) -> dict:
+        """Removes dangling images, for example images replaced by updates. Images retained
+        for rollback are tagged and not removed.
+
+        Args:
+            progress (callable, optional): Called with a description of each step.
+                Defaults to None.
+
+        Returns:
+            dict: Number of deleted images, reclaimed bytes and the disk usage afterwards
+        """
+        self.log.info('Collecting garbage')
+        if progress is None:
+            progress = _no_progress
+
+        with self._step(progress, 'pruning'):
+            pruned = self.client.images.prune(filters={"dangling": True})
+        with self._step(progress, 'measuring'):
+            disk = self.disk_usage.collect()
+
+        result = {
+            "images_deleted": len(pruned.get("ImagesDeleted") or []),
+            "space_reclaimed": pruned.get("SpaceReclaimed", 0),
+            "disk": disk
+        }
+        self.log.info('Garbage collection reclaimed %s bytes', result["space_reclaimed"])
+        return result
+
     def start_container(self, container_name: str) -> None:
         """Start a container
 
@@ -114,7 +301,8 @@ class Device(): # pylint: disable=too-many-instance-attributes
             container_name (str): Name of the container to start
         """
         self.log.info('Starting container "%s"', container_name)
-        with self.lock, Container(self._get_container_obj(container_name)) as container_client:
+        with self.container_lock(container_name), \
+                Container(self._get_container_obj(container_name)) as container_client:
             container_client.start()
         self.log.debug('Container "%s" started', container_name)
 
@@ -125,10 +313,29 @@ class Device(): # pylint: disable=too-many-instance-attributes
             container_name (str): Name of the container to start
         """
         self.log.info('Stopping container "%s"', container_name)
-        with self.lock, Container(self._get_container_obj(container_name)) as container_client:
+        with self.container_lock(container_name), \
+                Container(self._get_container_obj(container_name)) as container_client:
             container_client.stop()
         self.log.debug('Container "%s" stopped', container_name)
 
+    def container_lock(self, container_name: str) -> threading.Lock:
+        """Lock for commands towards a container. Commands towards different containers
+        can run at the same time.
+
+        Args:
+            container_name (str): Name of the container
+
+        Returns:
+            threading.Lock: Container lock
+        """
+        with self.lock:
+            return self._container_locks.setdefault(container_name, threading.Lock())
+
+    def _step(self, progress: object, step: str, **attributes) -> Span:
+        # Reports a step of a long running command and times it in a span
+        progress(step)
+        return self.tracer.span(step, **attributes)
+
     def _start_new_container(self, image_name, settings):
         self.client.containers.run(image=image_name, **settings)
 
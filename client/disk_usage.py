@@ -0,0 +1,93 @@
+"""Module to collect the disk usage of the device and the Docker daemon"""
+
+from logging import getLogger
+import threading
+import time
+import psutil
+
+def summarize_docker_usage(usage: dict) -> dict:
+    """Summarizes the disk usage reported by the Docker daemon (``docker system df``)
+
+    Args:
+        usage (dict): Disk usage from the Docker API
+
+    Returns:
+        dict: Bytes used by images, reclaimable by removing images without containers and
+            used by volumes
+    """
+    images = usage.get("Images") or []
+    volumes = usage.get("Volumes") or []
+    return {
+        "images": usage.get("LayersSize", 0),
+        "images_reclaimable": sum(
+            image.get("Size", 0) - max(image.get("SharedSize", 0), 0)
+            for image in images if image.get("Containers", 0) == 0
+        ),
+        "volumes": sum(
+            max((volume.get("UsageData") or {}).get("Size", 0), 0) for volume in volumes
+        )
+    }
+
+class DiskUsage(): # pylint: disable=too-many-instance-attributes
+    """Keeps the disk usage of the device and the Docker daemon, collected periodically in a
+    background thread. Asking the daemon for its disk usage walks all layers and volumes, so
+    it is done once per interval instead of for every telemetry post.
+
+    Args:
+        client (docker.DockerClient): Docker client
+        interval (float, optional): Time in seconds between collections. Defaults to 300.
+        path (str, optional): Path on the file system to report. Defaults to ``/``.
+        sleep (callable, optional): Sleep function. Defaults to time.sleep.
+    """
+    def __init__(   self, client: object, interval: float = 300, path: str = "/",
+                    sleep: object = time.sleep) -> None:
+        self.client = client
+        self.interval = interval
+        self.path = path
+        self.sleep = sleep
+
+        self._summary = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def summary(self) -> dict:
+        """Latest disk usage. Starts the periodic collection the first time it is called
+
+        Returns:
+            dict: File system usage in percent and free bytes, Docker image, reclaimable and
+                volume usage in bytes. None until the first collection is done
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, daemon=True)
+                self._thread.start()
+        return self._summary
+
+    def collect(self) -> dict:
+        """Collects the disk usage right away
+
+        Returns:
+            dict: Disk usage, see :func:`summary`
+        """
+        file_system = psutil.disk_usage(self.path)
+        summary = {
+            "disk_percent": file_system.percent,
+            "disk_free": file_system.free
+        }
+        try:
+            summary.update(summarize_docker_usage(self.client.df()))
+        except Exception as error: # pylint: disable=broad-except
+            self.log.warning('Could not read Docker disk usage: %s', error)
+        self._summary = summary
+        return summary
+
+    def run(self) -> None:
+        """Collects the disk usage periodically"""
+        while True:
+            try:
+                self.collect()
+            except Exception: # pylint: disable=broad-except
+                self.log.exception('Could not collect disk usage')
+            self.sleep(self.interval)
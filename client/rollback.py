@@ -0,0 +1,222 @@
+"""Module to retain the images and settings replaced by container updates, so that an update
+can be rolled back without pulling from the remote repository"""
+
+import json
+from logging import getLogger
+import os
+import threading
+import time
+from uuid import uuid4
+from container import parse_image_reference
+
+ROLLBACK_REPOSITORY = "fleet-manager-rollback"
+
+def tag_target(image_name: str) -> tuple:
+    """Repository and tag an image is tagged with, so that it is used under an image name
+
+    Args:
+        image_name (str): Image name, for example ``registry:5000/rikpet/easy-living:beta``
+
+    Returns:
+        tuple[str, str]: Repository, prefixed with the registry if it is not Docker hub, and
+            tag. None if the image name is pinned by digest, which can not be tagged
+    """
+    image = parse_image_reference(image_name)
+    if image.digest is not None:
+        return None
+    if image.registry is None:
+        return image.repository, image.tag
+    return f'{image.registry}/{image.repository}', image.tag
+
+class RollbackStore():
+    """Keeps the previous image and settings of the last updates of each container.
+
+    The previous image of an update is tagged in a local repository, which protects it from
+    image pruning. At most ``depth`` images are kept for each container and the oldest
+    entries are released when the retained images exceed the disk budget. The entries are
+    persisted to a file, if configured, so they survive a restart of the client. Tags in the
+    local repository without an entry are released when the store is created.
+
+    Args:
+        images (docker.models.images.ImageCollection): Docker images
+        depth (int, optional): Number of updates kept for each container. Defaults to 2.
+        disk_budget (int, optional): Maximum size of the retained images in bytes.
+            Defaults to 2 GiB.
+        path (str, optional): Path to store file. Defaults to None, not persisted.
+    """
+    def __init__(   self, images: object, depth: int = 2, disk_budget: int = 2 * 1024**3,
+                    path: str = None) -> None:
+        self.images = images
+        self.depth = depth
+        self.disk_budget = disk_budget
+        self.path = path
+
+        self._entries = []
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+        self.load()
+        self._release_orphans()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, container_name: str, image_id: str, image_name: str,
+               settings: dict) -> None:
+        """Retains the image and settings of a container which is about to be replaced
+
+        Args:
+            container_name (str): Container name
+            image_id (str): ID of the image the container is based on
+            image_name (str): Image name the container was started with
+            settings (dict): Container settings, see :func:`container.Container.settings`
+        """
+        if self.depth <= 0:
+            return
+        tag = f'{container_name}-{uuid4().hex[:8]}'
+        reference = f'{ROLLBACK_REPOSITORY}:{tag}'
+        try:
+            image = self.images.get(image_id)
+            image.tag(ROLLBACK_REPOSITORY, tag)
+        except Exception as error: # pylint: disable=broad-except
+            self.log.warning('Could not retain image of container "%s": %s',
+                             container_name, error)
+            return
+
+        entry = {
+            "container_name": container_name,
+            "image_id": image_id,
+            "image_name": image_name,
+            "reference": reference,
+            "settings": settings,
+            "size": image.attrs.get("Size", 0),
+            "timestamp": time.time()
+        }
+        with self._lock:
+            self._entries.append(entry)
+            released = self._enforce_limits()
+        for released_entry in released:
+            self._release(released_entry)
+        self.save()
+        self.log.info('Retained image "%s" of container "%s" for rollback',
+                      image_id, container_name)
+
+    def latest(self, container_name: str) -> dict:
+        """Most recent retained entry of a container
+
+        Args:
+            container_name (str): Container name
+
+        Returns:
+            dict: Image ID, image name, settings and reference of the retained image.
+                None if nothing is retained for the container
+        """
+        with self._lock:
+            for entry in reversed(self._entries):
+                if entry["container_name"] == container_name:
+                    return entry
+        return None
+
+    def entries(self, container_name: str = None) -> list:
+        """Retained entries, oldest first
+
+        Args:
+            container_name (str, optional): Only entries of this container. Defaults to None.
+
+        Returns:
+            list[dict]: Retained entries
+        """
+        with self._lock:
+            return [entry for entry in self._entries
+                    if container_name is None or entry["container_name"] == container_name]
+
+    def restore_image(self, entry: dict) -> None:
+        """Tags a retained image with the image name it was used under, so a container
+        started from the image name runs the retained image. An image name pinned by digest
+        already refers to the retained image and is not tagged
+
+        Args:
+            entry (dict): Retained entry, see :func:`latest`
+        """
+        target = tag_target(entry["image_name"])
+        if target is None:
+            return
+        self.images.get(entry["image_id"]).tag(*target)
+
+    def discard(self, entry: dict) -> None:
+        """Removes an entry and releases its image
+
+        Args:
+            entry (dict): Retained entry, see :func:`latest`
+        """
+        with self._lock:
+            if entry not in self._entries:
+                return
+            self._entries.remove(entry)
+        self._release(entry)
+        self.save()
+
+    def save(self) -> None:
+        """Writes the entries to the store file, if configured"""
+        if self.path is None:
+            return
+        with self._lock:
+            entries = list(self._entries)
+        temporary_path = f'{self.path}.tmp'
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as stream:
+                json.dump(entries, stream)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            self.log.warning('Could not write rollback store "%s"', self.path)
+
+    def load(self) -> None:
+        """Reads the store file, if configured and present"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as stream:
+                entries = json.load(stream)
+        except (OSError, ValueError):
+            self.log.warning('Could not read rollback store "%s"', self.path)
+            return
+        with self._lock:
+            self._entries = entries
+
+    def _enforce_limits(self) -> list:
+        # Must be called with the lock held
+        released = []
+        counts = {}
+        for entry in reversed(self._entries):
+            counts[entry["container_name"]] = counts.get(entry["container_name"], 0) + 1
+            if counts[entry["container_name"]] > self.depth:
+                released.append(entry)
+        self._entries = [entry for entry in self._entries if entry not in released]
+
+        # Several entries can share an image, which only takes space once
+        while self._entries and self._retained_size() > self.disk_budget:
+            released.append(self._entries.pop(0))
+        return released
+
+    def _retained_size(self) -> int:
+        sizes = {entry["image_id"]: entry["size"] for entry in self._entries}
+        return sum(sizes.values())
+
+    def _release(self, entry: dict) -> None:
+        # Removing the tag deletes the image, unless it is tagged otherwise or in use
+        try:
+            self.images.remove(entry["reference"])
+        except Exception as error: # pylint: disable=broad-except
+            self.log.warning('Could not release image "%s": %s', entry["reference"], error)
+
+    def _release_orphans(self) -> None:
+        references = {entry["reference"] for entry in self._entries}
+        try:
+            images = self.images.list(name=ROLLBACK_REPOSITORY)
+        except Exception as error: # pylint: disable=broad-except
+            self.log.warning('Could not list retained images: %s', error)
+            return
+        for image in images:
+            for tag in image.tags:
+                if tag.startswith(f'{ROLLBACK_REPOSITORY}:') and tag not in references:
+                    self._release({"reference": tag})
@@ -0,0 +1,206 @@
+"""Module to collect resource usage statistics for the containers"""
+
+from collections import deque
+from logging import getLogger
+import threading
+import time
+
+def cpu_percent(sample: dict) -> float:
+    """CPU usage of a container between the current and the previous reading in a stats
+    sample, calculated the same way as ``docker stats``
+
+    Args:
+        sample (dict): Stats sample from the Docker API
+
+    Returns:
+        float: CPU usage in percent, where 100 is one fully loaded CPU core
+    """
+    cpu_stats = sample.get("cpu_stats", {})
+    precpu_stats = sample.get("precpu_stats", {})
+    try:
+        cpu_delta = cpu_stats["cpu_usage"]["total_usage"] - \
+            precpu_stats["cpu_usage"]["total_usage"]
+        system_delta = cpu_stats["system_cpu_usage"] - precpu_stats["system_cpu_usage"]
+    except KeyError:
+        return 0.0
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    online_cpus = cpu_stats.get("online_cpus") or \
+        len(cpu_stats["cpu_usage"].get("percpu_usage") or [None])
+    return cpu_delta / system_delta * online_cpus * 100
+
+def memory_bytes(sample: dict) -> int:
+    """Memory used by a container, excluding the page cache like ``docker stats``
+
+    Args:
+        sample (dict): Stats sample from the Docker API
+
+    Returns:
+        int: Memory usage in bytes
+    """
+    memory_stats = sample.get("memory_stats", {})
+    usage = memory_stats.get("usage", 0)
+    stats = memory_stats.get("stats", {})
+    # cgroup v1 reports the page cache as "cache", cgroup v2 as "inactive_file"
+    cache = stats.get("inactive_file", stats.get("cache", 0))
+    return max(usage - cache, 0)
+
+def network_bytes(sample: dict) -> tuple:
+    """Bytes received and transmitted by a container on all networks, since it was started
+
+    Args:
+        sample (dict): Stats sample from the Docker API
+
+    Returns:
+        tuple[int, int]: Received and transmitted bytes
+    """
+    networks = (sample.get("networks") or {}).values()
+    return sum(network.get("rx_bytes", 0) for network in networks), \
+        sum(network.get("tx_bytes", 0) for network in networks)
+
+def blkio_bytes(sample: dict) -> tuple:
+    """Bytes read and written by a container on block devices, since it was started
+
+    Args:
+        sample (dict): Stats sample from the Docker API
+
+    Returns:
+        tuple[int, int]: Read and written bytes
+    """
+    entries = (sample.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    read = written = 0
+    for entry in entries:
+        # Operations are capitalized for cgroup v1 and lowercase for cgroup v2
+        operation = entry.get("op", "").lower()
+        if operation == "read":
+            read += entry.get("value", 0)
+        elif operation == "write":
+            written += entry.get("value", 0)
+    return read, written
+
+class ContainerStats():
+    """Rolling window of the stats samples of one container
+
+    Args:
+        window (float): Length of the window in seconds
+    """
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def add(self, sample: dict, timestamp: float = None) -> None:
+        """Adds a stats sample to the window
+
+        Args:
+            sample (dict): Stats sample from the Docker API
+            timestamp (float, optional): Time of the sample. Defaults to time.monotonic().
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        reading = (timestamp, cpu_percent(sample), memory_bytes(sample),
+                   *network_bytes(sample), *blkio_bytes(sample))
+        with self._lock:
+            self._samples.append(reading)
+            while self._samples[0][0] < timestamp - self.window:
+                self._samples.popleft()
+
+    def summary(self) -> dict:
+        """Summary of the window. Rates are calculated between the first and last sample.
+
+        Returns:
+            dict: Average and maximum CPU usage in percent, current memory usage in bytes,
+                network and block device rates in bytes per second. None if there are no
+                samples
+        """
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return None
+
+        first, last = samples[0], samples[-1]
+        duration = last[0] - first[0]
+        def rate(index):
+            if duration <= 0:
+                return 0
+            return round(max(last[index] - first[index], 0) / duration)
+
+        cpu = [sample[1] for sample in samples]
+        return {
+            "cpu": round(sum(cpu) / len(cpu), 1),
+            "cpu_max": round(max(cpu), 1),
+            "memory": last[2],
+            "net_rx": rate(3),
+            "net_tx": rate(4),
+            "blk_read": rate(5),
+            "blk_write": rate(6)
+        }
+
+class StatsCollector():
+    """Keeps one stats stream per running container and aggregates the samples in rolling
+    windows. Each stream runs in its own thread, reading a sample about every second, so
+    summaries are available without waiting for the Docker API.
+
+    Args:
+        client (docker.DockerClient): Docker client
+        window (float, optional): Length of the rolling windows in seconds. Defaults to 60.
+    """
+    def __init__(self, client: object, window: float = 60) -> None:
+        self.client = client
+        self.window = window
+
+        self._stats = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def sync(self, running_container_ids: list) -> None:
+        """Starts streams for new running containers and stops the streams of containers
+        which are no longer running
+
+        Args:
+            running_container_ids (list[str]): Full IDs of the running containers
+        """
+        running_container_ids = set(running_container_ids)
+        with self._lock:
+            for container_id in list(self._streams):
+                if container_id not in running_container_ids:
+                    self._streams.pop(container_id).set()
+                    self._stats.pop(container_id, None)
+
+            for container_id in running_container_ids - set(self._streams):
+                stop = threading.Event()
+                self._streams[container_id] = stop
+                self._stats[container_id] = ContainerStats(self.window)
+                threading.Thread(
+                    target=self._stream, args=(container_id, stop), daemon=True
+                ).start()
+
+    def summary(self, container_id: str) -> dict:
+        """Summary of the stats of a container, see :func:`ContainerStats.summary`
+
+        Args:
+            container_id (str): Full container ID
+
+        Returns:
+            dict: Stats summary. None if there is no stream for the container or no
+                samples yet
+        """
+        stats = self._stats.get(container_id)
+        return None if stats is None else stats.summary()
+
+    def _stream(self, container_id: str, stop: threading.Event) -> None:
+        stats = self._stats[container_id]
+        try:
+            for sample in self.client.api.stats(container_id, stream=True, decode=True):
+                if stop.is_set():
+                    return
+                stats.add(sample)
+        except Exception as error: # pylint: disable=broad-except
+            self.log.debug('Stats stream for "%s" ended: %s', container_id, error)
+
+        # The stream ended without being stopped, a new one is started at the next sync
+        with self._lock:
+            if self._streams.get(container_id) is stop:
+                self._streams.pop(container_id)
+                self._stats.pop(container_id, None)
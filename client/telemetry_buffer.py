@@ -0,0 +1,154 @@
+"""Module to buffer telemetry while the server is unreachable"""
+
+from collections import deque
+import json
+from logging import getLogger
+import os
+import threading
+import time
+import zlib
+
+class TelemetryBuffer():
+    """Bounded buffer for telemetry which could not be sent to the server.
+
+    Each entry holds the metric samples of a telemetry post, container states are only
+    included when they have changed since the previous entry. When the buffer is full the
+    oldest entries are moved to a spill file, if configured, until the file reaches its
+    maximum size. Entries which fit nowhere are dropped.
+
+    Args:
+        max_entries (int): Maximum number of entries kept in memory
+        spill_path (str, optional): Path to spill file. Defaults to None, no spill file.
+        max_spill_bytes (int, optional): Maximum size of the spill file. Defaults to 1 MB.
+    """
+    def __init__(   self, max_entries: int, spill_path: str = None,
+                    max_spill_bytes: int = 1024 * 1024) -> None:
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+
+        self._entries = deque()
+        self._max_entries = max_entries
+        self._container_states = {}
+        self._lock = threading.Lock()
+
+        self.dropped = 0
+        self.log = getLogger(self.__class__.__name__)
+        # Entries spilled by a previous run are counted once, then the count is kept running
+        self._spilled = self._spilled_entries()
+
+    def __len__(self) -> int:
+        return len(self._entries) + self._spilled
+
+    def record(self, telemetry_post: dict, timestamp: float = None) -> None:
+        """Records a telemetry post which could not be sent
+
+        Args:
+            telemetry_post (dict): Telemetry post
+            timestamp (float, optional): Time of the post. Defaults to time.time().
+        """
+        entry = {
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "cpu_load": telemetry_post.get("cpu_load"),
+            "memory_usage": telemetry_post.get("memory_usage")
+        }
+
+        # Same container state diff as DeviceHistory.add_telemetry in server/history.py, the
+        # client and server are built separately and the two must be kept in sync
+        with self._lock:
+            changed_states = {}
+            for container in telemetry_post.get("containers", []):
+                if self._container_states.get(container["name"]) != container["status"]:
+                    changed_states[container["name"]] = container["status"]
+                    self._container_states[container["name"]] = container["status"]
+            if changed_states:
+                entry["containers"] = changed_states
+
+            self._entries.append(entry)
+            if len(self._entries) > self._max_entries:
+                self._spill(self._entries.popleft())
+
+    def drain(self) -> list:
+        """Removes and returns all buffered entries, oldest first
+
+        Returns:
+            list[dict]: Buffered entries
+        """
+        with self._lock:
+            entries = self._read_spill_file() + list(self._entries)
+            self._spilled = 0
+            self._entries.clear()
+            self._container_states = {}
+        return entries
+
+    def restore(self, entries: list) -> None:
+        """Puts entries back in the buffer, for example if they could not be sent
+
+        Args:
+            entries (list[dict]): Entries returned by :func:`drain`
+        """
+        with self._lock:
+            self._entries.extendleft(reversed(entries))
+            while len(self._entries) > self._max_entries:
+                self._spill(self._entries.popleft())
+
+    @staticmethod
+    def encode(device_id: str, entries: list) -> bytes:
+        """Encodes entries into one compressed batch
+
+        Args:
+            device_id (str): Device ID
+            entries (list[dict]): Buffered entries
+
+        Returns:
+            bytes: Compressed batch
+        """
+        return zlib.compress(json.dumps({"id": device_id, "entries": entries}).encode())
+
+    def _spill(self, entry: dict) -> None:
+        if self.spill_path is None or self._spill_file_size() >= self.max_spill_bytes:
+            self.dropped += 1
+            return
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as stream:
+                stream.write(json.dumps(entry) + "\n")
+            self._spilled += 1
+        except OSError:
+            self.log.warning('Could not write to telemetry spill file "%s"', self.spill_path)
+            self.dropped += 1
+
+    def _spill_file_size(self) -> int:
+        try:
+            return os.path.getsize(self.spill_path)
+        except OSError:
+            return 0
+
+    def _spilled_entries(self) -> int:
+        if self.spill_path is None:
+            return 0
+        try:
+            with open(self.spill_path, encoding="utf-8") as stream:
+                return sum(1 for _ in stream)
+        except OSError:
+            return 0
+
+    def _read_spill_file(self) -> list:
+        if self.spill_path is None:
+            return []
+        try:
+            with open(self.spill_path, encoding="utf-8", errors="replace") as stream:
+                lines = [line for line in stream if line.strip()]
+            os.remove(self.spill_path)
+        except OSError:
+            return []
+
+        # A line can be cut short if the device lost power while spilling
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                self.dropped += 1
+        if len(entries) < len(lines):
+            self.log.warning('Skipped %s unreadable entries in telemetry spill file "%s"',
+                             len(lines) - len(entries), self.spill_path)
+        return entries
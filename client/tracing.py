@@ -0,0 +1,154 @@
+"""Module for tracing the commands run by the client
+
+The server adds a trace context, ``{"trace_id": trace_id, "span_id": span_id}``, to the
+commands it sends. The spans started while running a command are children of that context,
+and are exported to the server when they end, see ``server/tracing.py``. The spans can also
+be written as JSON lines to a local file.
+
+The server and the client are built separately. The trace context and the span stack of
+:class:`Span` and :class:`Tracer` are duplicated in ``server/tracing.py`` and must be kept in
+sync with it, as must the fields of the exported spans.
+"""
+
+import json
+from logging import getLogger
+import threading
+import time
+from uuid import uuid4
+
+class Span(): # pylint: disable=too-many-instance-attributes
+    """A timed step of a trace. Used as a context manager, which makes the span the parent of
+    the spans started in the same thread until it ends.
+
+    Args:
+        tracer (Tracer): Tracer exporting the span
+        name (str): Span name
+        context (dict, optional): Trace context of the parent span. Defaults to None,
+            a new trace.
+        attributes (dict, optional): Span attributes. Defaults to None.
+    """
+    def __init__(   self, tracer: object, name: str, context: dict = None,
+                    attributes: dict = None) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = uuid4().hex if context is None else context["trace_id"]
+        self.parent_id = None if context is None else context.get("span_id")
+        self.span_id = uuid4().hex[:16]
+        self.attributes = {} if attributes is None else attributes
+        self.start = time.time()
+        self.error = None
+        self._started = tracer.clock()
+
+    def context(self) -> dict:
+        """Trace context to propagate to child spans
+
+        Returns:
+            dict: Trace ID and span ID
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def __enter__(self):
+        self.tracer.push(self)
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.tracer.pop(self)
+        if exception_value is not None:
+            self.error = str(exception_value)
+        self.tracer.export({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.tracer.service,
+            "start": self.start,
+            "duration": round(self.tracer.clock() - self._started, 6),
+            "attributes": {**self.tracer.attributes, **self.attributes},
+            "error": self.error
+        })
+
+class Tracer():
+    """Starts spans and exports them when they end
+
+    Args:
+        service (str, optional): Name of the service the spans are started in.
+            Defaults to ``client``.
+        exporter (callable, optional): Called with each finished span. Defaults to None.
+        path (str, optional): File where the spans are written as JSON lines.
+            Defaults to None, not written.
+        attributes (dict, optional): Attributes added to every span, for example the device
+            ID. Defaults to None.
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+    """
+    def __init__(   self, service: str = "client", exporter: object = None, # pylint: disable=too-many-arguments
+                    path: str = None, attributes: dict = None,
+                    clock: object = time.monotonic) -> None:
+        self.service = service
+        self.exporter = exporter
+        self.path = path
+        self.attributes = {} if attributes is None else attributes
+        self.clock = clock
+
+        self._local = threading.local()
+        self.log = getLogger(self.__class__.__name__)
+
+    def span(self, name: str, context: dict = None, **attributes) -> Span:
+        """Starts a span
+
+        Args:
+            name (str): Span name
+            context (dict, optional): Trace context of the parent span. Defaults to None,
+                the current span of the thread or a new trace.
+            **attributes: Span attributes
+
+        Returns:
+            Span: The started span
+        """
+        if context is None and self.current() is not None:
+            context = self.current().context()
+        return Span(self, name, context, attributes)
+
+    def current(self) -> Span:
+        """Innermost span used as context manager in this thread
+
+        Returns:
+            Span: Current span. None if there is none
+        """
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def push(self, span: Span) -> None:
+        """Makes a span the current span of the thread
+
+        Args:
+            span (Span): Span
+        """
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        self._local.stack.append(span)
+
+    def pop(self, span: Span) -> None:
+        """Reverts :func:`push`
+
+        Args:
+            span (Span): Span
+        """
+        stack = getattr(self._local, "stack", [])
+        if span in stack:
+            stack.remove(span)
+
+    def export(self, span: dict) -> None:
+        """Exports a finished span
+
+        Args:
+            span (dict): Finished span
+        """
+        if self.exporter is not None:
+            self.exporter(span)
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as stream:
+                stream.write(json.dumps(span) + "\n")
+        except OSError:
+            self.log.warning('Could not write span to "%s"', self.path)
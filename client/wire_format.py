@@ -0,0 +1,94 @@
+"""Module to encode telemetry in the compact binary wire format
+
+Telemetry is encoded with MessagePack, where known keys are replaced by field IDs and repeated
+string values (names, repositories, tags and SHAs) are replaced by references to a string
+dictionary that is built up per connection. The message is compressed with zlib.
+
+A string is defined the first time it is sent as ``[string_id, string]``, subsequent posts
+only send ``string_id``. The server keeps the matching dictionary for the connection, which
+means that the encoder must be reset whenever the connection is reestablished or if a post
+could not be delivered.
+
+The field IDs must match the decoder in ``server/wire_format.py``.
+"""
+
+import zlib
+
+try:
+    import msgpack
+except ImportError:   # pragma: no cover
+    msgpack = None  # pylint: disable=invalid-name
+
+ENCODING = "msgpack"
+FORMAT_VERSION = 1
+
+FIELD_IDS = {
+    "name": 0,
+    "id": 1,
+    "cpu_load": 2,
+    "memory_usage": 3,
+    "containers": 4,
+    "push_interval": 5,
+    "image_sha": 6,
+    "image_name": 7,
+    "image_repo": 8,
+    "image_tag": 9,
+    "status": 10
+}
+
+DICTIONARY_FIELDS = ("name", "image_sha", "image_name", "image_repo", "image_tag", "status")
+
+MAX_DICTIONARY_SIZE = 4096
+
+def available() -> bool:
+    """Checks if the binary wire format can be used
+
+    Returns:
+        bool: If the MessagePack library is installed
+    """
+    return msgpack is not None
+
+class TelemetryEncoder():
+    """Encodes telemetry posts for one connection to the server"""
+    def __init__(self) -> None:
+        self._strings = {}
+
+    def reset(self) -> None:
+        """Clears the string dictionary. Must be done when a new connection is made"""
+        self._strings = {}
+
+    def encode(self, telemetry_post: dict) -> bytes:
+        """Encodes a telemetry post
+
+        Args:
+            telemetry_post (dict): Telemetry post
+
+        Returns:
+            bytes: Encoded and compressed telemetry post
+        """
+        message = {"v": FORMAT_VERSION, "d": self._encode_object(telemetry_post)}
+        return zlib.compress(msgpack.packb(message))
+
+    def _encode_object(self, obj):
+        if isinstance(obj, dict):
+            return {
+                FIELD_IDS.get(key, key): self._encode_value(key, value)
+                for key, value in obj.items()
+            }
+        if isinstance(obj, list):
+            return [self._encode_object(item) for item in obj]
+        return obj
+
+    def _encode_value(self, key, value):
+        if key not in DICTIONARY_FIELDS or not isinstance(value, str):
+            return self._encode_object(value)
+
+        if value in self._strings:
+            return self._strings[value]
+
+        if len(self._strings) >= MAX_DICTIONARY_SIZE:
+            return [None, value]
+
+        string_id = len(self._strings)
+        self._strings[value] = string_id
+        return [string_id, value]
@@ -9,16 +9,33 @@ This server also enables some commands for the user, such as update, start and s
 """
 
 from logging import getLogger
+import math
 import os
-import sys
+from hashlib import sha1
+from hmac import compare_digest
 from http import HTTPStatus
+from urllib.parse import urlencode
 from requests import get as http_get
 from flask import Flask, request, render_template, Response, jsonify
-from flask_socketio import SocketIO
+from markupsafe import Markup
+from flask_socketio import SocketIO, emit, join_room
 from decentralized_logger import setup_logging, disable_loggers, level_translator
 
+from archive import DeviceArchive
+from commands import CommandTracker
 from fleet import Fleet
 from docker_hub import DockerHub
+from fleet_query import FleetQuery
+from history import decode_backlog
+from garbage_collection import GarbageCollectionScheduler, parse_window
+from flow_control import FlowController
+from ingest import TelemetryIngest
+from labels import parse_selector
+from profiler import SamplingProfiler, check_parameters
+from refresh import RefreshCoordinator
+from registry_webhook import parse_push_notification
+from tracing import Tracer, valid_span
+import wire_format
 
 APPLICATION_NAME = "fleet-manager-server"
 
@@ -42,6 +59,49 @@ LOG_SERVER_IP = os.getenv("LOG_SERVER_IP", "127.0.0.1")
 LOG_SERVER_PORT = os.getenv("LOG_SERVER_PORT", "9020")
 LOG_LEVEL = level_translator(os.getenv("LOG_LEVEL", "INFO"))
 
+BROADCAST_WINDOW = float(os.getenv("BROADCAST_WINDOW", "0.25"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "1000"))
+PUSH_INTERVAL = float(os.getenv("PUSH_INTERVAL", "60"))
+MIN_PUSH_INTERVAL = float(os.getenv("MIN_PUSH_INTERVAL", "10"))
+MAX_PUSH_INTERVAL = float(os.getenv("MAX_PUSH_INTERVAL", "600"))
+HISTORY_LENGTH = int(os.getenv("HISTORY_LENGTH", "1440"))
+MAX_BACKLOG_BYTES = int(os.getenv("MAX_BACKLOG_BYTES", str(8 * 1024 * 1024)))
+REGISTRY_WEBHOOK_TOKEN = os.getenv("REGISTRY_WEBHOOK_TOKEN")
+REGISTRY_RECONCILIATION_INTERVAL = float(os.getenv("REGISTRY_RECONCILIATION_INTERVAL", "21600"))
+DEVICE_EVICTION_THRESHOLD = float(os.getenv("DEVICE_EVICTION_THRESHOLD", "604800"))
+DEVICE_ARCHIVE_SIZE = int(os.getenv("DEVICE_ARCHIVE_SIZE", "10000"))
+DEVICE_ARCHIVE_FILE = os.getenv("DEVICE_ARCHIVE_FILE")
+TAG_CATALOGUE_REFRESH_INTERVAL = float(os.getenv("TAG_CATALOGUE_REFRESH_INTERVAL", "3600"))
+COMMAND_ACK_TIMEOUT = float(os.getenv("COMMAND_ACK_TIMEOUT", "10"))
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "900"))
+COMMAND_RETRIES = int(os.getenv("COMMAND_RETRIES", "1"))
+LAZY_DASHBOARD_THRESHOLD = int(os.getenv("LAZY_DASHBOARD_THRESHOLD", "100"))
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+TRACE_FILE = os.getenv("TRACE_FILE")
+REFRESH_DEADLINE = float(os.getenv("REFRESH_DEADLINE", "10"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+GC_DISK_THRESHOLD = float(os.getenv("GC_DISK_THRESHOLD", "80"))
+GC_CRITICAL_DISK_THRESHOLD = float(os.getenv("GC_CRITICAL_DISK_THRESHOLD", "95"))
+GC_CONCURRENCY = int(os.getenv("GC_CONCURRENCY", "5"))
+GC_IDLE_WINDOW = os.getenv("GC_IDLE_WINDOW")
+GC_MIN_INTERVAL = float(os.getenv("GC_MIN_INTERVAL", "86400"))
+
+WATCH_BOOST_DURATION = 30
+UPDATE_BOOST_DURATION = 300
+FLOW_CONTROL_ADJUST_INTERVAL = 5
+COMMAND_TIMEOUT_CHECK_INTERVAL = 1
+DEVICE_EVICTION_INTERVAL = 60
+DEVICE_ARCHIVE_SAVE_INTERVAL = 60
+IMAGE_PREFETCH_INTERVAL = 1
+GC_SCHEDULE_INTERVAL = 60
+FLEET_ROOM = 'fleet'
+
+DASHBOARD_FIELDS = ",".join([
+    "id", "name", "ip_address", "online", "cpu_load", "memory_usage", "last_updated",
+    "containers.name", "containers.status", "containers.image_name",
+    "containers.update_available"
+])
+
 DISABLE_LOGGERS = [
     "werkzeug",
     "docker.utils.config",
@@ -60,25 +120,278 @@ setup_logging(
 log = getLogger(APPLICATION_NAME) # pylint: disable=invalid-name
 web_app = Flask(APPLICATION_NAME) # pylint: disable=invalid-name
 socket_io = SocketIO(web_app) # pylint: disable=invalid-name
+tracer = Tracer(APPLICATION_NAME, TRACE_FILE) # pylint: disable=invalid-name
+profiler = SamplingProfiler() # pylint: disable=invalid-name
 
 @web_app.route("/")
 def index():
     """Main endpoint for the web app"""
     if fleet.empty():
         return "No device registered"
-    return render_template("index.html", fleet=fleet.get_fleet_information())
+
+    # Large fleets get the dashboard which loads devices page by page,
+    # the mode can be forced with ?mode=lazy or ?mode=full
+    mode = request.args.get("mode")
+    if mode == "lazy" or (mode != "full" and fleet.size() > LAZY_DASHBOARD_THRESHOLD):
+        first_page, next_cursor = FleetQuery(
+            {"limit": DASHBOARD_PAGE_SIZE, "fields": DASHBOARD_FIELDS}
+        ).apply(fleet.get_fleet_information())
+        return render_template(
+            "dashboard.html",
+            fleet=first_page,
+            next_cursor=next_cursor,
+            page_size=DASHBOARD_PAGE_SIZE,
+            fields=DASHBOARD_FIELDS
+        )
+
+    return render_template(
+        "index.html",
+        fleet=fleet.get_fleet_information(),
+        fleet_json=Markup(html_safe_json(fleet.fleet_json()))
+    )
+
+def html_safe_json(text: str) -> str:
+    """Escapes JSON for embedding in a HTML script tag, same as the ``tojson`` filter.
+    The escaped characters can only occur inside strings, so the result is still valid JSON.
+
+    Args:
+        text (str): JSON
+
+    Returns:
+        str: Escaped JSON
+    """
+    for character, escaped in (("<", "\\u003c"), (">", "\\u003e"), ("&", "\\u0026"),
+                               ("'", "\\u0027")):
+        text = text.replace(character, escaped)
+    return text
 
 @web_app.route("/fleet", methods=['GET'])
 def fleet():
-    """Endpoint to retrieve data about fleet"""
-    return jsonify(fleet.get_fleet_information())
+    """Endpoint to retrieve data about fleet.
+
+    Supports filters, field projection and cursor pagination through query parameters,
+    see :class:`fleet_query.FleetQuery`. The link to the next page is returned in the
+    ``Link`` header. Responds with 304 if the fleet is unchanged since the ETag in
+    ``If-None-Match``, without recomputing the fleet information.
+    """
+    etag = sha1(f'{fleet.state_tag()}?{request.query_string.decode()}'.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=HTTPStatus.NOT_MODIFIED)
+        response.set_etag(etag)
+        return response
+
+    try:
+        query = FleetQuery(request.args)
+    except ValueError as error:
+        return Response(str(error), status=HTTPStatus.BAD_REQUEST)
+
+    # The label index narrows the fleet down before the other filters are applied
+    candidates = None if query.selector is None else fleet.select(query.selector)
+    fleet_information = fleet.get_fleet_information(candidates)
+
+    if query.returns_full_devices:
+        # Devices are returned unchanged, the response is assembled from the cached fragments
+        device_ids, next_cursor = query.select(fleet_information)
+        response = Response(fleet.fleet_json(device_ids), mimetype="application/json")
+    else:
+        devices, next_cursor = query.apply(fleet_information)
+        response = jsonify(devices)
+
+    response.set_etag(etag)
+    if next_cursor is not None:
+        next_page_args = {**request.args.to_dict(), "cursor": next_cursor}
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(next_page_args)}>; rel="next"'
+    return response
+
+@web_app.route("/fleet/<device_id>/history", methods=['GET'])
+def device_history(device_id: str) -> Response:
+    """Endpoint to retrieve the telemetry history of a device
+
+    Args:
+        device_id (str): Device ID
+
+    Returns:
+        Response: History entries, oldest first
+    """
+    history = fleet.history(device_id)
+    if history is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return jsonify(history)
+
+@web_app.route("/archive", methods=['GET'])
+def archive() -> Response:
+    """Endpoint to list the devices archived after being offline for a long time
+
+    Returns:
+        Response: ID, name, labels and last seen time of the archived devices
+    """
+    return jsonify(fleet.archive.devices())
+
+@web_app.route("/archive/<device_id>", methods=['GET'])
+def archived_device(device_id: str) -> Response:
+    """Endpoint to retrieve the last telemetry post of an archived device
+
+    Args:
+        device_id (str): Device ID
+
+    Returns:
+        Response: Archived device
+    """
+    device = fleet.archive.get(device_id)
+    if device is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return jsonify(device)
+
+@web_app.route("/labels", methods=['GET'])
+def labels() -> Response:
+    """Endpoint to list the device labels in use
+
+    Returns:
+        Response: Label keys mapped to their values
+    """
+    return jsonify(fleet.labels.labels())
+
+@web_app.route("/images", methods=['GET'])
+def images() -> Response:
+    """Endpoint to query the tags in the remote repository. ``prefix`` limits the tags to
+    those starting with the prefix. With ``versions=true`` only tags with a semantic version
+    after the prefix are returned, sorted by version.
+
+    Returns:
+        Response: Image tags
+    """
+    catalogue = fleet.docker_hub.catalogue
+    prefix = request.args.get("prefix", "")
+    if request.args.get("versions", "false").lower() == "true":
+        return jsonify(catalogue.versions(prefix))
+    return jsonify(catalogue.tags(prefix))
 
 @socket_io.event
 def telemetry(telemetry_post):
     """Telemetry consumer"""
+    if isinstance(telemetry_post, bytes):
+        try:
+            telemetry_post = wire_decoders.setdefault(
+                request.sid, wire_format.TelemetryDecoder()
+            ).decode(telemetry_post)
+        except ValueError as error:
+            # The string dictionary can no longer be trusted. The client falls back to JSON
+            # until it reconnects, and retries the rejected post
+            log.warning('Could not decode telemetry from %s: %s', request.remote_addr, error)
+            wire_decoders.pop(request.sid, None)
+            emit('wire_format_announcement', {'encodings': ["json"]}, to=request.sid)
+            return False
     log.debug("Telemetry post recieved: %s", telemetry_post)
     telemetry_post["ip_address"] = request.remote_addr
-    fleet.add_telemetry(telemetry_post)
+    traces = telemetry_post.pop("traces", None) or []
+    if "configured_push_interval" in telemetry_post:
+        flow_controller.register(telemetry_post["id"], telemetry_post["configured_push_interval"])
+    refresh_ids = telemetry_post.pop("refresh_ids", None) or []
+    register_device_connection(telemetry_post["id"])
+    accepted = telemetry_ingest.submit(telemetry_post)
+    if not accepted:
+        # The client retries the post with its traces and refresh IDs, the device stays
+        # online in the meantime
+        fleet.heartbeat(telemetry_post["id"])
+        return False
+    for refresh_id in refresh_ids:
+        refresh_coordinator.answer(telemetry_post["id"], refresh_id)
+    # The telemetry reflects the result of the traced commands, which ends their traces
+    for context in traces:
+        if isinstance(context, dict) and isinstance(context.get("trace_id"), str):
+            tracer.finish(context, telemetry_post["id"])
+    return True
+
+@socket_io.event
+def telemetry_backlog(backlog):
+    """Consumer for telemetry recorded by a client while the server was unreachable"""
+    try:
+        backlog = decode_backlog(backlog, MAX_BACKLOG_BYTES)
+    except ValueError as error:
+        log.warning('Invalid telemetry backlog from %s: %s', request.remote_addr, error)
+        return False
+    log.info('Telemetry backlog of %s entries recieved from "%s"',
+        len(backlog["entries"]), backlog["id"])
+    if not fleet.add_history(backlog["id"], backlog["entries"]):
+        # The first post of the device after a server restart can still be queued
+        telemetry_ingest.flush()
+        if not fleet.add_history(backlog["id"], backlog["entries"]):
+            log.warning('Telemetry backlog from unknown device "%s" rejected', backlog["id"])
+            return False
+    return True
+
+@socket_io.event
+def spans(finished_spans):
+    """Consumer for the spans of the commands run by the clients. The spans are attributed
+    to the device registered on the connection, malformed spans are dropped"""
+    device_id = device_connections.get(request.sid)
+    if device_id is None or not isinstance(finished_spans, list):
+        return
+    for span in finished_spans:
+        if valid_span(span):
+            span["attributes"]["device_id"] = device_id
+            tracer.record(span)
+
+@socket_io.event
+def heartbeat(heartbeat_post):
+    """Heartbeat consumer, keeps devices online between telemetry posts"""
+    register_device_connection(heartbeat_post["id"])
+    fleet.heartbeat(heartbeat_post["id"])
+
+def register_device_connection(device_id: str) -> None:
+    """Keeps track of which connection belongs to which device and sends push settings
+    to the device if they have changed. Must be called from a socket event handler.
+
+    Args:
+        device_id (str): Device ID
+    """
+    if device_connections.get(request.sid) != device_id:
+        device_connections[request.sid] = device_id
+        join_room(device_room(device_id))
+        join_room(FLEET_ROOM)
+        flow_controller.forget(device_id)
+
+    settings = flow_controller.changed_settings(device_id)
+    if settings is not None:
+        fleet.set_push_interval(device_id, settings["push_interval"])
+        emit('flow_control', settings)
+
+def notify_push_settings(device_ids: list) -> None:
+    """Sends new push settings to devices
+
+    Args:
+        device_ids (list[str]): Devices to notify
+    """
+    for device_id in device_ids:
+        settings = flow_controller.settings(device_id)
+        fleet.set_push_interval(device_id, settings["push_interval"])
+        socket_io.emit('flow_control', settings, to=device_room(device_id))
+
+def send_refresh(message: dict) -> None:
+    """Sends a refresh request to all connected devices in one message
+
+    Args:
+        message (dict): Refresh ID and the devices which should answer
+    """
+    socket_io.emit('refresh', message, to=FLEET_ROOM)
+
+def device_room(device_id: str) -> str:
+    """Socket room which the connection of a device is part of
+
+    Args:
+        device_id (str): Device ID
+
+    Returns:
+        str: Room name
+    """
+    return f'device-{device_id}'
+
+@socket_io.event
+def watch_devices(device_ids):
+    """Devices which are watched in the web app, which get a shorter push interval"""
+    # Devices not in the fleet are ignored, they would never be removed from the flow control
+    device_ids = [device_id for device_id in device_ids if device_id in fleet]
+    notify_push_settings(flow_controller.boost(device_ids, WATCH_BOOST_DURATION))
 
 @socket_io.event
 def send_command(device_id: str, cmd: dict) -> None:
@@ -89,15 +402,29 @@ def send_command(device_id: str, cmd: dict) -> None:
         cmd (dict): Command dictionary
     """
     log.debug("Sending command: %s", cmd)
-    socket_io.emit(f'command_{device_id}', cmd)
+    with tracer.span('send_command', cmd.get('trace'), device_id=device_id):
+        socket_io.emit(f'command_{device_id}', cmd)
+
+@socket_io.event
+def command_status(status):
+    """Consumer for command acknowledgements, progress and results from the clients"""
+    log.debug("Command status recieved: %s", status)
+    command_tracker.update(status)
 
 socket_connections = []
+device_connections = {}
+wire_decoders = {}
 
 @socket_io.on('connect')
 def connect():
     log.info('Device connected, addr: %s, sid: %s', request.remote_addr, request.sid)
     if 'ignore-me' in request.args and request.args.get('ignore-me') == 'True':
         log.info('Device ignored')
+        socket_io.emit(
+            'wire_format_announcement',
+            {'encodings': wire_format.supported_encodings()},
+            to=request.sid
+        )
         return
     socket_connections.append(f'{request.remote_addr}:{request.sid}')
     log.info('Device added to known connections. Connection list: %s', socket_connections)
@@ -105,6 +432,10 @@ def connect():
 @socket_io.on('disconnect')
 def disconnect():
     log.info('Device disconnected, addr: %s, sid: %s', request.remote_addr, request.sid)
+    wire_decoders.pop(request.sid, None)
+    device_id = device_connections.pop(request.sid, None)
+    if device_id is not None:
+        flow_controller.forget(device_id)
     if 'ignore-me' in request.args and request.args.get('ignore-me') == 'True':
         log.info('Device ignored')
         return
@@ -124,9 +455,292 @@ def container_command() -> Response:
     """
     command_info = request.get_json()
 
-    send_command(command_info['id'], command_info)
+    with tracer.span('container_command', command=command_info['command'],
+                     device_id=command_info['id'],
+                     container_name=command_info.get('container_name')) as span:
+        # The trace ends when the telemetry reflecting the result of the command arrives
+        tracer.hold(span)
+        command_info['trace'] = span.context()
+        if command_info['command'] == 'update_container':
+            notify_push_settings(
+                flow_controller.boost([command_info['id']], UPDATE_BOOST_DURATION)
+            )
+
+        command_id = command_tracker.submit(command_info['id'], command_info)
+    return jsonify({"command_id": command_id, "trace_id": span.trace_id}), HTTPStatus.ACCEPTED
+
+@web_app.route("/bulk-command", methods=['POST'])
+def bulk_command() -> Response:
+    """Command entrypoint for several container commands at once. The commands are sent
+    in one batch message per device, which runs them as a unit.
+
+    Body: ``{"commands": [{"id": device_id, "command": command, "container_name": name}]}``,
+    or ``{"selector": selector, "command": command, "container_name": name}`` to send the
+    same command to all devices matching a label selector.
+
+    Returns:
+        Response: HTTP response with the commands and their command IDs
+    """
+    body = request.get_json()
+    if 'selector' in body:
+        try:
+            device_ids = fleet.select(parse_selector(body['selector']))
+        except ValueError as error:
+            return Response(str(error), status=HTTPStatus.BAD_REQUEST)
+        commands_info = [
+            {**{key: value for key, value in body.items() if key != 'selector'}, 'id': device_id}
+            for device_id in sorted(device_ids)
+        ]
+    else:
+        commands_info = body.get('commands', [])
+    if any('id' not in command_info or 'command' not in command_info
+           for command_info in commands_info):
+        return Response('Every command needs "id" and "command"', status=HTTPStatus.BAD_REQUEST)
+
+    device_commands = {}
+    for command_info in commands_info:
+        device_commands.setdefault(command_info['id'], []).append(command_info)
+
+    for device_id, device_command_list in device_commands.items():
+        with tracer.span('bulk_command', device_id=device_id) as span:
+            tracer.hold(span)
+            for command_info in device_command_list:
+                command_info['trace'] = span.context()
+            if any(command_info['command'] == 'update_container'
+                   for command_info in device_command_list):
+                notify_push_settings(flow_controller.boost([device_id], UPDATE_BOOST_DURATION))
+            command_tracker.submit_batch(device_id, device_command_list)
+
+    return jsonify({"commands": commands_info}), HTTPStatus.ACCEPTED
+
+@web_app.route("/commands", methods=['GET'])
+def commands() -> Response:
+    """Endpoint to list tracked commands, newest first. Can be filtered on ``device_id``
+    and ``container_name``, ``in_flight=true`` only lists commands which have not finished
+
+    Returns:
+        Response: Command records
+    """
+    return jsonify(command_tracker.commands(
+        device_id=request.args.get("device_id"),
+        container_name=request.args.get("container_name"),
+        in_flight=request.args.get("in_flight", "false").lower() in ("true", "1")
+    ))
+
+@web_app.route("/commands/latency", methods=['GET'])
+def command_latency() -> Response:
+    """Endpoint to retrieve end-to-end latency histograms of the commands
+
+    Returns:
+        Response: Command type mapped to latency histogram
+    """
+    return jsonify(command_tracker.latency())
+
+@web_app.route("/refresh", methods=['POST'])
+def refresh() -> Response:
+    """Asks devices for fresh telemetry and waits for the answers, at most ``deadline``
+    seconds. The answered telemetry is applied to the fleet before responding.
+
+    Body: ``{"devices": [device_id], "deadline": seconds}`` or
+    ``{"selector": selector, "deadline": seconds}``. All devices in the fleet are refreshed
+    when neither devices nor selector is given.
+
+    Returns:
+        Response: Refresh result with the devices which did not answer in time
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        deadline = float(body.get('deadline', REFRESH_DEADLINE))
+        if not math.isfinite(deadline) or deadline < 0:
+            raise ValueError(f'Deadline must be a positive number, got {deadline}')
+        if 'selector' in body:
+            device_ids = fleet.select(parse_selector(body['selector']))
+        elif 'devices' in body:
+            if not isinstance(body['devices'], list) or \
+                    not all(isinstance(device_id, str) for device_id in body['devices']):
+                raise ValueError('"devices" must be a list of device IDs')
+            device_ids = set(body['devices'])
+        else:
+            device_ids = None
+    except (TypeError, ValueError) as error:
+        return Response(str(error), status=HTTPStatus.BAD_REQUEST)
+
+    if device_ids is None:
+        refresh_id = refresh_coordinator.start(fleet.device_ids(), all_devices=True)
+    else:
+        refresh_id = refresh_coordinator.start(device_ids)
+    result = refresh_coordinator.gather(refresh_id, deadline, socket_io.sleep)
+    telemetry_ingest.flush()
+    return jsonify(result)
+
+@web_app.route("/refresh/<refresh_id>", methods=['GET'])
+def refresh_result(refresh_id: str) -> Response:
+    """Endpoint to retrieve the result of a refresh
+
+    Args:
+        refresh_id (str): Refresh ID
+
+    Returns:
+        Response: Refresh result
+    """
+    result = refresh_coordinator.result(refresh_id)
+    if result is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return jsonify(result)
+
+@web_app.route("/garbage-collection", methods=['GET'])
+def garbage_collection() -> Response:
+    """Endpoint to retrieve the state of the scheduled garbage collection
+
+    Returns:
+        Response: Devices being collected and the last collection time of each device
+    """
+    return jsonify(gc_scheduler.status())
+
+@web_app.route("/traces", methods=['GET'])
+def traces() -> Response:
+    """Endpoint to retrieve latency histograms of the traced steps, per span name.
+    ``device_id`` only includes the spans of one device.
+
+    Returns:
+        Response: Span name mapped to latency histogram
+    """
+    return jsonify(tracer.summary(request.args.get("device_id")))
+
+@web_app.route("/traces/slowest-devices", methods=['GET'])
+def slowest_devices() -> Response:
+    """Endpoint to list the devices with the highest mean duration of a traced step, given
+    by ``span``, for example ``pulling``. ``count`` limits the number of devices.
+
+    Returns:
+        Response: Device ID, number of spans and mean duration of the slowest devices
+    """
+    span = request.args.get("span")
+    if span is None:
+        return Response('Missing "span"', status=HTTPStatus.BAD_REQUEST)
+    try:
+        count = int(request.args.get("count", "10"))
+    except ValueError:
+        return Response('Invalid "count"', status=HTTPStatus.BAD_REQUEST)
+    return jsonify(tracer.slowest_devices(span, count))
+
+@web_app.route("/commands/<command_id>", methods=['GET'])
+def command(command_id: str) -> Response:
+    """Endpoint to retrieve a tracked command
+
+    Args:
+        command_id (str): Command ID
+
+    Returns:
+        Response: Command record
+    """
+    record = command_tracker.get(command_id)
+    if record is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    return jsonify(record)
+
+@web_app.route("/registry-webhook", methods=['POST'])
+def registry_webhook() -> Response:
+    """Entrypoint for push notifications from the container registry. The token must be
+    passed as the query parameter ``token``. See :mod:`registry_webhook` for supported formats.
+
+    Returns:
+        Response: HTTP response
+    """
+    if REGISTRY_WEBHOOK_TOKEN is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    if not compare_digest(request.args.get("token", ""), REGISTRY_WEBHOOK_TOKEN):
+        return Response(status=HTTPStatus.FORBIDDEN)
+
+    try:
+        pushes = parse_push_notification(request.get_json(force=True, silent=True))
+    except ValueError as error:
+        log.warning('Invalid registry push notification: %s', error)
+        return Response(str(error), status=HTTPStatus.BAD_REQUEST)
+
+    log.info('Images pushed to registry: %s', pushes)
+    if pushes:
+        socket_io.start_background_task(fleet.images_pushed, pushes)
     return Response(status=HTTPStatus.ACCEPTED)
 
+def admin_authorization() -> Response:
+    """Checks the admin token, passed as ``Authorization: Bearer <token>``
+
+    Returns:
+        Response: Error response. None if authorized
+    """
+    if ADMIN_TOKEN is None:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    token = request.headers.get("Authorization", "")
+    if not compare_digest(token, f'Bearer {ADMIN_TOKEN}'):
+        return Response(status=HTTPStatus.FORBIDDEN)
+    return None
+
+def profile_parameters() -> tuple:
+    """Profile duration and sample interval from the query parameters ``duration`` and
+    ``interval``, in seconds
+
+    Raises:
+        ValueError: If the duration or interval is not a finite positive number
+
+    Returns:
+        tuple[float, float]: Duration and interval
+    """
+    duration = float(request.args.get("duration", "10"))
+    interval = float(request.args.get("interval", "0.01"))
+    check_parameters(duration, interval)
+    return duration, interval
+
+@web_app.route("/admin/profile", methods=['POST'])
+def profile_server() -> Response:
+    """Records a statistical profile of the server for ``duration`` seconds, at most one
+    minute. Requires the admin token.
+
+    Returns:
+        Response: Collapsed stacks, one line per stack with the number of samples
+    """
+    error = admin_authorization()
+    if error is not None:
+        return error
+    try:
+        duration, interval = profile_parameters()
+        profiler.start(duration, interval)
+    except ValueError as parameter_error:
+        return Response(str(parameter_error), status=HTTPStatus.BAD_REQUEST)
+    except RuntimeError as running_error:
+        return Response(str(running_error), status=HTTPStatus.CONFLICT)
+
+    # The sampler runs in its own thread, the event loop keeps serving meanwhile
+    while profiler.running:
+        socket_io.sleep(0.1)
+    log.info('Server profile recorded, %s samples', profiler.samples)
+    return Response(profiler.collapsed(), mimetype="text/plain")
+
+@web_app.route("/admin/profile/<device_id>", methods=['POST'])
+def profile_device(device_id: str) -> Response:
+    """Asks a client to record a statistical profile for ``duration`` seconds, at most one
+    minute. Requires the admin token. The collapsed stacks are the ``result`` of the command,
+    see ``GET /commands/<command_id>``.
+
+    Args:
+        device_id (str): Device ID
+
+    Returns:
+        Response: HTTP response with the command ID
+    """
+    error = admin_authorization()
+    if error is not None:
+        return error
+    try:
+        duration, interval = profile_parameters()
+    except ValueError as parameter_error:
+        return Response(str(parameter_error), status=HTTPStatus.BAD_REQUEST)
+
+    command_id = command_tracker.submit(device_id, {
+        "command": "profile", "id": device_id, "duration": duration, "interval": interval
+    })
+    return jsonify({"command_id": command_id}), HTTPStatus.ACCEPTED
+
 @web_app.route("/device-command", methods=['POST'])
 def device_command() -> Response:
     """Command entrypoint for devices from the user web app
@@ -142,19 +756,65 @@ def device_command() -> Response:
     return Response(status=HTTPStatus.ACCEPTED)
 
 fleet = None    # pylint: disable=invalid-name
+telemetry_ingest = None # pylint: disable=invalid-name
+flow_controller = None  # pylint: disable=invalid-name
+command_tracker = None  # pylint: disable=invalid-name
+gc_scheduler = None  # pylint: disable=invalid-name
+refresh_coordinator = RefreshCoordinator(send_refresh) # pylint: disable=invalid-name
 
 def main():
     """Main program"""
     disable_loggers(DISABLE_LOGGERS)
 
-    try:
-        docker_hub = DockerHub(http_get, DOCKER_HUB_USERNAME, DOCKER_HUB_PASSWORD, DOCKER_HUB_REPO)
-    except PermissionError:
-        log.error('Could not log into Docker hub')
-        sys.exit(1)
+    # Nothing on the way to serving waits for Docker hub, the tag catalogue and the image SHAs
+    # are fetched in background tasks and login problems are logged there
+    docker_hub = DockerHub(http_get, DOCKER_HUB_USERNAME, DOCKER_HUB_PASSWORD, DOCKER_HUB_REPO)
+    if REGISTRY_WEBHOOK_TOKEN is not None:
+        docker_hub.reconciliation_interval = REGISTRY_RECONCILIATION_INTERVAL
+    socket_io.start_background_task(
+        docker_hub.run_catalogue_refresh, TAG_CATALOGUE_REFRESH_INTERVAL, socket_io.sleep
+    )
 
-    global fleet # pylint: disable=global-statement, invalid-name
-    fleet = Fleet(docker_hub, socket_connections, event_stream)
+    # pylint: disable=global-statement, invalid-name
+    global fleet, telemetry_ingest, flow_controller, command_tracker, gc_scheduler
+    fleet = Fleet(
+        docker_hub, socket_connections, event_stream, HISTORY_LENGTH,
+        DeviceArchive(DEVICE_ARCHIVE_SIZE, DEVICE_ARCHIVE_FILE)
+    )
+    fleet.forget_listeners.append(tracer.forget)
+    socket_io.start_background_task(
+        fleet.run_eviction, DEVICE_EVICTION_THRESHOLD, DEVICE_EVICTION_INTERVAL, socket_io.sleep
+    )
+    socket_io.start_background_task(
+        fleet.archive.run_persistence, DEVICE_ARCHIVE_SAVE_INTERVAL, socket_io.sleep
+    )
+    socket_io.start_background_task(
+        docker_hub.run_prefetch, IMAGE_PREFETCH_INTERVAL, socket_io.sleep, fleet.publish
+    )
+
+    telemetry_ingest = TelemetryIngest(fleet, BROADCAST_WINDOW, INGEST_QUEUE_DEPTH)
+    socket_io.start_background_task(telemetry_ingest.run, socket_io.sleep)
+
+    flow_controller = FlowController(
+        PUSH_INTERVAL, MIN_PUSH_INTERVAL, MAX_PUSH_INTERVAL, telemetry_ingest.load
+    )
+    fleet.forget_listeners.append(flow_controller.remove_device)
+    socket_io.start_background_task(
+        flow_controller.run, FLOW_CONTROL_ADJUST_INTERVAL, socket_io.sleep
+    )
+
+    command_tracker = CommandTracker(
+        send_command, COMMAND_ACK_TIMEOUT, COMMAND_TIMEOUT, COMMAND_RETRIES
+    )
+    socket_io.start_background_task(
+        command_tracker.run, COMMAND_TIMEOUT_CHECK_INTERVAL, socket_io.sleep
+    )
+
+    gc_scheduler = GarbageCollectionScheduler(
+        fleet, command_tracker, GC_DISK_THRESHOLD, GC_CRITICAL_DISK_THRESHOLD, GC_CONCURRENCY,
+        None if GC_IDLE_WINDOW is None else parse_window(GC_IDLE_WINDOW), GC_MIN_INTERVAL
+    )
+    socket_io.start_background_task(gc_scheduler.run, GC_SCHEDULE_INTERVAL, socket_io.sleep)
 
     socket_io.run(
         web_app,
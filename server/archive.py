@@ -0,0 +1,171 @@
+"""Module for archiving devices which have been offline for a long time"""
+
+import base64
+from collections import OrderedDict
+import json
+from logging import getLogger
+import os
+import threading
+import zlib
+
+class DeviceArchive():
+    """Bounded archive of devices evicted from the fleet.
+
+    The last telemetry post of each device is kept compressed, together with the time the
+    device was last seen. When the archive is full the device archived first is dropped. The
+    archive can be persisted to a file, which is read when the archive is created. Changes are
+    written by :func:`run_persistence` in the background, so archiving and reviving devices
+    never waits for the file.
+
+    Args:
+        max_devices (int, optional): Maximum number of archived devices. Defaults to 10000.
+        path (str, optional): Path to archive file. Defaults to None, not persisted.
+    """
+    def __init__(self, max_devices: int = 10000, path: str = None) -> None:
+        self.max_devices = max_devices
+        self.path = path
+
+        self._devices = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.dropped = 0
+
+        self.log = getLogger(self.__class__.__name__)
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._devices
+
+    def add(self, devices: list) -> None:
+        """Archives devices
+
+        Args:
+            devices (list[tuple[dict, str]]): Last telemetry post and last seen time of
+                each device
+        """
+        with self._lock:
+            for device, last_seen in devices:
+                self._devices.pop(device["id"], None)
+                self._devices[device["id"]] = (
+                    last_seen, zlib.compress(json.dumps(device).encode())
+                )
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+                self.dropped += 1
+            self._dirty = True
+
+    def pop(self, device_id: str) -> dict:
+        """Removes a device from the archive
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            dict: Last telemetry post of the device. None if the device is not archived
+        """
+        with self._lock:
+            record = self._devices.pop(device_id, None)
+            if record is None:
+                return None
+            self._dirty = True
+        return self._decode(record[1])
+
+    def get(self, device_id: str) -> dict:
+        """Retrieves an archived device
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            dict: Last telemetry post of the device with ``last_seen``. None if the device
+                is not archived
+        """
+        record = self._devices.get(device_id)
+        if record is None:
+            return None
+        return {**self._decode(record[1]), "last_seen": record[0]}
+
+    def devices(self) -> list:
+        """Summary of the archived devices, oldest archived first
+
+        Returns:
+            list[dict]: ID, name, labels and last seen time of each device
+        """
+        with self._lock:
+            records = list(self._devices.values())
+        summaries = []
+        for last_seen, device in records:
+            device = self._decode(device)
+            summaries.append({
+                "id": device["id"],
+                "name": device.get("name"),
+                "labels": device.get("labels", {}),
+                "last_seen": last_seen
+            })
+        return summaries
+
+    def save(self) -> bool:
+        """Writes the archive to the archive file, if configured and changed since the last
+        save. The devices are written compressed, as they are kept in memory.
+
+        Returns:
+            bool: If the archive was written
+        """
+        if self.path is None:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            records = list(self._devices.values())
+            self._dirty = False
+        temporary_path = f'{self.path}.tmp'
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as stream:
+                for last_seen, device in records:
+                    stream.write(json.dumps(
+                        {"last_seen": last_seen, "device": base64.b64encode(device).decode()}
+                    ) + "\n")
+            os.replace(temporary_path, self.path)
+        except OSError:
+            self.log.warning('Could not write device archive "%s"', self.path)
+            with self._lock:
+                self._dirty = True
+            return False
+        return True
+
+    def run_persistence(self, interval: float, sleep: object) -> None:
+        """Saves the archive periodically, if it has changed. Intended to run as a background
+        task
+
+        Args:
+            interval (float): Time in seconds between saves
+            sleep (callable): Sleep function, should be the one from the async framework in use
+        """
+        while True:
+            sleep(interval)
+            self.save()
+
+    def load(self) -> None:
+        """Reads the archive file, if configured and present"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as stream:
+                records = [json.loads(line) for line in stream if line.strip()]
+            devices = []
+            for record in records[-self.max_devices:]:
+                device = base64.b64decode(record["device"])
+                devices.append((self._decode(device)["id"], record["last_seen"], device))
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            self.log.warning('Could not read device archive "%s"', self.path)
+            return
+        with self._lock:
+            for device_id, last_seen, device in devices:
+                self._devices[device_id] = (last_seen, device)
+
+    @staticmethod
+    def _decode(device: bytes) -> dict:
+        return json.loads(zlib.decompress(device))
@@ -0,0 +1,297 @@
+"""Module for tracking commands sent to the clients"""
+
+from collections import OrderedDict
+from datetime import datetime
+from logging import getLogger
+import threading
+import time
+from uuid import uuid4
+
+DATETIME_STANDARD_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+SENT = "sent"
+ACKNOWLEDGED = "acknowledged"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TIMED_OUT = "timed_out"
+
+FINAL_STATES = (SUCCEEDED, FAILED, TIMED_OUT)
+CLIENT_STATES = (ACKNOWLEDGED, RUNNING, SUCCEEDED, FAILED)
+
+class LatencyHistogram():
+    """Cumulative histogram of latencies
+
+    Args:
+        buckets (tuple[float], optional): Upper bounds of the buckets in seconds
+    """
+
+    BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, buckets: tuple = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value: float) -> None:
+        """Adds a latency to the histogram
+
+        Args:
+            value (float): Latency in seconds
+        """
+        index = len(self.buckets)
+        for bucket_index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                index = bucket_index
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def summary(self) -> dict:
+        """Summary of the histogram, with cumulative counts per bucket
+
+        Returns:
+            dict: Histogram summary
+        """
+        buckets = {}
+        cumulative = 0
+        for bucket, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bucket] = cumulative
+        return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 3)}
+
+class CommandTracker(): # pylint: disable=too-many-instance-attributes
+    """Keeps track of commands sent to the clients, from sent until the client reports the
+    result. Commands which are not acknowledged in time are resent, commands which do not
+    finish in time are timed out.
+
+    Args:
+        send (callable): Function sending a command to a device, called with device ID and
+            command dict
+        ack_timeout (float): Time in seconds for the client to acknowledge a command
+        command_timeout (float): Time in seconds for the client to finish a command
+        max_retries (int): Number of times an unacknowledged command is resent
+        history_size (int, optional): Number of finished commands kept. Defaults to 1000.
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+    """
+    def __init__(   self, send: object, ack_timeout: float, command_timeout: float, # pylint: disable=too-many-arguments
+                    max_retries: int, history_size: int = 1000,
+                    clock: object = time.monotonic) -> None:
+        self.send = send
+        self.ack_timeout = ack_timeout
+        self.command_timeout = command_timeout
+        self.max_retries = max_retries
+        self.history_size = history_size
+        self.clock = clock
+
+        self._commands = OrderedDict()
+        self._timing = {}
+        self._in_flight = {}
+        self._latency = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def submit(self, device_id: str, command: dict) -> str:
+        """Sends a command to a device and starts tracking it
+
+        Args:
+            device_id (str): Device ID
+            command (dict): Command dict, a command ID is added to it
+
+        Returns:
+            str: Command ID
+        """
+        with self._lock:
+            command_id = self._register(device_id, command)
+        self.send(device_id, command)
+        return command_id
+
+    def submit_batch(self, device_id: str, commands: list) -> list:
+        """Sends several commands to a device in one batch message. Each command is tracked
+        individually, unacknowledged commands are resent one by one.
+
+        Args:
+            device_id (str): Device ID
+            commands (list[dict]): Command dicts, a command ID is added to each of them
+
+        Returns:
+            list[str]: Command IDs
+        """
+        with self._lock:
+            command_ids = [self._register(device_id, command) for command in commands]
+        self.send(device_id, {"command": "batch", "id": device_id, "commands": commands})
+        return command_ids
+
+    def update(self, status: dict) -> None:
+        """Updates a command with a status message from the client
+
+        Args:
+            status (dict): Status message with command ID, state, an optional detail and
+                an optional result of a succeeded command
+        """
+        if status.get("state") not in CLIENT_STATES:
+            self.log.warning("Invalid command status: %s", status)
+            return
+
+        with self._lock:
+            record = self._commands.get(status.get("command_id"))
+            if record is None:
+                self.log.debug("Status for unknown command: %s", status)
+                return
+            if record["state"] in (SUCCEEDED, FAILED):
+                return
+            if record["state"] == TIMED_OUT and status["state"] not in (SUCCEEDED, FAILED):
+                return
+
+            record["state"] = status["state"]
+            if status.get("detail") is not None:
+                record["detail"] = status["detail"]
+            if status.get("result") is not None:
+                record["result"] = status["result"]
+
+            if status["state"] in (SUCCEEDED, FAILED):
+                self._finish(record, observe_latency=True)
+
+    def check_timeouts(self) -> None:
+        """Resends unacknowledged commands and times out commands that take too long"""
+        resend = []
+        now = self.clock()
+        with self._lock:
+            for command_ids in list(self._in_flight.values()):
+                for command_id in list(command_ids):
+                    record = self._commands[command_id]
+                    timing = self._timing[command_id]
+
+                    if now - timing["created"] > self.command_timeout:
+                        record["state"] = TIMED_OUT
+                        self._finish(record, observe_latency=False)
+                    elif record["state"] == SENT and now - timing["sent"] > self.ack_timeout:
+                        if record["attempts"] > self.max_retries:
+                            record["state"] = TIMED_OUT
+                            record["detail"] = "Not acknowledged by client"
+                            self._finish(record, observe_latency=False)
+                        else:
+                            record["attempts"] += 1
+                            timing["sent"] = now
+                            resend.append((record["device_id"], timing["message"]))
+
+        for device_id, message in resend:
+            self.log.info('Resending command "%s" to "%s"', message["command_id"], device_id)
+            self.send(device_id, message)
+
+    def get(self, command_id: str) -> dict:
+        """Retrieves a command
+
+        Args:
+            command_id (str): Command ID
+
+        Returns:
+            dict: Command record, None if unknown
+        """
+        with self._lock:
+            record = self._commands.get(command_id)
+            return None if record is None else dict(record)
+
+    def commands(self, device_id: str = None, container_name: str = None,
+                 in_flight: bool = False) -> list:
+        """Lists tracked commands, newest first
+
+        Args:
+            device_id (str, optional): Only include commands for this device
+            container_name (str, optional): Only include commands for this container
+            in_flight (bool, optional): Only include commands which have not finished
+
+        Returns:
+            list[dict]: Command records
+        """
+        with self._lock:
+            if in_flight:
+                command_ids = set()
+                for (target_device, target_container), ids in self._in_flight.items():
+                    if device_id not in (None, target_device) or \
+                            container_name not in (None, target_container):
+                        continue
+                    command_ids |= ids
+                records = [self._commands[command_id] for command_id in command_ids]
+            else:
+                records = [
+                    record for record in self._commands.values()
+                    if device_id in (None, record["device_id"]) and
+                    container_name in (None, record["container_name"])
+                ]
+            return [dict(record) for record in reversed(records)]
+
+    def latency(self) -> dict:
+        """End-to-end latency histograms of finished commands, per command type
+
+        Returns:
+            dict: Command type mapped to histogram summary
+        """
+        with self._lock:
+            return {command: histogram.summary() for command, histogram in self._latency.items()}
+
+    def run(self, interval: float, sleep: object = time.sleep) -> None:
+        """Checks for timeouts periodically. Intended to run as a background task
+
+        Args:
+            interval (float): Time in seconds between checks
+            sleep (callable, optional): Sleep function, should be the one from the async
+                framework in use. Defaults to time.sleep.
+        """
+        while True:
+            sleep(interval)
+            self.check_timeouts()
+
+    def _register(self, device_id: str, command: dict) -> str:
+        # Must be called with the lock held
+        command_id = uuid4().hex
+        command["command_id"] = command_id
+        now = self.clock()
+
+        self._commands[command_id] = {
+            "command_id": command_id,
+            "device_id": device_id,
+            "container_name": command.get("container_name"),
+            "command": command["command"],
+            "state": SENT,
+            "attempts": 1,
+            "created": datetime.now().strftime(DATETIME_STANDARD_FORMAT),
+            "detail": None,
+            "result": None,
+            "latency": None
+        }
+        self._timing[command_id] = {"created": now, "sent": now, "message": command}
+        self._in_flight.setdefault(self._target(self._commands[command_id]), set()) \
+            .add(command_id)
+        self._trim_history()
+        return command_id
+
+    @staticmethod
+    def _target(record: dict) -> tuple:
+        return (record["device_id"], record["container_name"])
+
+    def _finish(self, record: dict, observe_latency: bool) -> None:
+        # Timing is kept until the record leaves the history,
+        # a timed out command can still get a late result from the client
+        latency = self.clock() - self._timing[record["command_id"]]["created"]
+        record["latency"] = round(latency, 3)
+        if observe_latency:
+            self._latency.setdefault(record["command"], LatencyHistogram()).observe(latency)
+
+        target = self._target(record)
+        in_flight = self._in_flight.get(target)
+        if in_flight is not None:
+            in_flight.discard(record["command_id"])
+            if not in_flight:
+                self._in_flight.pop(target)
+
+    def _trim_history(self) -> None:
+        while len(self._commands) > self.history_size:
+            command_id, record = next(iter(self._commands.items()))
+            if record["state"] not in FINAL_STATES:
+                break
+            self._commands.pop(command_id)
+            self._timing.pop(command_id, None)
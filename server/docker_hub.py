@@ -2,7 +2,9 @@
 from datetime import datetime, timedelta
 from http import HTTPStatus
 from logging import getLogger
+from urllib.parse import urljoin
 import requests
+from tag_catalogue import TagCatalogue
 
 class Token(): # pylint: disable=too-few-public-methods
     """Token handler for docker hub authentication token"""
@@ -59,22 +61,70 @@ class DockerHub(): # pylint: disable=too-many-instance-attributes
         self.log = getLogger(self.__class__.__name__)
 
         self.images = []
+        self.catalogue = TagCatalogue()
+        self.version = 0
         self.cache = {}
         self.cache_time = 60
+        self.reconciliation_interval = None
+        self._pending = set()
 
-    def list_images(self) -> list:
-        """List available images in repository"
+    def list_images(self, page_size: int = 100) -> list:
+        """List available images in repository. The tag list is fetched page by page and each
+        page is added to :attr:`catalogue` as it arrives. Tags which are no longer in the
+        repository are removed from the catalogue when all pages have been fetched.
+
+        Args:
+            page_size (int, optional): Number of tags per request. Defaults to 100.
 
         Returns:
             list[str]: Image tags
         """
-        header = {'Authorization': f'Bearer {self.token()}'}
-        response = self.http_get(f'{self.base_url}/tags/list', headers=header)
-
-        response_body = response.json()
-        self.images = response_body["tags"]
+        url = f'{self.base_url}/tags/list?n={page_size}'
+        listed_tags = set()
+        while url is not None:
+            header = {'Authorization': f'Bearer {self.token()}'}
+            response = self.http_get(url, headers=header)
+
+            tags = response.json()["tags"] or []
+            if listed_tags.issuperset(tags):
+                # Protects against registries ignoring the pagination parameters
+                break
+            listed_tags.update(tags)
+            self.catalogue.add(tags)
+            url = self._next_page(response, tags, page_size)
+
+        self.catalogue.retain(listed_tags)
+        self.images = self.catalogue.tags()
         return self.images
 
+    def run_catalogue_refresh(self, interval: float, sleep: object) -> None:
+        """Refreshes the tag catalogue periodically. Intended to run as a background task,
+        failures are logged and retried at the next refresh.
+
+        Args:
+            interval (float): Time in seconds between refreshes
+            sleep (callable): Sleep function, should be the one from the async framework in use
+        """
+        while True:
+            try:
+                self.list_images()
+                self.log.debug('Tag catalogue refreshed, %s tags', len(self.catalogue))
+            except PermissionError:
+                self.log.error('Could not log into Docker hub')
+            except (requests.RequestException, KeyError, ValueError) as error:
+                self.log.warning('Could not refresh tag catalogue: %s', error)
+            sleep(interval)
+
+    def _next_page(self, response: requests.Response, tags: list, page_size: int) -> str:
+        # Registries announce the next page in the Link header, for registries that don't
+        # a full page is continued from the last received tag
+        link = response.headers.get("Link")
+        if link is not None:
+            return urljoin(self.base_url, link.split(";")[0].strip(" <>"))
+        if len(tags) >= page_size:
+            return f'{self.base_url}/tags/list?n={page_size}&last={tags[-1]}'
+        return None
+
     def get_manifest(self, image_tag: str) -> dict:
         """Retrieves the manifest for the specified image from remote repository
 
@@ -139,6 +189,9 @@ class DockerHub(): # pylint: disable=too-many-instance-attributes
             # Cache time is based on the limitaitons for a free account at Docker hub
             # Limitations are 200 requests within 6 hours
             self.cache_time = (6 * 3600 * len(self.cache.keys())) / 200
+            if self.reconciliation_interval is not None:
+                # Pushes are notified through webhooks, polling is only a fallback
+                self.cache_time = max(self.cache_time, self.reconciliation_interval)
 
             return remote_image_sha
 
@@ -149,7 +202,77 @@ class DockerHub(): # pylint: disable=too-many-instance-attributes
             )
             return None
 
+    def cached_remote_image_sha(self, image_repo: str, image_tag: str) -> str:
+        """Gets the image SHA from the cache without calling Docker hub. Missing and expired
+        entries are queued for :func:`run_prefetch`, an expired entry is returned until it
+        has been refreshed.
+
+        Args:
+            image_repo (str): Repository for the image
+            image_tag (str): Image tag
+
+        Returns:
+            str: Remote image SHA. Returns None if not cached or image can't be found.
+        """
+        if image_repo != self.repository:
+            return None
+        cache_item = self.cache.get(image_tag)
+        if cache_item is None or \
+                datetime.now() >= cache_item['timestamp'] + timedelta(seconds=self.cache_time):
+            self._pending.add(image_tag)
+        return None if cache_item is None else cache_item['remote_image_sha']
+
+    def prefetch(self) -> bool:
+        """Fetches the image SHAs queued by :func:`cached_remote_image_sha`
+
+        Returns:
+            bool: If any image SHA changed
+        """
+        version = self.version
+        while self._pending:
+            image_tag = self._pending.pop()
+            try:
+                self.get_remote_image_sha(self.repository, image_tag)
+            except PermissionError:
+                self.log.error('Could not log into Docker hub')
+            except (requests.RequestException, KeyError, ValueError) as error:
+                self.log.warning('Could not fetch image SHA for "%s": %s', image_tag, error)
+        return self.version != version
+
+    def run_prefetch(self, interval: float, sleep: object, on_change: object) -> None:
+        """Fetches queued image SHAs periodically. Intended to run as a background task,
+        so fleet reads never wait for Docker hub.
+
+        Args:
+            interval (float): Time in seconds between prefetches
+            sleep (callable): Sleep function, should be the one from the async framework in use
+            on_change (callable): Called without arguments when any image SHA has changed
+        """
+        while True:
+            sleep(interval)
+            if self.prefetch():
+                on_change()
+
+    def refresh_remote_image_sha(self, image_repo: str, image_tag: str) -> str:
+        """Gets the image SHA from the remote repository, bypassing the cache.
+        Used when the registry notifies that a new image has been pushed.
+
+        Args:
+            image_repo (str): Repository for the image
+            image_tag (str): Image tag
+
+        Returns:
+            str: Remote image SHA. Returns None if image can't be found.
+        """
+        if image_repo == self.repository:
+            self.cache.pop(image_tag, None)
+            self.catalogue.add([image_tag])
+        return self.get_remote_image_sha(image_repo, image_tag)
+
     def _add_to_cache(self, image_tag: str, remote_image_sha: str) -> None:
+        if image_tag not in self.cache or \
+                self.cache[image_tag]['remote_image_sha'] != remote_image_sha:
+            self.version += 1
         self.cache[image_tag] = {
             "timestamp": datetime.now(),
             "remote_image_sha": remote_image_sha
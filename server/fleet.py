@@ -1,28 +1,268 @@
 """Module for handling the fleet data"""
 
 from datetime import datetime, timedelta
+from hashlib import sha1
+import json
+from logging import getLogger
+import threading
+from archive import DeviceArchive
 from docker_hub import DockerHub
+from history import DeviceHistory
+from labels import LabelIndex
+
+try:
+    import orjson
+except ImportError:   # pragma: no cover
+    orjson = None  # pylint: disable=invalid-name
 
 DATETIME_STANDARD_FORMAT = "%Y/%m/%d %H:%M:%S"
 
-class Fleet():
-    def __init__(self, docker_hub: DockerHub, socket_connections: list, event_stream: object) -> None:
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+def encode_json(obj: object) -> str:
+    """Encodes an object as compact JSON, with orjson if it is installed
+
+    Args:
+        obj (object): Object to encode
+
+    Returns:
+        str: JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode() # pylint: disable=no-member
+    return _json_encoder.encode(obj)
+
+class Fleet(): # pylint: disable=too-many-instance-attributes
+    """Store for the fleet information.
+
+    The devices are kept in a snapshot dict which is never changed once published. Writers
+    build a new snapshot under a write lock and publish it by replacing the reference, readers
+    take the current reference and can iterate and serialize it without locking.
+
+    The derived information of each device (online and update state) and its JSON encoding are
+    cached until the device posts telemetry, its online state changes or the remote images
+    change. Fleet reads only encode the devices which have changed since the previous read.
+
+    Devices which have been offline for long are moved to a :class:`archive.DeviceArchive`
+    by :func:`evict_stale`, and are moved back when they post telemetry again.
+    """
+    def __init__(   self, docker_hub: DockerHub, socket_connections: list, event_stream: object, # pylint: disable=too-many-arguments
+                    history_length: int = 1440, archive: DeviceArchive = None) -> None:
         self._fleet = {}
+        self._write_lock = threading.Lock()
+        self._fragments = {}
+        self.labels = LabelIndex()
+        self._history = {}
+        self.history_length = history_length
+        # Time each device was last seen, kept as datetime so the online state is computed
+        # without parsing the formatted time on every request
+        self._last_seen = {}
+        self._push_intervals = {}
+        self.version = 0
         self.docker_hub = docker_hub
         self.socket_connections = socket_connections
-
-        self.docker_hub.list_images()
+        self.archive = DeviceArchive() if archive is None else archive
+        # Called with the ID of each device removed or archived, under the write lock
+        self.forget_listeners = []
 
         self.event_stream = event_stream
+        self.log = getLogger(self.__class__.__name__)
 
     def remove_device(self, device_id):
-        self._fleet.pop(device_id)
+        if device_id in self.archive:
+            self.archive.pop(device_id)
+            return
+
+        with self._write_lock:
+            snapshot = dict(self._fleet)
+            snapshot.pop(device_id)
+            self._fleet = snapshot
+            self._forget(device_id)
+            self.version += 1
+
+    def evict_stale(self, max_offline: float) -> list:
+        """Moves devices which have not been seen for a long time to the archive
+
+        Args:
+            max_offline (float): Time in seconds a device can be offline before it is evicted
+
+        Returns:
+            list[str]: IDs of the evicted devices
+        """
+        cutoff = datetime.now() - timedelta(seconds=max_offline)
+        evicted = []
+        with self._write_lock:
+            for device in self._fleet.values():
+                last_seen = self._last_seen_time(device)
+                if last_seen < cutoff:
+                    evicted.append((device, last_seen.strftime(DATETIME_STANDARD_FORMAT)))
+
+            if evicted:
+                snapshot = dict(self._fleet)
+                for device, _ in evicted:
+                    snapshot.pop(device["id"])
+                    self._forget(device["id"])
+                self._fleet = snapshot
+                self.version += 1
+
+        if evicted:
+            self.archive.add(evicted)
+            self.log.info('Archived %s devices offline for more than %s seconds',
+                          len(evicted), max_offline)
+        return [device["id"] for device, _ in evicted]
+
+    def run_eviction(self, max_offline: float, interval: float, sleep: object) -> None:
+        """Evicts stale devices periodically. Intended to run as a background task
+
+        Args:
+            max_offline (float): Time in seconds a device can be offline before it is evicted
+            interval (float): Time in seconds between evictions
+            sleep (callable): Sleep function, should be the one from the async framework in use
+        """
+        while True:
+            sleep(interval)
+            self.evict_stale(max_offline)
+
+    def _forget(self, device_id: str) -> None:
+        # Must be called with the write lock held
+        self._fragments.pop(device_id, None)
+        self.labels.remove(device_id)
+        self._last_seen.pop(device_id, None)
+        self._push_intervals.pop(device_id, None)
+        self._history.pop(device_id, None)
+        for listener in self.forget_listeners:
+            listener(device_id)
+
+    def heartbeat(self, device_id: str) -> None:
+        """Registers a heartbeat from a device, keeps the device online between the
+        telemetry posts
+
+        Args:
+            device_id (str): Device ID
+        """
+        self._last_seen[device_id] = datetime.now()
+
+    def set_push_interval(self, device_id: str, push_interval: float) -> None:
+        """Registers the push interval negotiated with a device
+
+        Args:
+            device_id (str): Device ID
+            push_interval (float): Push interval in seconds
+        """
+        self._push_intervals[device_id] = push_interval
 
     def add_telemetry(self, telemetry):
-        telemetry['last_updated'] = datetime.now().strftime(DATETIME_STANDARD_FORMAT)
-        self._fleet[telemetry["id"]] = telemetry
+        self.add_telemetry_batch([telemetry])
+
+    def add_telemetry_batch(self, telemetry_batch: list) -> None:
+        """Adds several telemetry posts to the fleet and publishes one merged update
+
+        Args:
+            telemetry_batch (list[dict]): Telemetry posts, applied in order
+        """
+        now = datetime.now()
+        last_updated = now.strftime(DATETIME_STANDARD_FORMAT)
+        revived = []
+        with self._write_lock:
+            snapshot = dict(self._fleet)
+            for telemetry in telemetry_batch:
+                device = dict(telemetry, last_updated=last_updated)
+                if device["id"] not in snapshot and device["id"] in self.archive:
+                    revived.append(device["id"])
+                snapshot[device["id"]] = device
+                self.labels.update(device["id"], self._labels(device))
+                self._last_seen[device["id"]] = now
+                self._device_history(device["id"]).add_telemetry(device)
+            self._fleet = snapshot
+            self.version += len(telemetry_batch)
+
+        for device_id in revived:
+            self.archive.pop(device_id)
+            self.log.info('Device "%s" revived from the archive', device_id)
+
+        if len(telemetry_batch) > 0:
+            self.publish(list(dict.fromkeys(telemetry["id"] for telemetry in telemetry_batch)))
+
+    def images_pushed(self, pushes: list) -> None:
+        """Refreshes the update status of the containers after images were pushed to the
+        remote repository
+
+        Args:
+            pushes (list[tuple[str, str]]): Repository and tag of the pushed images
+        """
+        for image_repo, image_tag in pushes:
+            self.docker_hub.refresh_remote_image_sha(image_repo, image_tag)
+        self.publish()
+
+    def publish(self, device_ids: list = None) -> None:
+        """Publishes the fleet information on the event stream, if anyone is listening.
+        The web apps merge the published devices into the devices they have loaded
+
+        Args:
+            device_ids (list[str], optional): Devices which have changed. Defaults to None,
+                all devices.
+        """
         if len(self.socket_connections) > 0:
-            self.event_stream(self.get_fleet_information())
+            self.event_stream(self.fleet_json(device_ids))
+
+    def add_history(self, device_id: str, entries: list) -> bool:
+        """Adds history entries recorded by a client while the server was unreachable
+
+        Args:
+            device_id (str): Device ID
+            entries (list[dict]): History entries, see :class:`history.DeviceHistory`
+
+        Returns:
+            bool: If the entries were added. False if the device is not in the fleet
+        """
+        with self._write_lock:
+            if device_id not in self._fleet:
+                return False
+            history = self._device_history(device_id)
+        history.add_entries(entries)
+        return True
+
+    def history(self, device_id: str) -> list:
+        """History of a device
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            list[dict]: History entries, oldest first. None if the device is unknown
+        """
+        history = self._history.get(device_id)
+        if history is None:
+            return None
+        return history.entries()
+
+    def select(self, requirements: list) -> set:
+        """Devices matching a label selector, evaluated on the label index
+
+        Args:
+            requirements (list[tuple[str, str, str]]): Requirements from
+                :func:`labels.parse_selector`
+
+        Returns:
+            set[str]: Device IDs
+        """
+        return self.labels.select(requirements)
+
+    @staticmethod
+    def _labels(device: dict) -> dict:
+        labels = device.get("labels")
+        if not isinstance(labels, dict):
+            return {}
+        return {str(key): str(value) for key, value in labels.items()}
+
+    def _device_history(self, device_id: str) -> DeviceHistory:
+        # Must be called with the write lock held
+        if device_id not in self._history:
+            self._history[device_id] = DeviceHistory(self.history_length)
+        return self._history[device_id]
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._fleet
 
     def empty(self) -> bool:
         """Checks if fleet is empty (no device registered)
@@ -32,14 +272,103 @@ class Fleet():
         """
         return len(self._fleet) == 0
 
-    def get_fleet_information(self):
-        for device in self._fleet.values():
-            device['online'] = self.device_online(device['last_updated'], device['push_interval'])
-            for container in device['containers']:
-                container['update_available'] = self.update_available(  container['image_repo'],
-                                                                        container['image_tag'],
-                                                                        container['image_sha'])
-        return self._fleet
+    def size(self) -> int:
+        """Number of devices in the fleet
+
+        Returns:
+            int: Number of devices
+        """
+        return len(self._fleet)
+
+    def device_ids(self) -> list:
+        """IDs of the devices in the fleet
+
+        Returns:
+            list[str]: Device IDs
+        """
+        return list(self._fleet)
+
+    def state_tag(self) -> str:
+        """Tag which changes whenever the fleet information changes. Cheap to compute as the
+        fleet information itself is not recomputed.
+
+        Returns:
+            str: Fleet state tag
+        """
+        online_state = sha1()
+        now = datetime.now()
+        for device_id, device in self._fleet.items():
+            if self._device_online(device, now):
+                online_state.update(device_id.encode())
+        return f'{self.version}-{self.docker_hub.version}-{online_state.hexdigest()[:8]}'
+
+    def get_fleet_information(self, device_ids: set = None) -> dict:
+        """Fleet information with the online state of the devices and the update state of the
+        containers. Built from the current snapshot, the device records are shared with other
+        readers and must not be changed.
+
+        Args:
+            device_ids (set[str], optional): Devices to include, for example the devices
+                matching a label selector. Unknown devices are skipped. Defaults to None,
+                all devices.
+
+        Returns:
+            dict: Device ID mapped to device information
+        """
+        snapshot = self._fleet
+        now = datetime.now()
+        if device_ids is None:
+            device_ids = snapshot.keys()
+        return {
+            device_id: self._device_entry(snapshot[device_id], now)[3]
+            for device_id in device_ids if device_id in snapshot
+        }
+
+    def fleet_json(self, device_ids: list = None) -> str:
+        """Fleet information encoded as JSON, assembled from the cached device fragments
+
+        Args:
+            device_ids (list[str], optional): Devices to include, in order. Unknown devices
+                are skipped. Defaults to None, all devices.
+
+        Returns:
+            str: JSON object with device ID mapped to device information
+        """
+        snapshot = self._fleet
+        now = datetime.now()
+        if device_ids is None:
+            device_ids = snapshot.keys()
+        fragments = [
+            f'{encode_json(device_id)}:{self._device_entry(snapshot[device_id], now)[4]}'
+            for device_id in device_ids if device_id in snapshot
+        ]
+        return "{" + ",".join(fragments) + "}"
+
+    def _device_entry(self, device: dict, now: datetime) -> tuple:
+        # Snapshot records are replaced, never changed, so the record identity tells if the
+        # device has posted telemetry since the entry was cached
+        online = self._device_online(device, now)
+        images_version = self.docker_hub.version
+        entry = self._fragments.get(device["id"])
+        if entry is None or entry[0] is not device or entry[1] != online or \
+                entry[2] != images_version:
+            information = self._device_information(device, online)
+            entry = (device, online, images_version, information, encode_json(information))
+            # A reader holding an older snapshot must not cache a device which has since been
+            # removed or archived, the entry would never be forgotten
+            with self._write_lock:
+                if self._fleet.get(device["id"]) is device:
+                    self._fragments[device["id"]] = entry
+        return entry
+
+    def _device_information(self, device: dict, online: bool) -> dict:
+        containers = [
+            dict(container, update_available=self.update_available(
+                container['image_repo'], container['image_tag'], container['image_sha']
+            ))
+            for container in device['containers']
+        ]
+        return dict(device, online=online, containers=containers)
 
     def update_available(self, image_repo: str, image_tag: str, image_sha: str) -> bool:
         """Checks if there is a newer image available in remote repository
@@ -50,14 +379,26 @@ class Fleet():
             image_sha (str): The SHA of the current image
 
         Returns:
-            bool: If there is a newer image available
+            bool: If there is a newer image available. None if unknown
         """
-        image_id = self.docker_hub.get_remote_image_sha(image_repo, image_tag)
+        if image_tag is None:
+            # Images pinned by digest are never updated
+            return None
+        # Unknown image SHAs are fetched in the background, the fleet is published again when
+        # they arrive, see DockerHub.run_prefetch
+        image_id = self.docker_hub.cached_remote_image_sha(image_repo, image_tag)
         if image_id is None:
             return None
         return image_sha != image_id
 
-    @staticmethod
-    def device_online(time, interval):
-        last_updated_post = datetime.strptime(time, DATETIME_STANDARD_FORMAT)
-        return datetime.now() < last_updated_post + timedelta(seconds=interval*2)
+    def _device_online(self, device: dict, now: datetime) -> bool:
+        # The device might not have picked up a newly negotiated interval yet,
+        # the longer of the reported and negotiated interval is used
+        push_interval = max(device['push_interval'], self._push_intervals.get(device['id'], 0))
+        return now < self._last_seen_time(device) + timedelta(seconds=push_interval*2)
+
+    def _last_seen_time(self, device: dict) -> datetime:
+        last_seen = self._last_seen.get(device['id'])
+        if last_seen is None:
+            return datetime.strptime(device['last_updated'], DATETIME_STANDARD_FORMAT)
+        return last_seen
@@ -0,0 +1,215 @@
+"""Module for filtering, projecting and paginating fleet information"""
+
+from labels import matches, parse_selector
+
+DEVICE_FILTERS = ("device_id", "name", "online", "selector")
+CONTAINER_FILTERS = ("image_repo", "image_tag", "update_available")
+
+MAX_LIMIT = 1000
+
+def parse_bool(value: str) -> bool:
+    """Parses a boolean query parameter
+
+    Args:
+        value (str): Query parameter value
+
+    Raises:
+        ValueError: If the value is not a boolean
+
+    Returns:
+        bool: Parsed value. None for the values "none" and "null"
+    """
+    value = value.lower()
+    if value in ("true", "1"):
+        return True
+    if value in ("false", "0"):
+        return False
+    if value in ("none", "null"):
+        return None
+    raise ValueError(f'"{value}" is not a boolean')
+
+def _split(value: str) -> list:
+    return [item for item in value.split(",") if item]
+
+class FleetQuery(): # pylint: disable=too-many-instance-attributes
+    """Query towards the fleet, created from the query parameters of the fleet endpoint.
+
+    Supported parameters:
+
+    - device_id: Comma separated list of device IDs
+    - name: Device name
+    - online: Device online state (true/false)
+    - selector: Label selector, for example "site=lab,arch=arm64", see :mod:`labels`
+    - image_repo: Only include containers with this image repository
+    - image_tag: Only include containers with this image tag
+    - update_available: Only include containers with this update state (true/false/null)
+    - fields: Comma separated list of device fields to include. Container fields are
+      selected with a "containers." prefix, for example "containers.name"
+    - limit: Maximum number of devices in the response
+    - cursor: Device ID of the last device on the previous page
+
+    Args:
+        args (dict): Query parameters
+
+    Raises:
+        ValueError: If a query parameter is invalid
+    """
+    def __init__(self, args: dict) -> None:
+        self.device_ids = set(_split(args["device_id"])) if "device_id" in args else None
+        self.name = args.get("name")
+        self.online = parse_bool(args["online"]) if "online" in args else None
+        self.selector = parse_selector(args["selector"]) if "selector" in args else None
+
+        self.image_repo = args.get("image_repo")
+        self.image_tag = args.get("image_tag")
+        self.filter_update_available = "update_available" in args
+        self.update_available = parse_bool(args["update_available"]) \
+            if self.filter_update_available else None
+
+        self.device_fields = None
+        self.container_fields = None
+        if "fields" in args:
+            fields = _split(args["fields"])
+            self.device_fields = {field for field in fields if "." not in field}
+            self.container_fields = {
+                field.split(".", 1)[1] for field in fields if field.startswith("containers.")
+            }
+            if self.container_fields:
+                self.device_fields.add("containers")
+            else:
+                self.container_fields = None
+
+        self.limit = int(args["limit"]) if "limit" in args else None
+        if self.limit is not None and not 0 < self.limit <= MAX_LIMIT:
+            raise ValueError(f'Limit must be between 1 and {MAX_LIMIT}')
+        self.cursor = args.get("cursor")
+
+    @property
+    def filters_containers(self) -> bool:
+        """If the query filters on container level
+
+        Returns:
+            bool: If any container filter is used
+        """
+        return self.image_repo is not None or self.image_tag is not None or \
+            self.filter_update_available
+
+    def device_matches(self, device: dict) -> bool:
+        """Checks the device level filters
+
+        Args:
+            device (dict): Device information
+
+        Returns:
+            bool: If the device matches
+        """
+        if self.device_ids is not None and device["id"] not in self.device_ids:
+            return False
+        if self.name is not None and device["name"] != self.name:
+            return False
+        if self.online is not None and device.get("online") != self.online:
+            return False
+        if self.selector is not None and not matches(self.selector, device.get("labels", {})):
+            return False
+        return True
+
+    def container_matches(self, container: dict) -> bool:
+        """Checks the container level filters
+
+        Args:
+            container (dict): Container information
+
+        Returns:
+            bool: If the container matches
+        """
+        if self.image_repo is not None and container.get("image_repo") != self.image_repo:
+            return False
+        if self.image_tag is not None and container.get("image_tag") != self.image_tag:
+            return False
+        if self.filter_update_available and \
+                container.get("update_available") != self.update_available:
+            return False
+        return True
+
+    def page(self, device_ids: list) -> tuple:
+        """Selects the device IDs on the requested page
+
+        Args:
+            device_ids (list[str]): Device IDs to paginate
+
+        Returns:
+            tuple[list[str], str]: Device IDs on the page and the cursor for the next page.
+                The cursor is None on the last page
+        """
+        device_ids = sorted(device_ids)
+        if self.cursor is not None:
+            device_ids = [device_id for device_id in device_ids if device_id > self.cursor]
+        if self.limit is None or len(device_ids) <= self.limit:
+            return device_ids, None
+        device_ids = device_ids[:self.limit]
+        return device_ids, device_ids[-1]
+
+    def project(self, device: dict) -> dict:
+        """Applies the container filters and the field projection to a device
+
+        Args:
+            device (dict): Device information
+
+        Returns:
+            dict: Device information in the response
+        """
+        containers = device.get("containers", [])
+        if self.filters_containers:
+            containers = [container for container in containers
+                          if self.container_matches(container)]
+        if self.container_fields is not None:
+            containers = [
+                {key: value for key, value in container.items() if key in self.container_fields}
+                for container in containers
+            ]
+
+        device = {**device, "containers": containers}
+        if self.device_fields is not None:
+            device = {key: value for key, value in device.items() if key in self.device_fields}
+        return device
+
+    @property
+    def returns_full_devices(self) -> bool:
+        """If the devices are returned unchanged, without container filters or projection
+
+        Returns:
+            bool: If the devices are returned unchanged
+        """
+        return not self.filters_containers and self.device_fields is None
+
+    def select(self, fleet_information: dict) -> tuple:
+        """Selects the devices matching the query on the requested page
+
+        Args:
+            fleet_information (dict): Fleet information, device ID mapped to device information
+
+        Returns:
+            tuple[list[str], str]: Device IDs on the page and the cursor for the next page
+        """
+        selected = []
+        for device_id, device in fleet_information.items():
+            if not self.device_matches(device):
+                continue
+            if self.filters_containers and \
+                    not any(self.container_matches(c) for c in device.get("containers", [])):
+                continue
+            selected.append(device_id)
+        return self.page(selected)
+
+    def apply(self, fleet_information: dict) -> tuple:
+        """Runs the query against the fleet
+
+        Args:
+            fleet_information (dict): Fleet information, device ID mapped to device information
+
+        Returns:
+            tuple[dict, str]: Matching devices and the cursor for the next page
+        """
+        page, next_cursor = self.select(fleet_information)
+        return {device_id: self.project(fleet_information[device_id]) for device_id in page}, \
+            next_cursor
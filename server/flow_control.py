@@ -0,0 +1,167 @@
+"""Module for deciding how often the clients push telemetry"""
+
+from logging import getLogger
+import threading
+import time
+
+class FlowController(): # pylint: disable=too-many-instance-attributes
+    """Decides the push interval and heartbeat cadence for each device.
+
+    The push interval of the fleet is stretched when the server is loaded, measured as the
+    telemetry queue depth and the time it takes to apply telemetry. Devices which are watched
+    in the web app, or are being updated, are boosted to the minimum push interval.
+
+    Heartbeats are small posts used to keep track of online state, they are sent with the
+    normal push interval while the full telemetry is throttled.
+
+    The normal push interval is the one configured on each client, if it is unknown the
+    default push interval is used.
+
+    Args:
+        push_interval (float): Default push interval in seconds when the server is not loaded
+        min_push_interval (float): Push interval in seconds for boosted devices
+        max_push_interval (float): Maximum push interval in seconds when the server is loaded
+        load (callable): Returns the current load of the server, where 1 is fully loaded
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+    """
+
+    HIGH_LOAD = 0.5
+    LOW_LOAD = 0.1
+
+    def __init__(   self, push_interval: float, min_push_interval: float, # pylint: disable=too-many-arguments
+                    max_push_interval: float, load: object, clock: object = time.monotonic) -> None:
+        self.push_interval = push_interval
+        self.min_push_interval = min_push_interval
+        self.max_push_interval = max_push_interval
+        self.load = load
+        self.clock = clock
+
+        self.factor = 1
+        self._configured = {}
+        self._boosted = {}
+        self._sent = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def adjust(self) -> None:
+        """Adjusts the throttling of the fleet after the current load"""
+        load = self.load()
+        max_factor = max(self.max_push_interval / self.push_interval, 1)
+        if load > self.HIGH_LOAD and self.factor < max_factor:
+            self.factor = min(self.factor * 2, max_factor)
+            self.log.info("Server load %.2f, throttling push interval to %s s",
+                load, self.push_interval * self.factor)
+        elif load < self.LOW_LOAD and self.factor > 1:
+            self.factor = max(self.factor / 2, 1)
+            self.log.info("Server load %.2f, relaxing push interval to %s s",
+                load, self.push_interval * self.factor)
+
+    def register(self, device_id: str, configured_push_interval: float) -> None:
+        """Registers the push interval configured on a client
+
+        Args:
+            device_id (str): Device ID
+            configured_push_interval (float): Push interval in seconds
+        """
+        self._configured[device_id] = configured_push_interval
+
+    def boost(self, device_ids: list, duration: float) -> list:
+        """Boosts devices to the minimum push interval
+
+        Args:
+            device_ids (list[str]): Devices to boost
+            duration (float): Duration of the boost in seconds
+
+        Returns:
+            list[str]: Devices which got new settings and should be notified
+        """
+        until = self.clock() + duration
+        with self._lock:
+            for device_id in device_ids:
+                self._boosted[device_id] = max(self._boosted.get(device_id, 0), until)
+        return [device_id for device_id in device_ids if self.changed_settings(device_id)]
+
+    def boosted(self, device_id: str) -> bool:
+        """Checks if a device is boosted
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            bool: If the device is boosted
+        """
+        with self._lock:
+            until = self._boosted.get(device_id)
+            if until is not None and until < self.clock():
+                self._boosted.pop(device_id)
+                until = None
+        return until is not None
+
+    def settings(self, device_id: str) -> dict:
+        """Push settings for a device
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            dict: Push interval and heartbeat interval in seconds
+        """
+        configured = self._configured.get(device_id, self.push_interval)
+        if self.boosted(device_id):
+            push_interval = min(self.min_push_interval, configured)
+        else:
+            push_interval = max(min(configured * self.factor, self.max_push_interval), configured)
+        return {
+            "push_interval": push_interval,
+            "heartbeat_interval": min(push_interval, configured)
+        }
+
+    def changed_settings(self, device_id: str) -> dict:
+        """Push settings for a device, if they differ from the settings last sent to it.
+        The returned settings are considered sent.
+
+        Args:
+            device_id (str): Device ID
+
+        Returns:
+            dict: Push settings, None if unchanged
+        """
+        settings = self.settings(device_id)
+        with self._lock:
+            if self._sent.get(device_id) == settings:
+                return None
+            self._sent[device_id] = settings
+        return settings
+
+    def forget(self, device_id: str) -> None:
+        """Forgets the settings sent to a device, for example when it reconnects
+
+        Args:
+            device_id (str): Device ID
+        """
+        with self._lock:
+            self._sent.pop(device_id, None)
+
+    def remove_device(self, device_id: str) -> None:
+        """Drops everything known about a device which left the fleet
+
+        Args:
+            device_id (str): Device ID
+        """
+        with self._lock:
+            self._configured.pop(device_id, None)
+            self._boosted.pop(device_id, None)
+            self._sent.pop(device_id, None)
+
+    def run(self, interval: float, sleep: object = time.sleep) -> None:
+        """Adjusts the throttling periodically. Intended to run as a background task
+
+        Args:
+            interval (float): Time in seconds between adjustments
+            sleep (callable, optional): Sleep function, should be the one from the async
+                framework in use. Defaults to time.sleep.
+        """
+        while True:
+            sleep(interval)
+            self.adjust()
@@ -0,0 +1,170 @@
+"""Module for scheduling image garbage collection across the fleet"""
+
+from datetime import datetime, time as time_of_day
+from logging import getLogger
+import threading
+import time
+from commands import FINAL_STATES
+
+def parse_window(window: str) -> tuple:
+    """Parses a daily time window in the form ``HH:MM-HH:MM``. The window can pass midnight,
+    for example ``22:00-04:00``.
+
+    Args:
+        window (str): Time window
+
+    Raises:
+        ValueError: If the window is invalid
+
+    Returns:
+        tuple[datetime.time, datetime.time]: Start and end of the window
+    """
+    try:
+        start, end = window.split("-")
+        return (datetime.strptime(start.strip(), "%H:%M").time(),
+                datetime.strptime(end.strip(), "%H:%M").time())
+    except ValueError as error:
+        raise ValueError(f'Invalid time window "{window}", expected "HH:MM-HH:MM"') from error
+
+def in_window(window: tuple, moment: time_of_day) -> bool:
+    """Checks if a time of day is within a window
+
+    Args:
+        window (tuple[datetime.time, datetime.time]): Window from :func:`parse_window`.
+            None is a window covering the whole day
+        moment (datetime.time): Time of day
+
+    Returns:
+        bool: If the time is within the window
+    """
+    if window is None:
+        return True
+    start, end = window
+    if start <= end:
+        return start <= moment < end
+    return moment >= start or moment < end
+
+class GarbageCollectionScheduler(): # pylint: disable=too-many-instance-attributes
+    """Sends garbage collection commands to the devices under disk pressure.
+
+    Devices are collected when their disk usage is above the threshold, during the idle window
+    and when no other command is running on the device. Devices above the critical threshold
+    are collected outside the idle window as well. A device is collected at most once per
+    minimum interval, and at most ``concurrency`` devices are collected at the same time.
+
+    Args:
+        fleet (Fleet): Fleet with the disk usage reported by the devices
+        command_tracker (CommandTracker): Tracker used to send the commands
+        threshold (float): Disk usage in percent which triggers a collection
+        critical_threshold (float): Disk usage in percent which triggers a collection outside
+            the idle window
+        concurrency (int): Maximum number of devices collected at the same time
+        idle_window (tuple, optional): Daily window from :func:`parse_window`.
+            Defaults to None, the whole day.
+        min_interval (float, optional): Minimum time in seconds between two collections of
+            a device. Defaults to 86400.
+        clock (callable, optional): Returns the current time. Defaults to datetime.now.
+    """
+    def __init__(   self, fleet: object, command_tracker: object, threshold: float, # pylint: disable=too-many-arguments
+                    critical_threshold: float, concurrency: int, idle_window: tuple = None,
+                    min_interval: float = 86400, clock: object = datetime.now) -> None:
+        self.fleet = fleet
+        self.command_tracker = command_tracker
+        self.threshold = threshold
+        self.critical_threshold = critical_threshold
+        self.concurrency = concurrency
+        self.idle_window = idle_window
+        self.min_interval = min_interval
+        self.clock = clock
+
+        self._running = {}
+        self._last_collected = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def schedule(self) -> list:
+        """Sends garbage collection commands to the devices which are due, most used disk first
+
+        Returns:
+            list[str]: IDs of the devices a command was sent to
+        """
+        now = self.clock()
+        idle = in_window(self.idle_window, now.time())
+        with self._lock:
+            self._release_finished()
+            candidates = []
+            for device_id, device in self.fleet.get_fleet_information().items():
+                disk_percent = self._disk_percent(device)
+                if disk_percent is None or disk_percent < self.threshold:
+                    continue
+                if not idle and disk_percent < self.critical_threshold:
+                    continue
+                if not device.get("online") or device_id in self._running:
+                    continue
+                last_collected = self._last_collected.get(device_id)
+                if last_collected is not None and \
+                        (now - last_collected).total_seconds() < self.min_interval:
+                    continue
+                candidates.append((disk_percent, device_id))
+
+            scheduled = []
+            for _, device_id in sorted(candidates, reverse=True):
+                if len(self._running) >= self.concurrency:
+                    break
+                if self.command_tracker.commands(device_id=device_id, in_flight=True):
+                    continue
+                self._running[device_id] = self.command_tracker.submit(
+                    device_id, {"command": "garbage_collect", "id": device_id}
+                )
+                self._last_collected[device_id] = now
+                scheduled.append(device_id)
+
+        if scheduled:
+            self.log.info('Garbage collection scheduled on %s devices', len(scheduled))
+        return scheduled
+
+    def status(self) -> dict:
+        """Devices being collected and the last collection time of each device
+
+        Returns:
+            dict: Command IDs of the running collections and the last collection times
+        """
+        with self._lock:
+            self._release_finished()
+            return {
+                "running": dict(self._running),
+                "last_collected": {
+                    device_id: collected.isoformat(timespec="seconds")
+                    for device_id, collected in self._last_collected.items()
+                }
+            }
+
+    def run(self, interval: float, sleep: object = time.sleep) -> None:
+        """Schedules garbage collection periodically. Intended to run as a background task
+
+        Args:
+            interval (float): Time in seconds between scheduling rounds
+            sleep (callable, optional): Sleep function, should be the one from the async
+                framework in use. Defaults to time.sleep.
+        """
+        while True:
+            sleep(interval)
+            try:
+                self.schedule()
+            except Exception: # pylint: disable=broad-except
+                self.log.exception('Could not schedule garbage collection')
+
+    def _release_finished(self) -> None:
+        # Must be called with the lock held
+        for device_id, command_id in list(self._running.items()):
+            record = self.command_tracker.get(command_id)
+            if record is None or record["state"] in FINAL_STATES:
+                self._running.pop(device_id)
+
+    @staticmethod
+    def _disk_percent(device: dict) -> float:
+        disk = device.get("disk")
+        if not isinstance(disk, dict):
+            return None
+        return disk.get("disk_percent")
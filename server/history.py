@@ -0,0 +1,99 @@
+"""Module for keeping a bounded history of device telemetry"""
+
+from collections import deque
+import json
+import threading
+import time
+import zlib
+
+def decode_backlog(payload: bytes, max_bytes: int) -> dict:
+    """Decodes a compressed telemetry backlog sent by a client, see
+    ``client/telemetry_buffer.py``
+
+    Args:
+        payload (bytes): Compressed backlog
+        max_bytes (int): Maximum size of the decompressed backlog in bytes
+
+    Raises:
+        ValueError: If the payload is not a compressed backlog, or decompresses to more
+            than ``max_bytes``
+
+    Returns:
+        dict: Device ID and history entries
+    """
+    if not isinstance(payload, bytes):
+        raise ValueError("Backlog is not binary")
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(payload, max_bytes)
+    except zlib.error as error:
+        raise ValueError(f'Backlog is not compressed: {error}') from error
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'Backlog exceeds {max_bytes} bytes')
+
+    backlog = json.loads(data)
+    if not isinstance(backlog, dict) or not isinstance(backlog.get("id"), str) \
+            or not isinstance(backlog.get("entries"), list) \
+            or not all(isinstance(entry, dict) and isinstance(entry.get("timestamp"), (int, float))
+                       for entry in backlog["entries"]):
+        raise ValueError("Backlog is not a list of history entries")
+    return backlog
+
+class DeviceHistory():
+    """Bounded history of the metric samples and container state changes of one device.
+
+    Entries are dicts with ``timestamp``, ``cpu_load`` and ``memory_usage``. Container states
+    are included as ``containers`` (container name mapped to status) when they have changed.
+
+    Args:
+        max_entries (int): Maximum number of entries kept
+    """
+    def __init__(self, max_entries: int) -> None:
+        self._entries = deque(maxlen=max_entries)
+        self._container_states = {}
+        self._lock = threading.Lock()
+
+    def add_telemetry(self, telemetry_post: dict, timestamp: float = None) -> None:
+        """Adds a telemetry post to the history
+
+        Args:
+            telemetry_post (dict): Telemetry post
+            timestamp (float, optional): Time of the post. Defaults to time.time().
+        """
+        entry = {
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "cpu_load": telemetry_post.get("cpu_load"),
+            "memory_usage": telemetry_post.get("memory_usage")
+        }
+
+        # Same container state diff as TelemetryBuffer.record in client/telemetry_buffer.py,
+        # the client and server are built separately and the two must be kept in sync
+        with self._lock:
+            changed_states = {}
+            for container in telemetry_post.get("containers", []):
+                if self._container_states.get(container["name"]) != container["status"]:
+                    changed_states[container["name"]] = container["status"]
+                    self._container_states[container["name"]] = container["status"]
+            if changed_states:
+                entry["containers"] = changed_states
+            self._entries.append(entry)
+
+    def add_entries(self, entries: list) -> None:
+        """Adds entries recorded by the client while the server was unreachable
+
+        Args:
+            entries (list[dict]): History entries
+        """
+        with self._lock:
+            merged = sorted(list(self._entries) + entries, key=lambda entry: entry["timestamp"])
+            self._entries.clear()
+            self._entries.extend(merged)
+
+    def entries(self) -> list:
+        """History entries, oldest first
+
+        Returns:
+            list[dict]: History entries
+        """
+        with self._lock:
+            return list(self._entries)
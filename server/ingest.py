@@ -0,0 +1,106 @@
+"""Module for coalescing incoming telemetry before it is applied to the fleet"""
+
+from logging import getLogger
+import threading
+import time
+
+class TelemetryIngest(): # pylint: disable=too-many-instance-attributes
+    """Queues telemetry posts and applies them to the fleet in batches.
+
+    Posts are keyed on device ID, a device posting several times within the same window only
+    keeps its latest post. The queue depth is capped, posts from new devices are rejected
+    when the queue is full to give backpressure to the clients, which retry with backoff.
+
+    Args:
+        fleet (Fleet): Fleet which the telemetry batches are applied to
+        window (float): Minimum time in seconds between two applied batches (broadcasts)
+        max_queue_depth (int): Maximum number of devices waiting in the queue
+    """
+    def __init__(self, fleet: object, window: float, max_queue_depth: int) -> None:
+        self.fleet = fleet
+        self.window = window
+        self.max_queue_depth = max_queue_depth
+
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.last_flush_duration = 0
+        self.log = getLogger(self.__class__.__name__)
+
+    def submit(self, telemetry_post: dict) -> bool:
+        """Adds a telemetry post to the queue
+
+        Args:
+            telemetry_post (dict): Telemetry post from a client
+
+        Returns:
+            bool: If the post was accepted. False if the queue is full
+        """
+        with self._lock:
+            device_id = telemetry_post["id"]
+            if device_id not in self._pending and len(self._pending) >= self.max_queue_depth:
+                self.rejected += 1
+                self.log.warning(
+                    'Telemetry queue full (%s devices), rejecting post from "%s"',
+                    self.max_queue_depth, device_id
+                )
+                return False
+
+            # Re-inserting moves the device last, posts are applied in arrival order
+            self._pending.pop(device_id, None)
+            self._pending[device_id] = telemetry_post
+            return True
+
+    def queue_depth(self) -> int:
+        """Number of devices waiting in the queue
+
+        Returns:
+            int: Queue depth
+        """
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Applies all queued telemetry to the fleet as one batch
+
+        Returns:
+            int: Number of applied telemetry posts
+        """
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending = {}
+
+        if batch:
+            self.log.debug("Applying telemetry batch of %s posts", len(batch))
+            start = time.monotonic()
+            self.fleet.add_telemetry_batch(batch)
+            self.last_flush_duration = time.monotonic() - start
+        return len(batch)
+
+    def load(self) -> float:
+        """Load of the ingest, 1 means that the queue is full or that applying a batch
+        takes the entire window
+
+        Returns:
+            float: Load
+        """
+        return max(
+            self.queue_depth() / self.max_queue_depth,
+            self.last_flush_duration / self.window
+        )
+
+    def run(self, sleep: object = time.sleep) -> None:
+        """Flushes the queue once every window. Intended to run as a background task
+
+        Args:
+            sleep (callable, optional): Sleep function, should be the one from the async
+                framework in use. Defaults to time.sleep.
+        """
+        self.log.info("Starting telemetry ingest, window: %s s", self.window)
+        while True:
+            start = time.monotonic()
+            try:
+                self.flush()
+            except Exception: # pylint: disable=broad-except
+                self.log.exception("Could not apply telemetry batch")
+            sleep(max(self.window - (time.monotonic() - start), 0))
@@ -0,0 +1,168 @@
+"""Module for device labels and label selectors
+
+Selectors are comma separated requirements which all must be met:
+
+- ``key=value``, the label has the value
+- ``key!=value``, the label does not have the value, or the device does not have the label
+- ``key``, the device has the label
+- ``!key``, the device does not have the label
+"""
+
+import re
+import threading
+
+LABEL_KEY_PATTERN = re.compile(r'^[A-Za-z0-9]([A-Za-z0-9_.\-/]*[A-Za-z0-9])?$')
+
+EQUALS = "="
+NOT_EQUALS = "!="
+EXISTS = "exists"
+NOT_EXISTS = "!exists"
+
+def parse_selector(selector: str) -> list:
+    """Parses a label selector
+
+    Args:
+        selector (str): Label selector, for example ``site=lab,arch=arm64``
+
+    Raises:
+        ValueError: If the selector is invalid
+
+    Returns:
+        list[tuple[str, str, str]]: Requirements as key, operator and value
+    """
+    requirements = []
+    for requirement in selector.split(","):
+        requirement = requirement.strip()
+        if not requirement:
+            continue
+        if NOT_EQUALS in requirement:
+            key, value = requirement.split(NOT_EQUALS, 1)
+            operator = NOT_EQUALS
+        elif EQUALS in requirement:
+            key, value = requirement.split(EQUALS, 1)
+            operator = EQUALS
+        elif requirement.startswith("!"):
+            key, value, operator = requirement[1:], None, NOT_EXISTS
+        else:
+            key, value, operator = requirement, None, EXISTS
+
+        key = key.strip()
+        if not LABEL_KEY_PATTERN.match(key):
+            raise ValueError(f'Invalid label key in selector: "{key}"')
+        requirements.append((key, operator, None if value is None else value.strip()))
+
+    if not requirements:
+        raise ValueError('Empty label selector')
+    return requirements
+
+def matches(requirements: list, labels: dict) -> bool:
+    """Checks a device's labels against a parsed selector, without an index
+
+    Args:
+        requirements (list[tuple[str, str, str]]): Requirements from :func:`parse_selector`
+        labels (dict): Device labels
+
+    Returns:
+        bool: If all requirements are met
+    """
+    for key, operator, value in requirements:
+        if operator == EQUALS and labels.get(key) != value:
+            return False
+        if operator == NOT_EQUALS and labels.get(key) == value:
+            return False
+        if operator == EXISTS and key not in labels:
+            return False
+        if operator == NOT_EXISTS and key in labels:
+            return False
+    return True
+
+class LabelIndex():
+    """Inverted index from label key and value to the devices having the label.
+
+    A selector is evaluated with set operations on the index, starting from the smallest
+    set of devices matching a positive requirement, without looking at the devices.
+    """
+    def __init__(self) -> None:
+        self._labels = {}
+        self._values = {}
+        self._keys = {}
+        self._devices = set()
+        self._lock = threading.Lock()
+
+    def update(self, device_id: str, labels: dict) -> None:
+        """Sets the labels of a device
+
+        Args:
+            device_id (str): Device ID
+            labels (dict): Label key mapped to value
+        """
+        with self._lock:
+            if device_id in self._devices and self._labels.get(device_id) == labels:
+                return
+            self._remove(device_id)
+            self._devices.add(device_id)
+            self._labels[device_id] = dict(labels)
+            for key, value in labels.items():
+                self._values.setdefault((key, value), set()).add(device_id)
+                self._keys.setdefault(key, set()).add(device_id)
+
+    def remove(self, device_id: str) -> None:
+        """Removes a device from the index
+
+        Args:
+            device_id (str): Device ID
+        """
+        with self._lock:
+            self._remove(device_id)
+
+    def labels(self) -> dict:
+        """Label keys in use, with their values
+
+        Returns:
+            dict: Label key mapped to a sorted list of values
+        """
+        with self._lock:
+            keys = {}
+            for key, value in self._values:
+                keys.setdefault(key, []).append(value)
+            return {key: sorted(values) for key, values in keys.items()}
+
+    def select(self, requirements: list) -> set:
+        """Devices matching a parsed selector
+
+        Args:
+            requirements (list[tuple[str, str, str]]): Requirements from :func:`parse_selector`
+
+        Returns:
+            set[str]: Device IDs
+        """
+        with self._lock:
+            positive = []
+            negative = []
+            for key, operator, value in requirements:
+                if operator == EQUALS:
+                    positive.append(self._values.get((key, value), set()))
+                elif operator == EXISTS:
+                    positive.append(self._keys.get(key, set()))
+                elif operator == NOT_EQUALS:
+                    negative.append(self._values.get((key, value), set()))
+                else:
+                    negative.append(self._keys.get(key, set()))
+
+            positive.sort(key=len)
+            selected = set(positive[0]) if positive else set(self._devices)
+            for devices in positive[1:]:
+                selected &= devices
+            for devices in negative:
+                selected -= devices
+            return selected
+
+    def _remove(self, device_id: str) -> None:
+        # Must be called with the lock held
+        self._devices.discard(device_id)
+        for key, value in self._labels.pop(device_id, {}).items():
+            for index, index_key in ((self._values, (key, value)), (self._keys, key)):
+                devices = index[index_key]
+                devices.discard(device_id)
+                if not devices:
+                    index.pop(index_key)
@@ -0,0 +1,159 @@
+"""Module for statistical profiling of the running application
+
+The profiler samples the stacks of all threads at a fixed interval from a separate thread,
+which keeps the overhead low enough to run in production. The samples are aggregated as
+collapsed stacks, one line per unique stack with the frames separated by ``;`` followed by
+the number of samples, which is the input format of flamegraph tools.
+
+The same profiler is used on the client. Both sides are built separately, so
+``client/profiler.py`` is a copy of this module and the two must be kept identical.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+
+MAX_DURATION = 60
+MIN_INTERVAL = 0.001
+
+def frame_name(frame) -> str:
+    """Name of a stack frame in a collapsed stack
+
+    Args:
+        frame (frame): Stack frame
+
+    Returns:
+        str: Function name and file name
+    """
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+def collapse(frame) -> str:
+    """Collapses a stack, outermost frame first
+
+    Args:
+        frame (frame): Innermost stack frame
+
+    Returns:
+        str: Frames separated by ``;``
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+def check_parameters(duration: float, interval: float) -> None:
+    """Checks the duration and sample interval of a profile
+
+    Args:
+        duration (float): Time in seconds to sample
+        interval (float): Time in seconds between samples
+
+    Raises:
+        ValueError: If the duration or interval is not a finite positive number
+    """
+    for name, value in (("duration", duration), ("interval", interval)):
+        if not math.isfinite(value) or value <= 0:
+            raise ValueError(f'Profile {name} must be a positive number, got {value}')
+
+class SamplingProfiler():
+    """Samples the stacks of all threads for a bounded duration. Only one profile can run at
+    a time.
+
+    Args:
+        sleep (callable, optional): Sleep function of the sampling thread. Defaults to
+            time.sleep.
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+    """
+    def __init__(self, sleep: object = time.sleep, clock: object = time.monotonic) -> None:
+        self.sleep = sleep
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stacks = {}
+        self._samples = 0
+
+    @property
+    def running(self) -> bool:
+        """If a profile is being recorded
+
+        Returns:
+            bool: Running state
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, interval: float = 0.01) -> None:
+        """Starts recording a profile in a separate thread
+
+        Args:
+            duration (float): Time in seconds to sample, at most ``MAX_DURATION``
+            interval (float, optional): Time in seconds between samples, at least
+                ``MIN_INTERVAL``. Defaults to 0.01.
+
+        Raises:
+            ValueError: If the duration or interval is not a positive number
+            RuntimeError: If a profile is already being recorded
+        """
+        check_parameters(duration, interval)
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already being recorded")
+            self._stacks = {}
+            self._samples = 0
+            self._thread = threading.Thread(
+                target=self._sample,
+                args=(min(duration, MAX_DURATION), max(interval, MIN_INTERVAL)),
+                name="profiler",
+                daemon=True
+            )
+            self._thread.start()
+
+    def profile(self, duration: float, interval: float = 0.01) -> str:
+        """Records a profile and waits for it to finish
+
+        Args:
+            duration (float): Time in seconds to sample, at most ``MAX_DURATION``
+            interval (float, optional): Time in seconds between samples. Defaults to 0.01.
+
+        Returns:
+            str: Collapsed stacks, see :func:`collapsed`
+        """
+        self.start(duration, interval)
+        self._thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        """Collapsed stacks of the last profile, most sampled first
+
+        Returns:
+            str: One line per stack with the frames separated by ``;`` and the number of
+                samples
+        """
+        stacks = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f'{stack} {count}\n' for stack, count in stacks)
+
+    @property
+    def samples(self) -> int:
+        """Number of samples in the last profile
+
+        Returns:
+            int: Number of samples
+        """
+        return self._samples
+
+    def _sample(self, duration: float, interval: float) -> None:
+        own_id = threading.get_ident()
+        end = self.clock() + duration
+        while self.clock() < end:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items(): # pylint: disable=protected-access
+                if thread_id == own_id:
+                    continue
+                stack = f'{thread_names.get(thread_id, thread_id)};{collapse(frame)}'
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self._samples += 1
+            self.sleep(interval)
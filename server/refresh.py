@@ -0,0 +1,132 @@
+"""Module for on-demand refreshes of the telemetry of several devices at once"""
+
+from logging import getLogger
+import threading
+import time
+from uuid import uuid4
+
+class RefreshCoordinator():
+    """Asks a set of devices for fresh telemetry and gathers the answers.
+
+    A refresh is fanned out in one message to all connected devices, listing the devices which
+    should answer. Each device answers with a telemetry post carrying the refresh ID. The
+    refresh is done when all devices have answered or the deadline has passed, and the result
+    lists the devices which did not answer in time.
+
+    Args:
+        send (callable): Function sending the refresh message to all devices, called with
+            the message dict
+        history_size (int, optional): Number of finished refreshes kept. Defaults to 100.
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+    """
+    def __init__(   self, send: object, history_size: int = 100,
+                    clock: object = time.monotonic) -> None:
+        self.send = send
+        self.history_size = history_size
+        self.clock = clock
+
+        self._refreshes = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def start(self, device_ids: list, all_devices: bool = False) -> str:
+        """Sends a refresh request to the devices
+
+        Args:
+            device_ids (list[str]): Devices expected to answer
+            all_devices (bool, optional): All devices should answer, which sends the request
+                without a device list. Defaults to False.
+
+        Returns:
+            str: Refresh ID
+        """
+        refresh_id = uuid4().hex
+        with self._lock:
+            self._refreshes[refresh_id] = {
+                "started": self.clock(),
+                "pending": set(device_ids),
+                "answered": {}
+            }
+            while len(self._refreshes) > self.history_size:
+                self._refreshes.pop(next(iter(self._refreshes)))
+
+        self.send({
+            "refresh_id": refresh_id,
+            "devices": None if all_devices else sorted(device_ids)
+        })
+        return refresh_id
+
+    def answer(self, device_id: str, refresh_id: str) -> None:
+        """Registers the answer of a device
+
+        Args:
+            device_id (str): Device ID
+            refresh_id (str): Refresh ID from the telemetry post
+        """
+        with self._lock:
+            refresh = self._refreshes.get(refresh_id)
+            if refresh is None or device_id not in refresh["pending"]:
+                return
+            refresh["pending"].discard(device_id)
+            refresh["answered"][device_id] = round(self.clock() - refresh["started"], 3)
+
+    def done(self, refresh_id: str) -> bool:
+        """Checks if all devices have answered a refresh
+
+        Args:
+            refresh_id (str): Refresh ID
+
+        Returns:
+            bool: If no device is pending
+        """
+        with self._lock:
+            refresh = self._refreshes.get(refresh_id)
+            return refresh is None or len(refresh["pending"]) == 0
+
+    def gather(self, refresh_id: str, deadline: float, sleep: object = time.sleep,
+               poll_interval: float = 0.05) -> dict:
+        """Waits for the answers of a refresh until all devices have answered or the
+        deadline has passed
+
+        Args:
+            refresh_id (str): Refresh ID
+            deadline (float): Time in seconds from the start of the refresh
+            sleep (callable, optional): Sleep function, should be the one from the async
+                framework in use. Defaults to time.sleep.
+            poll_interval (float, optional): Time in seconds between checks. Defaults to 0.05.
+
+        Returns:
+            dict: Refresh result, see :func:`result`
+        """
+        with self._lock:
+            started = self._refreshes[refresh_id]["started"]
+        while not self.done(refresh_id):
+            remaining = started + deadline - self.clock()
+            if remaining <= 0:
+                break
+            sleep(min(poll_interval, remaining))
+        return self.result(refresh_id)
+
+    def result(self, refresh_id: str) -> dict:
+        """Current result of a refresh
+
+        Args:
+            refresh_id (str): Refresh ID
+
+        Returns:
+            dict: Refresh ID, whether all devices answered, time in seconds until each device
+                answered, the devices which have not answered and the elapsed time.
+                None if the refresh is unknown
+        """
+        with self._lock:
+            refresh = self._refreshes.get(refresh_id)
+            if refresh is None:
+                return None
+            return {
+                "refresh_id": refresh_id,
+                "complete": len(refresh["pending"]) == 0,
+                "answered": dict(refresh["answered"]),
+                "missing": sorted(refresh["pending"]),
+                "elapsed": round(self.clock() - refresh["started"], 3)
+            }
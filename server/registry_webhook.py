@@ -0,0 +1,60 @@
+"""Module to parse push notifications from container registries
+
+Supported formats:
+
+- Docker hub webhooks, see https://docs.docker.com/docker-hub/webhooks/
+- Registry notifications from the Docker distribution registry (and compatible registries),
+  see https://distribution.github.io/distribution/about/notifications/
+"""
+
+def parse_push_notification(payload: dict) -> list:
+    """Extracts the pushed images from a push notification
+
+    Args:
+        payload (dict): Notification body
+
+    Raises:
+        ValueError: If the payload is not a supported push notification
+
+    Returns:
+        list[tuple[str, str]]: Repository and tag of the pushed images
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Push notification must be a JSON object')
+
+    if "push_data" in payload and "repository" in payload:
+        return _parse_docker_hub(payload)
+
+    if "events" in payload:
+        return _parse_registry_events(payload)
+
+    raise ValueError('Unknown push notification format')
+
+def _parse_docker_hub(payload: dict) -> list:
+    try:
+        push = (payload["repository"]["repo_name"], payload["push_data"]["tag"])
+    except (KeyError, TypeError) as error:
+        raise ValueError(f'Invalid Docker hub webhook, missing {error}') from error
+    if not all(isinstance(value, str) for value in push):
+        raise ValueError('Invalid Docker hub webhook, repository and tag must be strings')
+    return [push]
+
+def _parse_registry_events(payload: dict) -> list:
+    if not isinstance(payload["events"], list):
+        raise ValueError('Invalid registry notification, events must be a list')
+    pushes = []
+    for event in payload["events"]:
+        if not isinstance(event, dict) or not isinstance(event.get("target", {}), dict):
+            raise ValueError('Invalid registry event, event and target must be objects')
+        target = event.get("target", {})
+        # Pushes of layers and pushes by digest only carry no tag
+        if event.get("action") != "push" or "tag" not in target:
+            continue
+        try:
+            push = (target["repository"], target["tag"])
+        except KeyError as error:
+            raise ValueError(f'Invalid registry event, missing {error}') from error
+        if not all(isinstance(value, str) for value in push):
+            raise ValueError('Invalid registry event, repository and tag must be strings')
+        pushes.append(push)
+    return pushes
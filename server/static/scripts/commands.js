@@ -23,6 +23,17 @@ async function update_container(device_id, container_name) {
     )
 }
 
+async function rollback_container(device_id, container_name) {
+    await post_command(
+        "container-command",
+        {
+            command: "rollback_container",
+            id: device_id,
+            container_name: container_name
+        }
+    )
+}
+
 async function start_container(device_id, container_name) {
     await post_command(
         "container-command",
@@ -12,11 +12,30 @@ $(document).ready(function(){
     });
 
     socket.on('event_stream', function(event) {
+        // The server sends the fleet pre-serialized
+        if (typeof event === 'string') {
+            event = JSON.parse(event)
+        }
         console.debug(event);
-        render_ui(event)
+        schedule_render(event)
     });
 });
 
+var pending_event = null
+
+function schedule_render(event) {
+    // Events arriving within the same frame are merged and rendered once
+    if (pending_event === null) {
+        pending_event = {}
+        window.requestAnimationFrame(function() {
+            const event = pending_event
+            pending_event = null
+            render_ui(event)
+        })
+    }
+    Object.assign(pending_event, event)
+}
+
 async function render_ui(event) {
     for (var device_id in event) {
         await update_device_last_updated(device_id, event[device_id]['last_updated'])
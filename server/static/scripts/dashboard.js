@@ -0,0 +1,341 @@
+/*
+Dashboard for large fleets.
+
+Devices are loaded page by page from the fleet API while scrolling, only the rows inside the
+viewport are rendered and device details are fetched when a device is selected. The event stream
+only carries the devices which have changed, they are merged into the loaded devices and the
+rows are redrawn once per animation frame, only if a changed device is in view.
+*/
+
+const APPLICATION = {
+    SERVER_URL:  "http://" + document.domain + ':' + location.port
+}
+
+const DASHBOARD = {
+    ROW_PITCH: 80,
+    OVERSCAN: 10,
+    WATCH_INTERVAL: 15000,
+    MAX_WATCHED_DEVICES: 50,
+    devices: new Map(),
+    container_rows: [],
+    visible_device_ids: [],
+    rendered_device_ids: new Set(),
+    socket: null,
+    next_cursor: null,
+    selector: '',
+    loading: false,
+    pending_event: null,
+    pending_redraw: false
+}
+
+$(document).ready(function(){
+    add_devices(first_page)
+    DASHBOARD.next_cursor = first_page_next_cursor
+    schedule_render({})
+
+    $('#device-viewport').on('scroll', function() {
+        schedule_render({})
+        load_next_page_if_needed()
+    })
+    $('#container-viewport').on('scroll', function() {
+        schedule_render({})
+        load_next_page_if_needed()
+    })
+    $('#selector-form').on('submit', function(event) {
+        event.preventDefault()
+        apply_selector($('#selector-input').val().trim())
+    })
+    $('#device-rows').on('click', '.device-name', function() {
+        show_device_details($(this).data('device-id'))
+    })
+
+    var socket = io.connect(APPLICATION.SERVER_URL);
+    DASHBOARD.socket = socket
+
+    socket.on('connect', function() {
+        console.debug('Socket connected');
+    });
+
+    socket.on('event_stream', function(event) {
+        // The server sends the fleet pre-serialized
+        if (typeof event === 'string') {
+            event = JSON.parse(event)
+        }
+        schedule_render(event)
+    });
+
+    // Devices in view are pushing telemetry more often while they are watched
+    setInterval(function() {
+        watch_devices(DASHBOARD.visible_device_ids)
+    }, DASHBOARD.WATCH_INTERVAL)
+});
+
+function watch_devices(device_ids) {
+    if (device_ids.length > 0) {
+        DASHBOARD.socket.emit('watch_devices', device_ids.slice(0, DASHBOARD.MAX_WATCHED_DEVICES))
+    }
+}
+
+function add_devices(devices) {
+    for (var device_id in devices) {
+        DASHBOARD.devices.set(device_id, devices[device_id])
+    }
+    rebuild_container_rows()
+}
+
+function rebuild_container_rows() {
+    DASHBOARD.container_rows = []
+    DASHBOARD.devices.forEach(function(device, device_id) {
+        device['containers'].forEach(function(container, index) {
+            DASHBOARD.container_rows.push([device_id, index])
+        })
+    })
+}
+
+function schedule_render(event) {
+    // Events arriving within the same frame are merged and rendered once. An empty event,
+    // for example after scrolling, always redraws the rows
+    if (Object.keys(event).length === 0) {
+        DASHBOARD.pending_redraw = true
+    }
+    if (DASHBOARD.pending_event === null) {
+        DASHBOARD.pending_event = {}
+        window.requestAnimationFrame(function() {
+            const event = DASHBOARD.pending_event
+            const redraw = DASHBOARD.pending_redraw
+            DASHBOARD.pending_event = null
+            DASHBOARD.pending_redraw = false
+            if (apply_event(event) || redraw) {
+                render_rows()
+            }
+        })
+    }
+    Object.assign(DASHBOARD.pending_event, event)
+}
+
+function apply_event(event) {
+    // Returns if the rows in view have changed
+    var layout_changed = false
+    var rendered_changed = false
+    for (var device_id in event) {
+        // Devices on pages which are not loaded yet are picked up when the page is loaded,
+        // with a selector only the devices already loaded are known to match it
+        const loaded = DASHBOARD.devices.get(device_id)
+        if (loaded !== undefined ||
+                (DASHBOARD.next_cursor === null && DASHBOARD.selector === '')) {
+            // The container rows only have to be rebuilt when devices or containers are added
+            if (loaded === undefined ||
+                    loaded['containers'].length != event[device_id]['containers'].length) {
+                layout_changed = true
+            }
+            DASHBOARD.devices.set(device_id, event[device_id])
+            rendered_changed = rendered_changed || DASHBOARD.rendered_device_ids.has(device_id)
+        }
+    }
+    if (layout_changed) {
+        rebuild_container_rows()
+    }
+    return layout_changed || rendered_changed
+}
+
+async function load_next_page_if_needed() {
+    if (DASHBOARD.loading || DASHBOARD.next_cursor === null) {
+        return
+    }
+    const viewport = $('#device-viewport')[0]
+    const container_viewport = $('#container-viewport')[0]
+    if (!near_end(viewport) && !near_end(container_viewport)) {
+        return
+    }
+
+    await load_page()
+}
+
+async function apply_selector(selector) {
+    DASHBOARD.selector = selector
+    DASHBOARD.devices.clear()
+    DASHBOARD.next_cursor = null
+    rebuild_container_rows()
+    await load_page()
+}
+
+async function load_page() {
+    DASHBOARD.loading = true
+    try {
+        const parameters = {limit: page_size, fields: page_fields}
+        if (DASHBOARD.next_cursor !== null) {
+            parameters.cursor = DASHBOARD.next_cursor
+        }
+        if (DASHBOARD.selector !== '') {
+            parameters.selector = DASHBOARD.selector
+        }
+        const response = await fetch(APPLICATION.SERVER_URL + '/fleet?' + $.param(parameters))
+        if (!response.ok) {
+            throw new Error(await response.text())
+        }
+        add_devices(await response.json())
+        DASHBOARD.next_cursor = next_cursor_from_link(response.headers.get('Link'))
+        schedule_render({})
+    }
+    catch(error) {
+        console.error(error);
+    }
+    finally {
+        DASHBOARD.loading = false
+    }
+}
+
+function near_end(viewport) {
+    return viewport.scrollTop + 2 * viewport.clientHeight >= viewport.scrollHeight
+}
+
+function next_cursor_from_link(link) {
+    if (link === null) {
+        return null
+    }
+    const match = link.match(/[?&]cursor=([^&>]*)/)
+    return match === null ? null : decodeURIComponent(match[1])
+}
+
+async function show_device_details(device_id) {
+    const response = await fetch(APPLICATION.SERVER_URL + '/fleet?' + $.param({device_id: device_id}))
+    const device = (await response.json())[device_id]
+    if (device === undefined) {
+        return
+    }
+    watch_devices([device_id])
+    $('#device-details-title').text(device['name'])
+    $('#device-details-content').text(JSON.stringify(device, null, 4))
+    $('#device-details').removeClass('d-none')
+}
+
+function render_rows() {
+    const device_ids = Array.from(DASHBOARD.devices.keys())
+    const [first_visible, last_visible] = visible_range($('#device-viewport')[0], device_ids.length)
+    DASHBOARD.visible_device_ids = device_ids.slice(first_visible, last_visible)
+    DASHBOARD.rendered_device_ids = new Set()
+    render_window($('#device-viewport')[0], $('#device-rows'), device_ids.length, function(index) {
+        DASHBOARD.rendered_device_ids.add(device_ids[index])
+        return device_row(DASHBOARD.devices.get(device_ids[index]))
+    })
+    render_window($('#container-viewport')[0], $('#container-rows'), DASHBOARD.container_rows.length, function(index) {
+        const [device_id, container_index] = DASHBOARD.container_rows[index]
+        const device = DASHBOARD.devices.get(device_id)
+        DASHBOARD.rendered_device_ids.add(device_id)
+        return container_row(device, device['containers'][container_index])
+    })
+}
+
+function visible_range(viewport, row_count) {
+    const first = Math.floor(viewport.scrollTop / DASHBOARD.ROW_PITCH)
+    const last = Math.min(first + Math.ceil(viewport.clientHeight / DASHBOARD.ROW_PITCH), row_count)
+    return [first, last]
+}
+
+function render_window(viewport, body, row_count, render_row) {
+    // Only the rows in view (and a few around them) are part of the DOM,
+    // spacer rows keep the scroll height of the full table
+    const [first_visible, last_visible] = visible_range(viewport, row_count)
+    const first = Math.max(first_visible - DASHBOARD.OVERSCAN, 0)
+    const last = Math.min(last_visible + DASHBOARD.OVERSCAN, row_count)
+
+    const rows = [spacer_row(first * DASHBOARD.ROW_PITCH)]
+    for (var index = first; index < last; index++) {
+        rows.push(render_row(index))
+    }
+    rows.push(spacer_row((row_count - last) * DASHBOARD.ROW_PITCH))
+    body[0].innerHTML = rows.join('')
+}
+
+function spacer_row(height) {
+    return `<tr class="spacer-row"><td colspan="6" style="height: ${height}px"></td></tr>`
+}
+
+function escape_html(value) {
+    return String(value)
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;')
+}
+
+function device_row(device) {
+    const id = escape_html(device['id'])
+    const online = device['online']
+    return `
+        <tr>
+            <td>
+                <div class="device-info">
+                    <div>
+                        <h5 class="mb-0 device-name" data-device-id="${id}">${escape_html(device['name'])}</h5>
+                        <p class="text-muted mb-0">${escape_html(device['last_updated'])}</p>
+                    </div>
+                </div>
+            </td>
+            <td>${escape_html(device['ip_address'])}</td>
+            <td>
+                <span class="active-circle ${online ? 'bg-success' : 'bg-danger'}"></span>
+                <span>${online ? 'online' : 'offline'}</span>
+            </td>
+            <td>${escape_html(device['cpu_load'])} %</td>
+            <td>${escape_html(device['memory_usage'])} %</td>
+            <td>
+                <div class="dropdown">
+                    <button class="btn shadow-none" type="button" data-bs-toggle="dropdown" aria-haspopup="true" aria-expanded="false">
+                        <i class="fa fa-ellipsis-v"></i>
+                    </button>
+                    <ul class="dropdown-menu">
+                        <li onclick="remove_device('${id}')"><a class="dropdown-item" href="#"><i class="fa fa-trash pe-2"></i>Remove</a></li>
+                    </ul>
+                </div>
+            </td>
+        </tr>`
+}
+
+function update_status_badge(update_available) {
+    if (update_available == null) {
+        return '<span class="badge bg-secondary">No information</span>'
+    }
+    if (update_available) {
+        return '<span class="badge bg-warning">New version available</span>'
+    }
+    return '<span class="badge bg-success">Up to date</span>'
+}
+
+function container_row(device, container) {
+    const device_id = escape_html(device['id'])
+    const name = escape_html(container['name'])
+    const running = container['status'] == 'running'
+    return `
+        <tr>
+            <td>
+                <div class="device-info">
+                    <div>
+                        <h5 class="mb-0">${escape_html(device['name'])}</h5>
+                        <p class="text-muted mb-0">${escape_html(device['ip_address'])}</p>
+                    </div>
+                </div>
+            </td>
+            <td>${name}</td>
+            <td>
+                <span class="active-circle ${running ? 'bg-success' : 'bg-danger'}"></span>
+                <span>${escape_html(container['status'])}</span>
+            </td>
+            <td>${escape_html(container['image_name'])}</td>
+            <td>${update_status_badge(container['update_available'])}</td>
+            <td>
+                <div class="dropdown">
+                    <button class="btn shadow-none" type="button" data-bs-toggle="dropdown" aria-haspopup="true" aria-expanded="false">
+                        <i class="fa fa-ellipsis-v"></i>
+                    </button>
+                    <ul class="dropdown-menu">
+                        <li onclick="update_container('${device_id}', '${name}')"><a class="dropdown-item" href="#"><i class="fa fa-refresh pe-2"></i>Update</a></li>
+                        <li onclick="rollback_container('${device_id}', '${name}')"><a class="dropdown-item" href="#"><i class="fa fa-undo pe-2"></i>Roll back</a></li>
+                        <li onclick="start_container('${device_id}', '${name}')"><a class="dropdown-item" href="#"><i class="fa fa-play pe-2"></i>Start</a></li>
+                        <li onclick="stop_container('${device_id}', '${name}')"><a class="dropdown-item" href="#"><i class="fa fa-stop pe-2"></i>Stop</a></li>
+                    </ul>
+                </div>
+            </td>
+        </tr>`
+}
@@ -0,0 +1,126 @@
+"""Module for an indexed catalogue of the image tags in the remote repository"""
+
+from bisect import bisect_left, insort
+import re
+import threading
+
+SEMVER_PATTERN = re.compile(
+    r'^(?P<prefix>.*?)v?(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)'
+    r'(?:-(?P<prerelease>[0-9A-Za-z.-]+))?$'
+)
+
+def parse_semver(tag: str) -> tuple:
+    """Parses a tag ending with a semantic version, for example ``1.2.3``, ``v1.2.3`` or
+    ``fm-server-1.2.3-beta.1``
+
+    Args:
+        tag (str): Image tag
+
+    Returns:
+        tuple: Prefix and sort key of the version. None if the tag is not a semantic version
+    """
+    match = SEMVER_PATTERN.match(tag)
+    if match is None:
+        return None
+    prerelease = match.group("prerelease")
+    # Releases sort after their prereleases
+    key = (
+        int(match.group("major")), int(match.group("minor")), int(match.group("patch")),
+        prerelease is None, prerelease or ""
+    )
+    return match.group("prefix"), key
+
+class TagCatalogue():
+    """Sorted catalogue of image tags, supporting prefix and semantic version queries.
+
+    Tags are kept in a sorted list, a prefix query is a binary search. Tags ending with a
+    semantic version are also indexed per prefix, sorted by version.
+    """
+    def __init__(self) -> None:
+        self._tags = []
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def __contains__(self, tag: str) -> bool:
+        with self._lock:
+            index = bisect_left(self._tags, tag)
+            return index < len(self._tags) and self._tags[index] == tag
+
+    def add(self, tags: list) -> None:
+        """Adds tags to the catalogue, known tags are ignored
+
+        Args:
+            tags (list[str]): Image tags
+        """
+        with self._lock:
+            for tag in tags:
+                index = bisect_left(self._tags, tag)
+                if index < len(self._tags) and self._tags[index] == tag:
+                    continue
+                self._tags.insert(index, tag)
+                version = parse_semver(tag)
+                if version is not None:
+                    insort(self._versions.setdefault(version[0], []), (version[1], tag))
+
+    def retain(self, tags: set) -> None:
+        """Removes all tags not in ``tags``, used to drop tags deleted from the repository
+
+        Args:
+            tags (set[str]): Tags to keep
+        """
+        with self._lock:
+            self._tags = [tag for tag in self._tags if tag in tags]
+            for prefix in list(self._versions):
+                versions = [version for version in self._versions[prefix] if version[1] in tags]
+                if versions:
+                    self._versions[prefix] = versions
+                else:
+                    self._versions.pop(prefix)
+
+    def tags(self, prefix: str = "") -> list:
+        """Tags starting with a prefix, sorted
+
+        Args:
+            prefix (str, optional): Tag prefix. Defaults to "", all tags.
+
+        Returns:
+            list[str]: Image tags
+        """
+        with self._lock:
+            start = bisect_left(self._tags, prefix)
+            end = start
+            while end < len(self._tags) and self._tags[end].startswith(prefix):
+                end += 1
+            return self._tags[start:end]
+
+    def versions(self, prefix: str = "", prereleases: bool = False) -> list:
+        """Tags with a semantic version following the prefix, sorted by version
+
+        Args:
+            prefix (str, optional): Text before the version, for example ``fm-server-``.
+                Defaults to "", tags which are only a version.
+            prereleases (bool, optional): Include prereleases. Defaults to False.
+
+        Returns:
+            list[str]: Image tags, oldest version first
+        """
+        with self._lock:
+            return [
+                tag for key, tag in self._versions.get(prefix, [])
+                if prereleases or key[3]
+            ]
+
+    def latest(self, prefix: str = "") -> str:
+        """Tag with the highest released version following the prefix
+
+        Args:
+            prefix (str, optional): Text before the version. Defaults to "".
+
+        Returns:
+            str: Image tag. None if there is no version with the prefix
+        """
+        versions = self.versions(prefix)
+        return versions[-1] if versions else None
@@ -0,0 +1,319 @@
+"""Module for lightweight tracing of commands across the server and the clients
+
+A trace follows a command from the request in the web app, through the server and the client,
+until the telemetry reflecting the result arrives. Each step is a span with a start time and a
+duration. The trace context, ``{"trace_id": trace_id, "span_id": span_id}``, is added to the
+messages sent to the clients, which send their spans back to the server, see
+``client/tracing.py``. The server keeps latency histograms of the spans and can write them as
+JSON lines to a file.
+
+The server and the client are built separately. The trace context and the span stack of
+:class:`Span` and :class:`Tracer` are duplicated in ``client/tracing.py`` and must be kept in
+sync with it.
+"""
+
+import json
+from logging import getLogger
+import math
+import threading
+import time
+from uuid import uuid4
+from commands import LatencyHistogram
+
+MAX_NAME_LENGTH = 64
+MAX_SPAN_NAMES = 100
+
+def valid_span(span: object) -> bool:
+    """Checks the shape of a finished span received from a client
+
+    Args:
+        span (object): Span, see :func:`Span.end`
+
+    Returns:
+        bool: If the span has a name, a trace ID, a finite non-negative duration and
+            attributes
+    """
+    if not isinstance(span, dict):
+        return False
+    name, duration = span.get("name"), span.get("duration")
+    return isinstance(name, str) and 0 < len(name) <= MAX_NAME_LENGTH \
+        and isinstance(span.get("trace_id"), str) \
+        and isinstance(duration, (int, float)) and not isinstance(duration, bool) \
+        and math.isfinite(duration) and duration >= 0 \
+        and isinstance(span.get("attributes"), dict)
+
+class Span(): # pylint: disable=too-many-instance-attributes
+    """A timed step of a trace. Used as a context manager, which makes the span the parent of
+    the spans started in the same thread until it ends.
+
+    Args:
+        tracer (Tracer): Tracer recording the span
+        name (str): Span name
+        context (dict, optional): Trace context of the parent span. Defaults to None,
+            a new trace.
+        attributes (dict, optional): Span attributes. Defaults to None.
+    """
+    def __init__(   self, tracer: object, name: str, context: dict = None,
+                    attributes: dict = None) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = uuid4().hex if context is None else context["trace_id"]
+        self.parent_id = None if context is None else context.get("span_id")
+        self.span_id = uuid4().hex[:16]
+        self.attributes = {} if attributes is None else attributes
+        self.start = time.time()
+        self.error = None
+        self.ended = False
+        self._started = tracer.clock()
+
+    def context(self) -> dict:
+        """Trace context to propagate to child spans
+
+        Returns:
+            dict: Trace ID and span ID
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def end(self, duration: float = None) -> dict:
+        """Ends the span and records it
+
+        Args:
+            duration (float, optional): Duration in seconds. Defaults to None, the time since
+                the span was started.
+
+        Returns:
+            dict: The recorded span
+        """
+        self.ended = True
+        if duration is None:
+            duration = self.tracer.clock() - self._started
+        span = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.tracer.service,
+            "start": self.start,
+            "duration": round(duration, 6),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+        self.tracer.record(span)
+        return span
+
+    def __enter__(self):
+        self.tracer.push(self)
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.tracer.pop(self)
+        if exception_value is not None:
+            self.error = str(exception_value)
+            if self.tracer.is_held(self):
+                self.tracer.release(self.trace_id)
+        if not self.ended and not self.tracer.is_held(self):
+            self.end()
+
+class Tracer(): # pylint: disable=too-many-instance-attributes
+    """Starts spans and records finished spans, from the server and from the clients
+
+    A root span can be held open after its context manager exits, until the telemetry which
+    reflects the result of the command arrives, see :func:`hold` and :func:`finish`.
+
+    Args:
+        service (str): Name of the service the spans are started in
+        path (str, optional): File where the spans are written as JSON lines.
+            Defaults to None, not written.
+        clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+        max_held (int, optional): Maximum number of held spans, the oldest are dropped
+            without being recorded. Defaults to 1000.
+    """
+    def __init__(   self, service: str, path: str = None,
+                    clock: object = time.monotonic, max_held: int = 1000) -> None:
+        self.service = service
+        self.path = path
+        self.clock = clock
+        self.max_held = max_held
+
+        self._local = threading.local()
+        self._durations = {}
+        self._devices = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+        self.log = getLogger(self.__class__.__name__)
+
+    def span(self, name: str, context: dict = None, **attributes) -> Span:
+        """Starts a span
+
+        Args:
+            name (str): Span name
+            context (dict, optional): Trace context of the parent span. Defaults to None,
+                the current span of the thread or a new trace.
+            **attributes: Span attributes
+
+        Returns:
+            Span: The started span
+        """
+        if context is None and self.current() is not None:
+            context = self.current().context()
+        return Span(self, name, context, attributes)
+
+    def current(self) -> Span:
+        """Innermost span used as context manager in this thread
+
+        Returns:
+            Span: Current span. None if there is none
+        """
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def push(self, span: Span) -> None:
+        """Makes a span the current span of the thread
+
+        Args:
+            span (Span): Span
+        """
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        self._local.stack.append(span)
+
+    def pop(self, span: Span) -> None:
+        """Reverts :func:`push`
+
+        Args:
+            span (Span): Span
+        """
+        stack = getattr(self._local, "stack", [])
+        if span in stack:
+            stack.remove(span)
+
+    def hold(self, span: Span) -> None:
+        """Keeps a span open after its context manager exits, until :func:`finish` is called
+        with its trace ID
+
+        Args:
+            span (Span): Root span of a trace
+        """
+        with self._lock:
+            self._held[span.trace_id] = span
+            while len(self._held) > self.max_held:
+                self._held.pop(next(iter(self._held)))
+
+    def is_held(self, span: Span) -> bool:
+        """Checks if a span is held open
+
+        Args:
+            span (Span): Span
+
+        Returns:
+            bool: If the span is held
+        """
+        with self._lock:
+            return self._held.get(span.trace_id) is span
+
+    def release(self, trace_id: str) -> Span:
+        """Stops holding the span of a trace open, without ending it
+
+        Args:
+            trace_id (str): Trace ID
+
+        Returns:
+            Span: The held span. None if no span of the trace is held
+        """
+        with self._lock:
+            return self._held.pop(trace_id, None)
+
+    def finish(self, context: dict, device_id: str) -> None:
+        """Ends a trace when the telemetry reflecting the result of its command arrives.
+
+        A ``telemetry`` span is recorded from the time the command ended on the client, sent
+        in the context as ``ended``, until now. The difference between the clocks of the
+        server and the client is included, a negative duration is recorded as zero. The held
+        root span of the trace is ended, if any.
+
+        Args:
+            context (dict): Trace context from the telemetry post
+            device_id (str): Device ID
+        """
+        span = self.span('telemetry', context, device_id=device_id)
+        ended = context.get("ended")
+        if isinstance(ended, (int, float)):
+            span.start = ended
+            span.end(max(0.0, time.time() - ended))
+        else:
+            span.end()
+
+        root = self.release(context["trace_id"])
+        if root is not None:
+            root.end()
+
+    def record(self, span: dict) -> None:
+        """Records a finished span, started here or on a client. Spans from clients should be
+        checked with :func:`valid_span` first. At most ``MAX_SPAN_NAMES`` span names get a
+        histogram, further names are only written to the file
+
+        Args:
+            span (dict): Finished span, see :func:`Span.end`
+        """
+        device_id = span["attributes"].get("device_id")
+        with self._lock:
+            if span["name"] in self._durations or len(self._durations) < MAX_SPAN_NAMES:
+                self._durations.setdefault(span["name"], LatencyHistogram()) \
+                    .observe(span["duration"])
+                if device_id is not None:
+                    self._devices.setdefault(device_id, {}) \
+                        .setdefault(span["name"], LatencyHistogram()).observe(span["duration"])
+
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as stream:
+                stream.write(json.dumps(span) + "\n")
+        except OSError:
+            self.log.warning('Could not write span to "%s"', self.path)
+
+    def forget(self, device_id: str) -> None:
+        """Drops the histograms of a device, for example when it is removed from the fleet
+
+        Args:
+            device_id (str): Device ID
+        """
+        with self._lock:
+            self._devices.pop(device_id, None)
+
+    def summary(self, device_id: str = None) -> dict:
+        """Latency histograms of the recorded spans, per span name
+
+        Args:
+            device_id (str, optional): Only spans of this device. Defaults to None,
+                all spans.
+
+        Returns:
+            dict: Span name mapped to histogram summary
+        """
+        with self._lock:
+            durations = self._durations if device_id is None else \
+                self._devices.get(device_id, {})
+            return {name: histogram.summary() for name, histogram in durations.items()}
+
+    def slowest_devices(self, name: str, count: int = 10) -> list:
+        """Devices with the highest mean duration of a span
+
+        Args:
+            name (str): Span name, for example ``pull``
+            count (int, optional): Number of devices. Defaults to 10.
+
+        Returns:
+            list[dict]: Device ID, number of spans and mean duration in seconds, slowest first
+        """
+        with self._lock:
+            devices = [
+                {
+                    "device_id": device_id,
+                    "count": durations[name].count,
+                    "mean": round(durations[name].sum / durations[name].count, 3)
+                }
+                for device_id, durations in self._devices.items() if name in durations
+            ]
+        return sorted(devices, key=lambda device: device["mean"], reverse=True)[:count]
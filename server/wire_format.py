@@ -0,0 +1,116 @@
+"""Module to decode telemetry sent in the compact binary wire format
+
+See ``client/wire_format.py`` for a description of the format. The field IDs must match the
+encoder on the client.
+"""
+
+import zlib
+
+try:
+    import msgpack
+except ImportError:   # pragma: no cover
+    msgpack = None  # pylint: disable=invalid-name
+
+ENCODING = "msgpack"
+FORMAT_VERSION = 1
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+FIELD_IDS = {
+    "name": 0,
+    "id": 1,
+    "cpu_load": 2,
+    "memory_usage": 3,
+    "containers": 4,
+    "push_interval": 5,
+    "image_sha": 6,
+    "image_name": 7,
+    "image_repo": 8,
+    "image_tag": 9,
+    "status": 10
+}
+
+FIELD_NAMES = {field_id: key for key, field_id in FIELD_IDS.items()}
+
+DICTIONARY_FIELDS = ("name", "image_sha", "image_name", "image_repo", "image_tag", "status")
+
+# Must match the client, which sends strings beyond the dictionary without an ID
+MAX_DICTIONARY_SIZE = 4096
+
+def available() -> bool:
+    """Checks if the binary wire format can be used
+
+    Returns:
+        bool: If the MessagePack library is installed
+    """
+    return msgpack is not None
+
+def supported_encodings() -> list:
+    """Encodings the server is able to receive, announced to the clients when they connect.
+    JSON is always supported.
+
+    Returns:
+        list[str]: Supported encodings
+    """
+    return [ENCODING, "json"] if available() else ["json"]
+
+class TelemetryDecoder():
+    """Decodes telemetry posts for one client connection"""
+    def __init__(self) -> None:
+        self._strings = {}
+
+    def decode(self, message: bytes) -> dict:
+        """Decodes a telemetry post
+
+        Args:
+            message (bytes): Encoded and compressed telemetry post
+
+        Raises:
+            ValueError: If the message can not be decoded, has an unsupported format version,
+                decompresses to more than ``MAX_MESSAGE_BYTES``, refers to strings this
+                decoder has not received or adds more than ``MAX_DICTIONARY_SIZE`` strings
+
+        Returns:
+            dict: Telemetry post
+        """
+        decompressor = zlib.decompressobj()
+        try:
+            data = decompressor.decompress(message, MAX_MESSAGE_BYTES)
+            if decompressor.unconsumed_tail:
+                raise ValueError(f'Message exceeds {MAX_MESSAGE_BYTES} bytes')
+            message = msgpack.unpackb(data, strict_map_key=False)
+            if not isinstance(message, dict) or message.get("v") != FORMAT_VERSION:
+                raise ValueError('Unsupported wire format version')
+            telemetry_post = self._decode_object(message["d"])
+        except (zlib.error, msgpack.UnpackException, KeyError, TypeError) as error:
+            raise ValueError(f'Invalid telemetry message: {error!r}') from error
+        if not isinstance(telemetry_post, dict):
+            raise ValueError('Telemetry message is not an object')
+        return telemetry_post
+
+    def _decode_object(self, obj):
+        if isinstance(obj, dict):
+            decoded = {}
+            for key, value in obj.items():
+                key = FIELD_NAMES.get(key, key)
+                decoded[key] = self._decode_value(key, value)
+            return decoded
+        if isinstance(obj, list):
+            return [self._decode_object(item) for item in obj]
+        return obj
+
+    def _decode_value(self, key, value):
+        if key not in DICTIONARY_FIELDS:
+            return self._decode_object(value)
+
+        if isinstance(value, int):
+            return self._strings[value]
+
+        if isinstance(value, list):
+            string_id, string = value
+            if string_id is not None:
+                if string_id not in self._strings and len(self._strings) >= MAX_DICTIONARY_SIZE:
+                    raise ValueError(f'String dictionary exceeds {MAX_DICTIONARY_SIZE} strings')
+                self._strings[string_id] = string
+            return string
+
+        return value
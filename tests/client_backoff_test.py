@@ -0,0 +1,35 @@
+# pylint: skip-file
+
+from client.backoff import Backoff, push_phase, time_to_next_push
+
+def test_backoff_doubles_up_to_max_delay():
+    backoff = Backoff(1, 10, rand=lambda: 1)
+    assert [backoff.next_delay() for _ in range(6)] == [1, 2, 4, 8, 10, 10]
+
+def test_backoff_is_jittered_between_half_and_full_delay():
+    assert Backoff(4, 10, rand=lambda: 0).next_delay() == 2
+    assert Backoff(4, 10, rand=lambda: 0.5).next_delay() == 3
+
+def test_backoff_reset():
+    backoff = Backoff(1, 10, rand=lambda: 1)
+    backoff.next_delay()
+    backoff.next_delay()
+    backoff.reset()
+    assert backoff.next_delay() == 1
+
+def test_push_phase_is_deterministic_and_within_interval():
+    assert push_phase("242ac130002", 60) == push_phase("242ac130002", 60)
+    assert 0 <= push_phase("242ac130002", 60) < 60
+
+def test_push_phases_are_spread_over_interval():
+    phases = [push_phase(f"device-{number}", 60) for number in range(1000)]
+    slots = {int(phase // 10) for phase in phases}
+    assert slots == {0, 1, 2, 3, 4, 5}
+
+def test_time_to_next_push_lands_on_device_slot():
+    phase = push_phase("242ac130002", 60)
+    now = 1000000.0
+    next_push = now + time_to_next_push("242ac130002", 60, now)
+
+    assert 0 < next_push - now <= 60
+    assert abs((next_push - phase) % 60) < 1e-6 or abs((next_push - phase) % 60 - 60) < 1e-6
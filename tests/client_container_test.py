@@ -1,8 +1,9 @@
 # pylint: skip-file
 
+import copy
 import json
 import pytest
-from client.container import Container
+from client.container import Container, parse_image_reference
 
 with open('tests/client_container_attribute_sample.json', encoding='utf-8') as stream:
     CONTAINER_ATTRIBUTE_SAMPLE = json.load(stream)
@@ -62,3 +63,41 @@ def test_ports_are_extracted_correctly(mock_container):
 
 def test_retry_policy_is_extracted_correctly(mock_container):
     assert mock_container.restart_policy == {"Name": "always", "MaximumRetryCount": 0}
+
+@pytest.mark.parametrize("reference, expected", [
+    ("rikpet/easy-living:fm-server-latest", (None, "rikpet/easy-living", "fm-server-latest", None)),
+    ("nginx", (None, "nginx", "latest", None)),
+    ("docker.io/rikpet/easy-living:beta", (None, "rikpet/easy-living", "beta", None)),
+    ("registry:5000/rikpet/easy-living:beta", ("registry:5000", "rikpet/easy-living", "beta", None)),
+    ("registry:5000/rikpet/easy-living", ("registry:5000", "rikpet/easy-living", "latest", None)),
+    ("localhost/app:1.0", ("localhost", "app", "1.0", None)),
+    ("ghcr.io/owner/app@sha256:abc", ("ghcr.io", "owner/app", None, "sha256:abc")),
+    ("owner/app:1.0@sha256:abc", (None, "owner/app", "1.0", "sha256:abc")),
+])
+def test_image_reference_is_parsed(reference, expected):
+    assert tuple(parse_image_reference(reference)) == expected
+
+def test_image_repo_includes_other_registries():
+    attributes = json.loads(json.dumps(CONTAINER_ATTRIBUTE_SAMPLE))
+    attributes["Config"]["Image"] = "registry:5000/rikpet/easy-living:fm-server-latest"
+    container = Container(MockContainer(attributes))
+    assert container.image_repo == "registry:5000/rikpet/easy-living"
+    assert container.image_tag == "fm-server-latest"
+
+def test_snapshot_is_rebuilt_on_reload(mock_container):
+    snapshot = mock_container.snapshot
+    assert mock_container.snapshot is snapshot
+    mock_container.information()
+    assert mock_container.snapshot is not snapshot
+    assert not hasattr(snapshot, "__dict__")
+
+def test_null_mounts_environment_and_ports_are_empty():
+    attributes = copy.deepcopy(CONTAINER_ATTRIBUTE_SAMPLE)
+    attributes["Mounts"] = None
+    attributes["Config"]["Env"] = None
+    attributes["NetworkSettings"]["Ports"] = None
+    container = Container(MockContainer(attributes))
+
+    assert container.volumes == []
+    assert container.environment == []
+    assert container.ports == {}
@@ -0,0 +1,66 @@
+# pylint: skip-file
+
+import threading
+
+from client.disk_usage import DiskUsage, summarize_docker_usage
+
+DOCKER_USAGE = {
+    "LayersSize": 1000,
+    "Images": [
+        {"Size": 600, "SharedSize": 100, "Containers": 1},
+        {"Size": 300, "SharedSize": 100, "Containers": 0},
+        {"Size": 200, "SharedSize": -1, "Containers": 0}
+    ],
+    "Volumes": [
+        {"UsageData": {"Size": 50}},
+        {"UsageData": {"Size": -1}},
+        {"UsageData": None}
+    ]
+}
+
+class MockClient():
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def df(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("daemon unavailable")
+        return DOCKER_USAGE
+
+def test_summarize_docker_usage():
+    assert summarize_docker_usage(DOCKER_USAGE) == {
+        "images": 1000,
+        "images_reclaimable": 400,
+        "volumes": 50
+    }
+
+def test_summarize_empty_docker_usage():
+    assert summarize_docker_usage({}) == {"images": 0, "images_reclaimable": 0, "volumes": 0}
+
+def test_collect_includes_file_system_and_docker_usage():
+    summary = DiskUsage(MockClient(), path="/").collect()
+    assert 0 <= summary["disk_percent"] <= 100
+    assert summary["disk_free"] > 0
+    assert summary["images_reclaimable"] == 400
+
+def test_collect_without_docker_daemon():
+    summary = DiskUsage(MockClient(fail=True)).collect()
+    assert "disk_percent" in summary
+    assert "images" not in summary
+
+def test_summary_is_collected_in_background():
+    collected = threading.Event()
+    stop = threading.Event()
+    def sleep(_interval):
+        collected.set()
+        stop.wait()
+
+    client = MockClient()
+    disk_usage = DiskUsage(client, sleep=sleep)
+    disk_usage.summary()
+    assert collected.wait(5)
+    assert disk_usage.summary()["images"] == 1000
+    assert client.calls == 1
+    stop.set()
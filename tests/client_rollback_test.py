@@ -0,0 +1,230 @@
+# pylint: skip-file
+
+import docker
+import pytest
+
+from tests.conftest import import_client_module
+
+# The rollback module imports the container module by name, as the client is run from the
+# client folder
+rollback = import_client_module("rollback")
+ROLLBACK_REPOSITORY, RollbackStore, tag_target = \
+    rollback.ROLLBACK_REPOSITORY, rollback.RollbackStore, rollback.tag_target
+
+class MockImage():
+    def __init__(self, images, image_id, size):
+        self.images = images
+        self.id = image_id
+        self.attrs = {"Size": size}
+        self.tags = []
+
+    def tag(self, repository, tag=None):
+        reference = f'{repository}:{tag}'
+        for image in self.images.images.values():
+            if reference in image.tags:
+                image.tags.remove(reference)
+        self.tags.append(reference)
+        return True
+
+class MockImages():
+    def __init__(self):
+        self.images = {}
+
+    def add(self, image_id, size=100):
+        self.images[image_id] = MockImage(self, image_id, size)
+        return self.images[image_id]
+
+    def get(self, image_id):
+        return self.images[image_id]
+
+    def list(self, name=None):
+        return list(self.images.values())
+
+    def remove(self, reference):
+        for image in self.images.values():
+            if reference in image.tags:
+                image.tags.remove(reference)
+
+def settings(name="web"):
+    return {"name": name, "environment": ["A=1"], "ports": {}, "restart_policy": {},
+            "volumes": []}
+
+def test_tag_target():
+    assert tag_target("rikpet/easy-living:beta") == ("rikpet/easy-living", "beta")
+    assert tag_target("registry:5000/easy-living") == ("registry:5000/easy-living", "latest")
+    assert tag_target("registry:5000/easy-living:1.0") == ("registry:5000/easy-living", "1.0")
+    assert tag_target("docker.io/rikpet/easy-living:1.0") == ("rikpet/easy-living", "1.0")
+    assert tag_target("rikpet/easy-living@sha256:abc") is None
+    assert tag_target("rikpet/easy-living:1.0@sha256:abc") is None
+
+def test_record_tags_previous_image():
+    images = MockImages()
+    image = images.add("sha256:old")
+    store = RollbackStore(images)
+
+    store.record("web", "sha256:old", "rikpet/web:beta", settings())
+
+    entry = store.latest("web")
+    assert entry["image_id"] == "sha256:old"
+    assert entry["settings"] == settings()
+    assert image.tags == [entry["reference"]]
+    assert entry["reference"].startswith(f'{ROLLBACK_REPOSITORY}:web-')
+
+def test_depth_limits_entries_per_container():
+    images = MockImages()
+    for index in range(3):
+        images.add(f"sha256:{index}")
+    images.add("sha256:other")
+    store = RollbackStore(images, depth=2)
+
+    for index in range(3):
+        store.record("web", f"sha256:{index}", "rikpet/web:beta", settings())
+    store.record("db", "sha256:other", "rikpet/db:beta", settings("db"))
+
+    assert [entry["image_id"] for entry in store.entries("web")] == ["sha256:1", "sha256:2"]
+    assert images.get("sha256:0").tags == []
+    assert len(store.entries("db")) == 1
+
+def test_disk_budget_releases_oldest():
+    images = MockImages()
+    images.add("sha256:a", size=60)
+    images.add("sha256:b", size=60)
+    store = RollbackStore(images, depth=5, disk_budget=100)
+
+    store.record("web", "sha256:a", "rikpet/web:beta", settings())
+    store.record("db", "sha256:b", "rikpet/db:beta", settings("db"))
+
+    assert store.latest("web") is None
+    assert store.latest("db")["image_id"] == "sha256:b"
+    assert images.get("sha256:a").tags == []
+
+def test_depth_zero_disables_retention():
+    images = MockImages()
+    images.add("sha256:old")
+    store = RollbackStore(images, depth=0)
+
+    store.record("web", "sha256:old", "rikpet/web:beta", settings())
+    assert len(store) == 0
+
+def test_restore_and_discard():
+    images = MockImages()
+    old = images.add("sha256:old")
+    new = images.add("sha256:new")
+    new.tags.append("rikpet/web:beta")
+    store = RollbackStore(images)
+    store.record("web", "sha256:old", "rikpet/web:beta", settings())
+    entry = store.latest("web")
+
+    store.restore_image(entry)
+    store.discard(entry)
+
+    assert old.tags == ["rikpet/web:beta"]
+    assert new.tags == []
+    assert store.latest("web") is None
+
+def test_restore_skips_image_pinned_by_digest():
+    images = MockImages()
+    old = images.add("sha256:old")
+    store = RollbackStore(images)
+    store.record("web", "sha256:old", "rikpet/web@sha256:abc", settings())
+    tags = list(old.tags)
+
+    store.restore_image(store.latest("web"))
+
+    assert old.tags == tags
+
+def test_store_is_persisted(tmp_path):
+    path = str(tmp_path / "rollback.json")
+    images = MockImages()
+    image = images.add("sha256:old")
+    RollbackStore(images, path=path).record("web", "sha256:old", "rikpet/web:beta", settings())
+
+    store = RollbackStore(images, path=path)
+    assert store.latest("web")["image_id"] == "sha256:old"
+    assert len(image.tags) == 1
+
+def test_orphaned_tags_are_released():
+    images = MockImages()
+    image = images.add("sha256:old")
+    image.tags.append(f'{ROLLBACK_REPOSITORY}:web-1234')
+    image.tags.append("rikpet/web:beta")
+
+    RollbackStore(images)
+    assert image.tags == ["rikpet/web:beta"]
+
+class MockContainer():
+    def __init__(self, containers, name):
+        self.containers = containers
+        self.name = name
+
+    def stop(self):
+        self.containers.calls.append(("stop", self.name))
+
+    def remove(self):
+        self.containers.calls.append(("remove", self.name))
+        self.containers.existing.discard(self.name)
+
+class MockContainers():
+    def __init__(self, existing):
+        self.existing = set(existing)
+        self.calls = []
+
+    def get(self, name):
+        if name not in self.existing:
+            raise docker.errors.NotFound(f'No such container: {name}')
+        return MockContainer(self, name)
+
+    def run(self, image, **settings):
+        self.calls.append(("run", image, settings))
+        self.existing.add(settings["name"])
+
+class MockDockerClient():
+    def __init__(self, images, containers):
+        self.images = images
+        self.containers = containers
+
+def rollback_device(client_module, existing):
+    images = MockImages()
+    images.add("sha256:old")
+    device = client_module("device").Device("http://server", "device", "device-1")
+    device._client = MockDockerClient(images, MockContainers(existing))
+    device.rollback.record("web", "sha256:old", "rikpet/web:beta", settings())
+    return device, images
+
+def test_rollback_container_restarts_previous_image_with_retained_settings(client_module):
+    device, images = rollback_device(client_module, ["web"])
+    steps = []
+
+    device.rollback_container("web", steps.append)
+
+    assert steps == ["restoring", "stopping", "removing", "starting"]
+    assert device.client.containers.calls == [
+        ("stop", "web"), ("remove", "web"), ("run", "rikpet/web:beta", settings())
+    ]
+    assert "rikpet/web:beta" in images.get("sha256:old").tags
+    assert device.rollback.latest("web") is None
+
+def test_rollback_container_starts_removed_container(client_module):
+    # An update which failed to start the new container leaves no container behind
+    device, _ = rollback_device(client_module, [])
+
+    device.rollback_container("web")
+
+    assert device.client.containers.calls == [("run", "rikpet/web:beta", settings())]
+
+def test_rollback_without_retained_image_fails(client_module):
+    device, _ = rollback_device(client_module, ["web"])
+
+    with pytest.raises(ValueError):
+        device.rollback_container("db")
+    assert device.client.containers.calls == []
+
+def test_rollback_store_is_created_without_device_lock(client_module):
+    device = client_module("device").Device("http://server", "device", "device-1")
+    images = MockImages()
+    listed_with_lock = []
+    images.list = lambda name=None: listed_with_lock.append(device.lock.locked()) or []
+    device._client = MockDockerClient(images, MockContainers([]))
+
+    assert device.rollback is device.rollback
+    assert listed_with_lock == [False]
@@ -0,0 +1,103 @@
+# pylint: skip-file
+
+import threading
+
+from client.stats import (ContainerStats, StatsCollector, blkio_bytes, cpu_percent,
+                          memory_bytes, network_bytes)
+
+def stats_sample(total_usage=2000, system_usage=20000, memory=3000, rx=100, tx=50,
+                 read=10, written=20):
+    return {
+        "cpu_stats": {
+            "cpu_usage": {"total_usage": total_usage},
+            "system_cpu_usage": system_usage,
+            "online_cpus": 4
+        },
+        "precpu_stats": {
+            "cpu_usage": {"total_usage": 1000},
+            "system_cpu_usage": 10000
+        },
+        "memory_stats": {"usage": memory, "stats": {"cache": 1000}},
+        "networks": {
+            "eth0": {"rx_bytes": rx, "tx_bytes": tx},
+            "eth1": {"rx_bytes": rx, "tx_bytes": tx}
+        },
+        "blkio_stats": {
+            "io_service_bytes_recursive": [
+                {"major": 8, "minor": 0, "op": "Read", "value": read},
+                {"major": 8, "minor": 0, "op": "Write", "value": written},
+                {"major": 8, "minor": 0, "op": "Total", "value": read + written}
+            ]
+        }
+    }
+
+def test_cpu_percent():
+    assert cpu_percent(stats_sample()) == 40.0
+
+def test_cpu_percent_without_previous_reading():
+    sample = stats_sample()
+    sample["precpu_stats"] = {}
+    assert cpu_percent(sample) == 0.0
+
+def test_memory_excludes_page_cache():
+    assert memory_bytes(stats_sample()) == 2000
+    sample = stats_sample()
+    sample["memory_stats"]["stats"] = {"inactive_file": 500, "cache": 1000}
+    assert memory_bytes(sample) == 2500
+
+def test_network_bytes_are_summed_over_networks():
+    assert network_bytes(stats_sample()) == (200, 100)
+    assert network_bytes({"networks": None}) == (0, 0)
+
+def test_blkio_bytes_support_cgroup_v1_and_v2():
+    assert blkio_bytes(stats_sample()) == (10, 20)
+    sample = {"blkio_stats": {"io_service_bytes_recursive": [
+        {"op": "read", "value": 5}, {"op": "write", "value": 7}
+    ]}}
+    assert blkio_bytes(sample) == (5, 7)
+    assert blkio_bytes({"blkio_stats": {"io_service_bytes_recursive": None}}) == (0, 0)
+
+def test_summary_of_rolling_window():
+    stats = ContainerStats(window=10)
+    assert stats.summary() is None
+
+    stats.add(stats_sample(total_usage=1000, rx=0, read=0), timestamp=0)
+    stats.add(stats_sample(total_usage=2000, rx=500, read=100), timestamp=5)
+    stats.add(stats_sample(total_usage=3000, rx=1000, read=200, memory=5000), timestamp=10)
+
+    assert stats.summary() == {
+        "cpu": 40.0, "cpu_max": 80.0, "memory": 4000,
+        "net_rx": 200, "net_tx": 0, "blk_read": 20, "blk_write": 0
+    }
+
+def test_old_samples_leave_the_window():
+    stats = ContainerStats(window=10)
+    stats.add(stats_sample(total_usage=3000), timestamp=0)
+    stats.add(stats_sample(total_usage=2000), timestamp=20)
+    assert stats.summary()["cpu_max"] == 40.0
+
+class MockApi():
+    def __init__(self) -> None:
+        self.release = threading.Event()
+
+    def stats(self, container_id, stream, decode):
+        yield stats_sample()
+        self.release.wait(5)
+        yield stats_sample()
+
+class MockClient():
+    def __init__(self) -> None:
+        self.api = MockApi()
+
+def test_collector_streams_running_containers():
+    collector = StatsCollector(MockClient())
+    collector.sync(["container-1"])
+    for _ in range(100):
+        if collector.summary("container-1") is not None:
+            break
+        threading.Event().wait(0.01)
+    assert collector.summary("container-1")["cpu"] == 40.0
+
+    collector.sync([])
+    collector.client.api.release.set()
+    assert collector.summary("container-1") is None
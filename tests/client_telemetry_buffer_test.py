@@ -0,0 +1,96 @@
+# pylint: skip-file
+
+import json
+import zlib
+from client.telemetry_buffer import TelemetryBuffer
+
+def telemetry_post(cpu_load, status="running"):
+    return {
+        "id": "device-1",
+        "cpu_load": cpu_load,
+        "memory_usage": 10,
+        "containers": [
+            {"name": "fm-client", "status": "running"},
+            {"name": "deconz", "status": status}
+        ]
+    }
+
+def test_container_states_only_included_when_changed():
+    buffer = TelemetryBuffer(10)
+    buffer.record(telemetry_post(1), timestamp=1)
+    buffer.record(telemetry_post(2), timestamp=2)
+    buffer.record(telemetry_post(3, status="exited"), timestamp=3)
+
+    assert buffer.drain() == [
+        {"timestamp": 1, "cpu_load": 1, "memory_usage": 10,
+         "containers": {"fm-client": "running", "deconz": "running"}},
+        {"timestamp": 2, "cpu_load": 2, "memory_usage": 10},
+        {"timestamp": 3, "cpu_load": 3, "memory_usage": 10, "containers": {"deconz": "exited"}}
+    ]
+    assert len(buffer) == 0
+
+def test_oldest_entries_are_dropped_without_spill_file():
+    buffer = TelemetryBuffer(2)
+    for number in range(5):
+        buffer.record(telemetry_post(number), timestamp=number)
+
+    assert [entry["timestamp"] for entry in buffer.drain()] == [3, 4]
+    assert buffer.dropped == 3
+
+def test_oldest_entries_are_spilled_to_file(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = TelemetryBuffer(2, spill_path)
+    for number in range(5):
+        buffer.record(telemetry_post(number), timestamp=number)
+
+    assert len(buffer) == 5
+    assert [entry["timestamp"] for entry in buffer.drain()] == [0, 1, 2, 3, 4]
+    assert len(buffer) == 0
+
+def test_spill_file_is_bounded(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = TelemetryBuffer(1, spill_path, max_spill_bytes=1)
+    for number in range(3):
+        buffer.record(telemetry_post(number), timestamp=number)
+
+    assert [entry["timestamp"] for entry in buffer.drain()] == [0, 2]
+    assert buffer.dropped == 1
+
+def test_restored_entries_are_drained_first():
+    buffer = TelemetryBuffer(10)
+    buffer.record(telemetry_post(1), timestamp=1)
+    entries = buffer.drain()
+    buffer.record(telemetry_post(2), timestamp=2)
+    buffer.restore(entries)
+
+    assert [entry["timestamp"] for entry in buffer.drain()] == [1, 2]
+
+def test_encoded_batch_is_compressed_json():
+    buffer = TelemetryBuffer(10)
+    buffer.record(telemetry_post(1), timestamp=1)
+    entries = buffer.drain()
+
+    assert json.loads(zlib.decompress(TelemetryBuffer.encode("device-1", entries))) == \
+        {"id": "device-1", "entries": entries}
+
+def test_entries_spilled_by_previous_run_are_counted(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = TelemetryBuffer(1, spill_path)
+    for number in range(3):
+        buffer.record(telemetry_post(number), timestamp=number)
+
+    restarted = TelemetryBuffer(1, spill_path)
+    assert len(restarted) == 2
+    restarted.record(telemetry_post(3), timestamp=3)
+    restarted.record(telemetry_post(4), timestamp=4)
+    assert len(restarted) == 4
+    assert [entry["timestamp"] for entry in restarted.drain()] == [0, 1, 3, 4]
+
+def test_truncated_spill_line_is_skipped(tmp_path):
+    spill_path = tmp_path / "spill.jsonl"
+    spill_path.write_text('{"timestamp": 1, "cpu_load": 1}\n{"timestamp": 2, "cpu')
+    buffer = TelemetryBuffer(10, str(spill_path))
+
+    assert [entry["timestamp"] for entry in buffer.drain()] == [1]
+    assert buffer.dropped == 1
+    assert not spill_path.exists()
@@ -0,0 +1,51 @@
+# pylint: skip-file
+
+import json
+import threading
+
+from client.tracing import Tracer
+
+def test_spans_are_exported_with_tracer_attributes():
+    exported = []
+    tracer = Tracer("client", exported.append, attributes={"device_id": "device"})
+
+    with tracer.span("command", {"trace_id": "trace", "span_id": "server"}, command="update"):
+        with tracer.span("pulling"):
+            pass
+
+    pulling, command = exported
+    assert command["trace_id"] == pulling["trace_id"] == "trace"
+    assert command["parent_id"] == "server"
+    assert pulling["parent_id"] == command["span_id"]
+    assert command["attributes"] == {"device_id": "device", "command": "update"}
+
+def test_threads_have_separate_current_span():
+    tracer = Tracer()
+    spans = {}
+
+    def run(name):
+        with tracer.span(name) as span:
+            spans[name] = (span, tracer.current())
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+    with tracer.span("main"):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for span, current in spans.values():
+        assert span is current
+        assert span.parent_id is None
+
+def test_failed_span_records_error(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(path=str(path))
+    try:
+        with tracer.span("starting"):
+            raise RuntimeError("port in use")
+    except RuntimeError:
+        pass
+
+    span = json.loads(path.read_text())
+    assert span["error"] == "port in use"
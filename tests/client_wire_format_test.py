@@ -0,0 +1,73 @@
+# pylint: skip-file
+
+import json
+import zlib
+
+import msgpack
+import pytest
+from client.wire_format import TelemetryEncoder
+from server.wire_format import MAX_DICTIONARY_SIZE, MAX_MESSAGE_BYTES, TelemetryDecoder
+
+with open('tests/client_entry_sample.json', encoding='utf-8') as stream:
+    TELEMETRY_SAMPLE = json.load(stream)
+
+@pytest.fixture
+def encoder():
+    return TelemetryEncoder()
+
+@pytest.fixture
+def decoder():
+    return TelemetryDecoder()
+
+def test_telemetry_is_decoded_to_original(encoder, decoder):
+    assert decoder.decode(encoder.encode(TELEMETRY_SAMPLE)) == TELEMETRY_SAMPLE
+
+def test_repeated_posts_are_decoded_with_dictionary(encoder, decoder):
+    first = encoder.encode(TELEMETRY_SAMPLE)
+    second = encoder.encode(TELEMETRY_SAMPLE)
+
+    assert decoder.decode(first) == TELEMETRY_SAMPLE
+    assert decoder.decode(second) == TELEMETRY_SAMPLE
+
+def test_repeated_posts_are_smaller_than_json(encoder):
+    encoder.encode(TELEMETRY_SAMPLE)
+    assert len(encoder.encode(TELEMETRY_SAMPLE)) < len(json.dumps(TELEMETRY_SAMPLE)) / 4
+
+def test_unknown_fields_are_kept(encoder, decoder):
+    post = {"id": "abc", "new_field": {"name": "value"}}
+    assert decoder.decode(encoder.encode(post)) == post
+
+def test_reset_encoder_is_decoded_by_new_decoder(encoder):
+    encoder.encode(TELEMETRY_SAMPLE)
+    encoder.reset()
+    assert TelemetryDecoder().decode(encoder.encode(TELEMETRY_SAMPLE)) == TELEMETRY_SAMPLE
+
+def test_post_referring_to_unknown_strings_is_rejected(encoder):
+    encoder.encode(TELEMETRY_SAMPLE)
+    with pytest.raises(ValueError):
+        TelemetryDecoder().decode(encoder.encode(TELEMETRY_SAMPLE))
+
+def test_strings_beyond_dictionary_size_are_decoded(decoder):
+    encoder = TelemetryEncoder()
+    devices = [{"name": f'device-{index}'} for index in range(MAX_DICTIONARY_SIZE + 1)]
+    for device in devices:
+        assert decoder.decode(encoder.encode(device)) == device
+
+def test_post_exceeding_dictionary_size_is_rejected(decoder):
+    strings = [[string_id, f'device-{string_id}'] for string_id in range(MAX_DICTIONARY_SIZE + 1)]
+    message = {"v": 1, "d": {0: strings[0][1], 4: [{0: string} for string in strings]}}
+    with pytest.raises(ValueError):
+        decoder.decode(zlib.compress(msgpack.packb(message)))
+
+@pytest.mark.parametrize("message", [
+    b"not compressed",
+    zlib.compress(b"\xc1"),
+    zlib.compress(msgpack.packb([1, 2])),
+    zlib.compress(msgpack.packb({"v": 99, "d": {}})),
+    zlib.compress(msgpack.packb({"v": 1})),
+    zlib.compress(msgpack.packb({"v": 1, "d": [1]})),
+    zlib.compress(b"\x00" * (MAX_MESSAGE_BYTES + 1))
+])
+def test_invalid_messages_are_rejected(decoder, message):
+    with pytest.raises(ValueError):
+        decoder.decode(message)
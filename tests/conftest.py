@@ -0,0 +1,32 @@
+# pylint: skip-file
+
+# The server modules import each other by module name, as they are run from the server folder
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+CLIENT_PATH = os.path.join(ROOT, "client")
+
+sys.path.append(os.path.join(ROOT, "server"))
+
+def import_client_module(name):
+    # The client modules also import each other by module name. Some names are shared with
+    # the server, so the client folder is put first while importing and the client modules
+    # are taken out of the module cache afterwards, the imported module keeps its references
+    names = {os.path.splitext(file)[0] for file in os.listdir(CLIENT_PATH) if file.endswith(".py")}
+    saved = {name: sys.modules.pop(name) for name in names if name in sys.modules}
+    sys.path.insert(0, CLIENT_PATH)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(CLIENT_PATH)
+        for client_name in names:
+            sys.modules.pop(client_name, None)
+        sys.modules.update(saved)
+
+@pytest.fixture
+def client_module():
+    return import_client_module
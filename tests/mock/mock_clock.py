@@ -0,0 +1,14 @@
+"""Mock clock for the components taking a clock function"""
+
+class MockClock():
+    """Clock which only moves when ``now`` is set
+
+    Args:
+        now (object, optional): Initial time, a number for monotonic clocks or a datetime for
+            wall clocks. Defaults to 0.
+    """
+    def __init__(self, now: object = 0) -> None:
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,101 @@
+"""Local stand-in for a container registry posting push notifications to the server.
+
+Usage:
+    python -m tests.mock.mock_registry_webhook <server-url> <token> <repository> <tag> [format]
+
+Format is either ``docker_hub`` (default) or ``registry``.
+"""
+import sys
+import requests
+
+def docker_hub_payload(repository: str, tag: str) -> dict:
+    """Push notification as sent by Docker hub webhooks
+
+    Args:
+        repository (str): Repository name, including namespace
+        tag (str): Pushed tag
+
+    Returns:
+        dict: Notification body
+    """
+    namespace, name = repository.split("/", 1)
+    return {
+        "callback_url": f"https://registry.hub.docker.com/u/{repository}/hook/mock/",
+        "push_data": {
+            "pushed_at": 1417566161,
+            "pusher": namespace,
+            "tag": tag
+        },
+        "repository": {
+            "name": name,
+            "namespace": namespace,
+            "owner": namespace,
+            "repo_name": repository,
+            "repo_url": f"https://registry.hub.docker.com/u/{repository}/",
+            "status": "Active"
+        }
+    }
+
+def registry_payload(repository: str, tag: str) -> dict:
+    """Push notification as sent by the Docker distribution registry. A layer push without a
+    tag is included, as the registry sends these as well.
+
+    Args:
+        repository (str): Repository name, including namespace
+        tag (str): Pushed tag
+
+    Returns:
+        dict: Notification body
+    """
+    return {
+        "events": [
+            {
+                "id": "320678d8-ca14-430f-8bb6-4ca139cd83f7",
+                "timestamp": "2016-03-09T14:44:26.402973972-08:00",
+                "action": "push",
+                "target": {
+                    "mediaType": "application/octet-stream",
+                    "digest":
+                        "sha256:b3e2b5d6e0c9f2a7c2bb5b3d1fa06b2b0bb6c5c1a9c1ed2e7a8a4b1d0a6c8e7f",
+                    "repository": repository
+                }
+            },
+            {
+                "id": "6d0fd8f9-0e2d-4c5d-9a2e-0ae1b5c3f1b4",
+                "timestamp": "2016-03-09T14:44:26.502973972-08:00",
+                "action": "push",
+                "target": {
+                    "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+                    "digest":
+                        "sha256:fea8895f450959fa676bcc1df0611ea93823a735a01205fd8622846041d0c7cf",
+                    "repository": repository,
+                    "tag": tag
+                },
+                "request": {
+                    "host": "localhost:5000",
+                    "method": "PUT"
+                }
+            }
+        ]
+    }
+
+PAYLOADS = {
+    "docker_hub": docker_hub_payload,
+    "registry": registry_payload
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (5, 6):
+        print(__doc__)
+        sys.exit(1)
+
+    server_url, token, push_repository, push_tag = sys.argv[1:5]
+    payload_format = sys.argv[5] if len(sys.argv) == 6 else "docker_hub"
+
+    response = requests.post(
+        f'{server_url}/registry-webhook',
+        params={"token": token},
+        json=PAYLOADS[payload_format](push_repository, push_tag),
+        timeout=10
+    )
+    print(response.status_code, response.text)
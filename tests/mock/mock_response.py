@@ -3,9 +3,10 @@ from http import HTTPStatus
 
 class MockResponse():
     """Mocking Respons object from python standard library :module:`requests`"""
-    def __init__(self, response: dict, status_code: HTTPStatus) -> None:
+    def __init__(self, response: dict, status_code: HTTPStatus, headers: dict = None) -> None:
         self._response = response
         self._status_code = status_code
+        self.headers = {} if headers is None else headers
 
     @property
     def status_code(self) -> HTTPStatus:
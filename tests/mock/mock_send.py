@@ -0,0 +1,12 @@
+"""Mock send function for the components emitting messages to the devices"""
+
+class MockSend():
+    """Records the sent messages. Messages with one argument are recorded as is, messages
+    with several arguments as a tuple, for example ``(device_id, command)``. Dicts are copied
+    so later changes by the sender do not show up in the record"""
+    def __init__(self) -> None:
+        self.sent = []
+
+    def __call__(self, *args):
+        args = tuple(dict(arg) if isinstance(arg, dict) else arg for arg in args)
+        self.sent.append(args[0] if len(args) == 1 else args)
@@ -0,0 +1,56 @@
+# pylint: skip-file
+
+from server.archive import DeviceArchive
+
+def device(device_id):
+    return {"id": device_id, "name": f"Device {device_id}", "labels": {"site": "lab"},
+            "containers": []}
+
+def test_archived_devices_can_be_retrieved_and_popped():
+    archive = DeviceArchive()
+    archive.add([(device("device-1"), "2021/01/01 12:00:00")])
+
+    assert "device-1" in archive
+    assert archive.get("device-1")["last_seen"] == "2021/01/01 12:00:00"
+    assert archive.devices() == [{"id": "device-1", "name": "Device device-1",
+                                  "labels": {"site": "lab"}, "last_seen": "2021/01/01 12:00:00"}]
+    assert archive.pop("device-1") == device("device-1")
+    assert "device-1" not in archive
+    assert archive.pop("device-1") is None
+
+def test_archive_is_bounded():
+    archive = DeviceArchive(max_devices=2)
+    archive.add([(device(f"device-{number}"), "2021/01/01 12:00:00") for number in range(3)])
+
+    assert len(archive) == 2
+    assert "device-0" not in archive
+    assert archive.dropped == 1
+
+def test_archive_is_persisted(tmp_path):
+    path = str(tmp_path / "archive.jsonl")
+    archive = DeviceArchive(path=path)
+    archive.add([(device("device-1"), "2021/01/01 12:00:00"),
+                 (device("device-2"), "2021/01/02 12:00:00")])
+    archive.pop("device-1")
+    assert not (tmp_path / "archive.jsonl").exists()
+
+    assert archive.save()
+    assert not archive.save()
+
+    restored = DeviceArchive(path=path)
+    assert len(restored) == 1
+    assert restored.get("device-2")["last_seen"] == "2021/01/02 12:00:00"
+
+def test_archive_is_saved_compressed(tmp_path):
+    path = tmp_path / "archive.jsonl"
+    archive = DeviceArchive(path=str(path))
+    archive.add([(device("device-1"), "2021/01/01 12:00:00")])
+    archive.save()
+
+    assert "Device device-1" not in path.read_text()
+
+def test_unreadable_archive_is_ignored(tmp_path):
+    path = tmp_path / "archive.jsonl"
+    path.write_text('{"last_seen": "2021/01/01 12:00:00", "device": "not compressed"}\n')
+
+    assert len(DeviceArchive(path=str(path))) == 0
@@ -0,0 +1,116 @@
+# pylint: skip-file
+
+import pytest
+from server.commands import CommandTracker, LatencyHistogram
+from tests.mock.mock_clock import MockClock
+from tests.mock.mock_send import MockSend
+
+@pytest.fixture
+def clock():
+    return MockClock()
+
+@pytest.fixture
+def send():
+    return MockSend()
+
+@pytest.fixture
+def tracker(send, clock):
+    return CommandTracker(send, ack_timeout=10, command_timeout=100, max_retries=1, clock=clock)
+
+def update_command(container_name="fm-server"):
+    return {"command": "update_container", "id": "device-1", "container_name": container_name}
+
+def test_command_is_sent_with_id(tracker, send):
+    command_id = tracker.submit("device-1", update_command())
+    assert send.sent == [("device-1", {**update_command(), "command_id": command_id})]
+    assert tracker.get(command_id)["state"] == "sent"
+
+def test_command_lifecycle_records_latency(tracker, clock):
+    command_id = tracker.submit("device-1", update_command())
+    tracker.update({"command_id": command_id, "state": "acknowledged"})
+    tracker.update({"command_id": command_id, "state": "running", "detail": "pulling"})
+    assert tracker.get(command_id)["detail"] == "pulling"
+    assert len(tracker.commands(device_id="device-1", container_name="fm-server", in_flight=True)) == 1
+
+    clock.now = 4
+    tracker.update({"command_id": command_id, "state": "succeeded"})
+
+    assert tracker.get(command_id)["state"] == "succeeded"
+    assert tracker.get(command_id)["latency"] == 4
+    assert tracker.commands(in_flight=True) == []
+    assert tracker.latency()["update_container"]["count"] == 1
+    assert tracker.latency()["update_container"]["buckets"]["5"] == 1
+    assert tracker.latency()["update_container"]["buckets"]["2"] == 0
+
+def test_succeeded_command_keeps_result(tracker):
+    command_id = tracker.submit("device-1", {"command": "profile", "id": "device-1"})
+    assert tracker.get(command_id)["result"] is None
+
+    tracker.update({"command_id": command_id, "state": "succeeded", "result": "main;run 3\n"})
+    assert tracker.get(command_id)["result"] == "main;run 3\n"
+
+def test_unacknowledged_command_is_resent_then_timed_out(tracker, send, clock):
+    command_id = tracker.submit("device-1", update_command())
+
+    clock.now = 11
+    tracker.check_timeouts()
+    assert len(send.sent) == 2
+    assert tracker.get(command_id)["attempts"] == 2
+
+    clock.now = 22
+    tracker.check_timeouts()
+    assert len(send.sent) == 2
+    assert tracker.get(command_id)["state"] == "timed_out"
+
+def test_running_command_times_out(tracker, clock):
+    command_id = tracker.submit("device-1", update_command())
+    tracker.update({"command_id": command_id, "state": "acknowledged"})
+
+    clock.now = 50
+    tracker.check_timeouts()
+    assert tracker.get(command_id)["state"] == "acknowledged"
+
+    clock.now = 101
+    tracker.check_timeouts()
+    assert tracker.get(command_id)["state"] == "timed_out"
+
+    # A late result is still recorded
+    tracker.update({"command_id": command_id, "state": "succeeded"})
+    assert tracker.get(command_id)["state"] == "succeeded"
+
+def test_finished_command_is_not_changed(tracker):
+    command_id = tracker.submit("device-1", update_command())
+    tracker.update({"command_id": command_id, "state": "failed", "detail": "No such container"})
+    tracker.update({"command_id": command_id, "state": "running"})
+    assert tracker.get(command_id)["state"] == "failed"
+    assert tracker.get(command_id)["detail"] == "No such container"
+
+def test_commands_filtered_on_container(tracker):
+    tracker.submit("device-1", update_command("fm-server"))
+    tracker.submit("device-1", update_command("fm-client"))
+    assert [record["container_name"] for record in tracker.commands(container_name="fm-client")] == ["fm-client"]
+    assert len(tracker.commands(device_id="device-1")) == 2
+
+def test_latency_histogram_overflow_bucket():
+    histogram = LatencyHistogram(buckets=(1, 2))
+    histogram.observe(0.5)
+    histogram.observe(3)
+    assert histogram.summary() == {"buckets": {"1": 1, "2": 1, "+Inf": 2}, "count": 2, "sum": 3.5}
+
+def test_batch_is_sent_as_one_message_and_tracked_per_command(tracker, send, clock):
+    command_ids = tracker.submit_batch("device-1", [update_command("fm-server"), update_command("fm-client")])
+
+    assert len(send.sent) == 1
+    device_id, message = send.sent[0]
+    assert device_id == "device-1"
+    assert message["command"] == "batch"
+    assert [cmd["command_id"] for cmd in message["commands"]] == command_ids
+
+    tracker.update({"command_id": command_ids[0], "state": "acknowledged"})
+    clock.now = 11
+    tracker.check_timeouts()
+
+    # Only the unacknowledged command is resent, as a single command
+    assert len(send.sent) == 2
+    assert send.sent[1][1]["command_id"] == command_ids[1]
+    assert send.sent[1][1]["command"] == "update_container"
@@ -144,3 +144,100 @@ def test_image_sha_gets_new_sha_after_chache_timeout():
     image_sha_2 = docker_hub_object.get_remote_image_sha("fake_repo", "fake_tag")
     assert image_sha_1 == "ABCDE"
     assert image_sha_2 == "BCDEF"
+
+def paginated_image_list(mock_http_get, pages, use_link_header=True):
+    def response():
+        url = mock_http_get.received_url
+        page = int(url.split("last=page")[1][0]) + 1 if "last=" in url else 0
+        headers = {}
+        if use_link_header and page < len(pages) - 1:
+            headers["Link"] = f'</v2/fake_repo/tags/list?last=page{page}&n=2>; rel="next"'
+        return MockResponse(
+            response={"tags": pages[page] if page < len(pages) else []},
+            status_code=HTTPStatus.ACCEPTED,
+            headers=headers
+        )
+    return response
+
+def test_image_list_follows_link_header():
+    mock_http_get = MockHttpGet()
+    pages = [["page0-a", "page0-b"], ["page1-a", "page1-b"], ["page2-a"]]
+    mock_http_get.response = paginated_image_list(mock_http_get, pages)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+
+    image_list = docker_hub_object.list_images(page_size=2)
+    assert image_list == ["page0-a", "page0-b", "page1-a", "page1-b", "page2-a"]
+    assert mock_http_get.received_url == \
+        "https://index.docker.io/v2/fake_repo/tags/list?last=page1&n=2"
+
+def test_image_list_continues_full_pages_without_link_header():
+    mock_http_get = MockHttpGet()
+    pages = [["page0-a", "page0"], ["page1-a", "page1-b"]]
+    mock_http_get.response = paginated_image_list(mock_http_get, pages, use_link_header=False)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+
+    image_list = docker_hub_object.list_images(page_size=2)
+    assert image_list == ["page0", "page0-a", "page1-a", "page1-b"]
+
+def test_image_list_removes_deleted_tags():
+    mock_http_get = MockHttpGet(response=image_list_response)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "")
+    docker_hub_object.catalogue.add(["deleted-image"])
+
+    assert docker_hub_object.list_images() == ["mock-image-1", "mock-image-2", "mock-image-3"]
+
+def test_construction_makes_no_requests():
+    mock_http_get = MockHttpGet(response=manifest_response)
+    DockerHub(mock_http_get, "", "", "fake_repo")
+
+    assert mock_http_get.received_url is None
+
+def test_cached_image_sha_queues_missing_tags():
+    mock_http_get = MockHttpGet(response=manifest_response)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+
+    assert docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag") is None
+    assert mock_http_get.received_url is None
+
+    assert docker_hub_object.prefetch()
+    assert docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag") == "ABCDE"
+    assert not docker_hub_object.prefetch()
+
+def test_cached_image_sha_returns_expired_entry_until_refreshed():
+    mock_http_get = MockHttpGet(response=manifest_response)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+    docker_hub_object.get_remote_image_sha("fake_repo", "fake_tag")
+
+    mock_http_get.response = manifest_response_2
+    docker_hub_object.cache_time = 0
+    assert docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag") == "ABCDE"
+
+    assert docker_hub_object.prefetch()
+    docker_hub_object.cache_time = 60
+    assert docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag") == "BCDEF"
+
+def test_prefetch_survives_docker_hub_errors():
+    mock_http_get = MockHttpGet(respond_unauthorized=True, response=manifest_response)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+
+    docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag")
+    assert not docker_hub_object.prefetch()
+    assert docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag") is None
+
+def test_run_prefetch_calls_on_change():
+    mock_http_get = MockHttpGet(response=manifest_response)
+    docker_hub_object = DockerHub(mock_http_get, "", "", "fake_repo")
+    docker_hub_object.cached_remote_image_sha("fake_repo", "fake_tag")
+
+    changes = []
+    sleeps = []
+    def sleep(interval):
+        sleeps.append(interval)
+        if len(sleeps) > 2:
+            raise StopIteration
+
+    try:
+        docker_hub_object.run_prefetch(1, sleep, lambda: changes.append(True))
+    except StopIteration:
+        pass
+    assert changes == [True]
@@ -0,0 +1,92 @@
+# pylint: skip-file
+
+import json
+import pytest
+from server.fleet_query import FleetQuery
+
+with open('tests/client_entry_sample.json', encoding='utf-8') as stream:
+    DEVICE_SAMPLE = json.load(stream)
+
+def fleet_information():
+    fleet = {}
+    for number in range(5):
+        device = json.loads(json.dumps(DEVICE_SAMPLE))
+        device["id"] = f"device-{number}"
+        device["name"] = f"Device {number}"
+        device["online"] = number % 2 == 0
+        for container in device["containers"]:
+            container["image_repo"] = container["image_name"].split(":")[0]
+            container["update_available"] = container["name"] == "fm-client" and number == 3
+        fleet[device["id"]] = device
+    return fleet
+
+def test_no_parameters_returns_entire_fleet():
+    devices, next_cursor = FleetQuery({}).apply(fleet_information())
+    assert devices == fleet_information()
+    assert next_cursor is None
+
+def test_filter_on_device_id_and_online():
+    devices, _ = FleetQuery({"device_id": "device-1,device-2,device-4", "online": "true"}) \
+        .apply(fleet_information())
+    assert list(devices) == ["device-2", "device-4"]
+
+def test_filter_on_update_available_only_returns_matching_containers():
+    devices, _ = FleetQuery({"update_available": "true"}).apply(fleet_information())
+    assert list(devices) == ["device-3"]
+    assert [container["name"] for container in devices["device-3"]["containers"]] == ["fm-client"]
+
+def test_filter_on_image_repo():
+    devices, _ = FleetQuery({"image_repo": "marthoc/deconz"}).apply(fleet_information())
+    assert len(devices) == 5
+    assert all(len(device["containers"]) == 1 for device in devices.values())
+
+def test_field_projection():
+    devices, _ = FleetQuery({"fields": "name,online,containers.name"}).apply(fleet_information())
+    assert devices["device-0"] == {
+        "name": "Device 0",
+        "online": True,
+        "containers": [
+            {"name": "fm-client"},
+            {"name": "fm-server"},
+            {"name": "log-server"},
+            {"name": "deconz"}
+        ]
+    }
+
+def test_cursor_pagination_walks_entire_fleet():
+    seen = []
+    args = {"limit": "2"}
+    while True:
+        devices, next_cursor = FleetQuery(args).apply(fleet_information())
+        seen.extend(devices)
+        if next_cursor is None:
+            break
+        args = {"limit": "2", "cursor": next_cursor}
+    assert seen == [f"device-{number}" for number in range(5)]
+
+@pytest.mark.parametrize("args", [{"online": "maybe"}, {"limit": "0"}, {"limit": "abc"}])
+def test_invalid_parameters_raise_value_error(args):
+    with pytest.raises(ValueError):
+        FleetQuery(args)
+
+def test_select_returns_page_of_device_ids():
+    query = FleetQuery({"online": "true", "limit": "1"})
+    assert query.returns_full_devices
+    device_ids, next_cursor = query.select(fleet_information())
+    assert len(device_ids) == 1
+    assert next_cursor == device_ids[0]
+
+def test_projection_does_not_return_full_devices():
+    assert not FleetQuery({"fields": "name"}).returns_full_devices
+    assert not FleetQuery({"image_tag": "beta"}).returns_full_devices
+
+def test_filter_on_label_selector():
+    fleet = fleet_information()
+    for device in fleet.values():
+        device["labels"] = {"site": "lab" if device["id"] in ("device-1", "device-2") else "office"}
+    devices, _ = FleetQuery({"selector": "site=lab"}).apply(fleet)
+    assert list(devices) == ["device-1", "device-2"]
+
+def test_invalid_selector_raises():
+    with pytest.raises(ValueError):
+        FleetQuery({"selector": "=lab"})
@@ -0,0 +1,191 @@
+# pylint: skip-file
+
+from datetime import datetime
+import json
+import threading
+
+from server.fleet import Fleet
+from server.labels import parse_selector
+
+class MockDockerHub():
+    def __init__(self) -> None:
+        self.version = 0
+        self.remote_image_sha = "ABCDE"
+
+    def cached_remote_image_sha(self, image_repo, image_tag):
+        return self.remote_image_sha
+
+    def push(self, image_sha):
+        self.remote_image_sha = image_sha
+        self.version += 1
+
+def telemetry_post(device_id, image_sha="ABCDE"):
+    return {
+        "id": device_id,
+        "name": device_id,
+        "push_interval": 60,
+        "containers": [
+            {
+                "name": "app", "status": "running", "image_repo": "repo", "image_tag": "tag",
+                "image_sha": image_sha
+            }
+        ]
+    }
+
+def create_fleet():
+    return Fleet(MockDockerHub(), [], lambda event: None)
+
+def test_fleet_information_is_derived():
+    fleet = create_fleet()
+    post = telemetry_post("device-1", image_sha="OLD")
+    fleet.add_telemetry(post)
+
+    information = fleet.get_fleet_information()
+    assert information["device-1"]["online"] is True
+    assert information["device-1"]["containers"][0]["update_available"] is True
+    assert "online" not in post
+    assert "update_available" not in post["containers"][0]
+
+def test_published_snapshot_is_not_changed_by_writers():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    information = fleet.get_fleet_information()
+
+    fleet.add_telemetry(telemetry_post("device-2"))
+    fleet.remove_device("device-1")
+
+    assert list(information) == ["device-1"]
+    assert list(fleet.get_fleet_information()) == ["device-2"]
+
+def test_update_state_follows_remote_image():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    assert fleet.get_fleet_information()["device-1"]["containers"][0]["update_available"] is False
+
+    fleet.docker_hub.push("BCDEF")
+    assert fleet.get_fleet_information()["device-1"]["containers"][0]["update_available"] is True
+
+def test_fleet_json_is_assembled_from_cached_fragments():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    fleet.add_telemetry(telemetry_post("device-2"))
+    assert json.loads(fleet.fleet_json()) == fleet.get_fleet_information()
+    assert list(json.loads(fleet.fleet_json(["device-2", "unknown"]))) == ["device-2"]
+
+    fragment = fleet._fragments["device-1"][4]
+    fleet.add_telemetry(telemetry_post("device-2"))
+    fleet.fleet_json()
+    assert fleet._fragments["device-1"][4] is fragment
+
+    fleet.docker_hub.push("BCDEF")
+    fleet.fleet_json()
+    assert fleet._fragments["device-1"][4] is not fragment
+    assert json.loads(fleet.fleet_json())["device-1"]["containers"][0]["update_available"]
+
+def test_reader_with_old_snapshot_does_not_cache_removed_device():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    device = fleet._fleet["device-1"]
+    fleet.remove_device("device-1")
+
+    # A reader which took the snapshot before the removal still encodes the device
+    assert fleet._device_entry(device, datetime.now())[0] is device
+    assert "device-1" not in fleet._fragments
+
+def test_readers_iterate_while_writers_publish():
+    fleet = create_fleet()
+    errors = []
+
+    def write():
+        for index in range(2000):
+            fleet.add_telemetry(telemetry_post(f"device-{index % 50}"))
+            if index % 7 == 0 and fleet.size() > 1:
+                fleet.remove_device(f"device-{index % 50}")
+
+    def read():
+        try:
+            for _ in range(200):
+                for device in fleet.get_fleet_information().values():
+                    assert "online" in device
+        except RuntimeError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def test_devices_are_selected_by_labels():
+    fleet = create_fleet()
+    fleet.add_telemetry({**telemetry_post("device-1"), "labels": {"site": "lab"}})
+    fleet.add_telemetry({**telemetry_post("device-2"), "labels": {"site": "office"}})
+    fleet.add_telemetry(telemetry_post("device-3"))
+    assert fleet.select(parse_selector("site=lab")) == {"device-1"}
+    assert set(fleet.get_fleet_information(fleet.select(parse_selector("site")))) == \
+        {"device-1", "device-2"}
+
+    fleet.add_telemetry({**telemetry_post("device-1"), "labels": {"site": "office"}})
+    fleet.remove_device("device-2")
+    assert fleet.select(parse_selector("site=office")) == {"device-1"}
+
+def test_stale_devices_are_archived_and_revived():
+    fleet = create_fleet()
+    fleet.add_telemetry({**telemetry_post("device-1"), "labels": {"site": "lab"}})
+    fleet.add_telemetry(telemetry_post("device-2"))
+    fleet._last_seen["device-1"] = datetime(2021, 1, 1, 12)
+
+    assert fleet.evict_stale(3600) == ["device-1"]
+    assert list(fleet.get_fleet_information()) == ["device-2"]
+    assert fleet.select(parse_selector("site=lab")) == set()
+    assert fleet.archive.get("device-1")["last_seen"] == "2021/01/01 12:00:00"
+
+    fleet.add_telemetry({**telemetry_post("device-1"), "labels": {"site": "lab"}})
+    assert "device-1" not in fleet.archive
+    assert fleet.select(parse_selector("site=lab")) == {"device-1"}
+    assert fleet.evict_stale(3600) == []
+
+def test_removing_archived_device():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    fleet._last_seen["device-1"] = datetime(2021, 1, 1, 12)
+    fleet.evict_stale(3600)
+
+    fleet.remove_device("device-1")
+    assert len(fleet.archive) == 0
+
+def test_forget_listeners_are_called_for_removed_and_archived_devices():
+    fleet = create_fleet()
+    forgotten = []
+    fleet.forget_listeners.append(forgotten.append)
+    fleet.add_telemetry(telemetry_post("device-1"))
+    fleet.add_telemetry(telemetry_post("device-2"))
+    fleet._last_seen["device-1"] = datetime(2021, 1, 1, 12)
+
+    assert "device-2" in fleet
+    fleet.evict_stale(3600)
+    fleet.remove_device("device-2")
+    assert forgotten == ["device-1", "device-2"]
+    assert "device-1" not in fleet and "device-2" not in fleet
+
+def test_history_is_only_added_for_devices_in_the_fleet():
+    fleet = create_fleet()
+    fleet.add_telemetry(telemetry_post("device-1"))
+    entry = {"timestamp": 1, "cpu_load": 5, "memory_usage": 10}
+
+    assert fleet.add_history("device-1", [entry])
+    assert not fleet.add_history("unknown", [entry])
+    assert fleet.history("device-1")[0] == entry
+    assert fleet.history("unknown") is None
+
+def test_only_changed_devices_are_published():
+    published = []
+    fleet = Fleet(MockDockerHub(), ["dashboard"], published.append)
+    fleet.add_telemetry_batch([telemetry_post("device-1"), telemetry_post("device-2")])
+    fleet.add_telemetry(telemetry_post("device-2"))
+    fleet.publish()
+
+    assert [list(json.loads(event)) for event in published] == [
+        ["device-1", "device-2"], ["device-2"], ["device-1", "device-2"]
+    ]
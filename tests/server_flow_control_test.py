@@ -0,0 +1,63 @@
+# pylint: skip-file
+
+from server.flow_control import FlowController
+from tests.mock.mock_clock import MockClock
+
+class MockLoad():
+    def __init__(self) -> None:
+        self.load = 0
+
+    def __call__(self):
+        return self.load
+
+def flow_controller():
+    clock = MockClock()
+    load = MockLoad()
+    return FlowController(60, 10, 600, load, clock=clock), clock, load
+
+def test_settings_default_to_configured_interval():
+    controller, _, _ = flow_controller()
+    assert controller.settings("device-1") == {"push_interval": 60, "heartbeat_interval": 60}
+
+    controller.register("device-1", 30)
+    assert controller.settings("device-1") == {"push_interval": 30, "heartbeat_interval": 30}
+
+def test_high_load_throttles_push_interval_but_not_heartbeat():
+    controller, _, load = flow_controller()
+    load.load = 0.9
+    for _ in range(10):
+        controller.adjust()
+
+    assert controller.settings("device-1") == {"push_interval": 600, "heartbeat_interval": 60}
+
+    load.load = 0
+    for _ in range(10):
+        controller.adjust()
+    assert controller.settings("device-1") == {"push_interval": 60, "heartbeat_interval": 60}
+
+def test_boost_expires():
+    controller, clock, _ = flow_controller()
+    assert controller.boost(["device-1"], 30) == ["device-1"]
+    assert controller.settings("device-1")["push_interval"] == 10
+
+    clock.now = 31
+    assert controller.settings("device-1")["push_interval"] == 60
+
+def test_changed_settings_only_returned_once():
+    controller, _, _ = flow_controller()
+    assert controller.changed_settings("device-1") is not None
+    assert controller.changed_settings("device-1") is None
+
+    controller.forget("device-1")
+    assert controller.changed_settings("device-1") is not None
+
+def test_removed_device_is_dropped():
+    controller, _, _ = flow_controller()
+    controller.register("device-1", 30)
+    controller.boost(["device-1"], 30)
+
+    controller.remove_device("device-1")
+    assert controller._configured == {}
+    assert controller._boosted == {}
+    assert controller._sent == {}
+    assert controller.settings("device-1")["push_interval"] == 60
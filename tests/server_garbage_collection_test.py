@@ -0,0 +1,105 @@
+# pylint: skip-file
+
+from datetime import datetime, time, timedelta
+
+import pytest
+from server.commands import CommandTracker
+from server.garbage_collection import GarbageCollectionScheduler, in_window, parse_window
+from tests.mock.mock_clock import MockClock
+from tests.mock.mock_send import MockSend
+
+class MockFleet():
+    def __init__(self) -> None:
+        self.devices = {}
+
+    def add(self, device_id, disk_percent, online=True):
+        self.devices[device_id] = {
+            "id": device_id, "online": online, "disk": {"disk_percent": disk_percent}
+        }
+
+    def get_fleet_information(self):
+        return self.devices
+
+@pytest.fixture
+def clock():
+    return MockClock(datetime(2024, 1, 1, 3, 0))
+
+@pytest.fixture
+def send():
+    return MockSend()
+
+@pytest.fixture
+def tracker(send):
+    return CommandTracker(send, ack_timeout=10, command_timeout=100, max_retries=1)
+
+@pytest.fixture
+def fleet():
+    return MockFleet()
+
+def scheduler(fleet, tracker, clock, **kwargs):
+    settings = {"threshold": 80, "critical_threshold": 95, "concurrency": 2,
+                "idle_window": parse_window("01:00-05:00"), "min_interval": 3600}
+    settings.update(kwargs)
+    return GarbageCollectionScheduler(fleet, tracker, clock=clock, **settings)
+
+def finish(tracker, send):
+    for _, command in send.sent:
+        tracker.update({"command_id": command["command_id"], "state": "succeeded"})
+
+def test_parse_window():
+    assert parse_window("22:00-04:30") == (time(22, 0), time(4, 30))
+    with pytest.raises(ValueError):
+        parse_window("22-04")
+
+def test_in_window():
+    assert in_window(parse_window("01:00-05:00"), time(3, 0))
+    assert not in_window(parse_window("01:00-05:00"), time(5, 0))
+    assert in_window(parse_window("22:00-04:00"), time(23, 0))
+    assert in_window(parse_window("22:00-04:00"), time(1, 0))
+    assert not in_window(parse_window("22:00-04:00"), time(12, 0))
+    assert in_window(None, time(12, 0))
+
+def test_devices_above_threshold_are_collected(fleet, tracker, clock, send):
+    fleet.add("full", 85)
+    fleet.add("empty", 20)
+    fleet.add("offline", 90, online=False)
+    fleet.add("unknown", None)
+
+    assert scheduler(fleet, tracker, clock).schedule() == ["full"]
+    assert send.sent[0][1]["command"] == "garbage_collect"
+
+def test_concurrency_limit_prefers_fullest_devices(fleet, tracker, clock, send):
+    gc = scheduler(fleet, tracker, clock)
+    for device_id, disk_percent in (("a", 81), ("b", 90), ("c", 85)):
+        fleet.add(device_id, disk_percent)
+
+    assert gc.schedule() == ["b", "c"]
+    assert gc.schedule() == []
+
+    finish(tracker, send)
+    assert gc.schedule() == ["a"]
+    assert gc.status()["running"].keys() == {"a"}
+
+def test_outside_idle_window_only_critical_devices(fleet, tracker, clock):
+    clock.now = datetime(2024, 1, 1, 12, 0)
+    fleet.add("full", 85)
+    fleet.add("critical", 97)
+
+    assert scheduler(fleet, tracker, clock).schedule() == ["critical"]
+
+def test_min_interval_between_collections(fleet, tracker, clock, send):
+    gc = scheduler(fleet, tracker, clock)
+    fleet.add("full", 85)
+
+    assert gc.schedule() == ["full"]
+    finish(tracker, send)
+    clock.now += timedelta(minutes=30)
+    assert gc.schedule() == []
+    clock.now += timedelta(minutes=31)
+    assert gc.schedule() == ["full"]
+
+def test_devices_with_running_commands_are_skipped(fleet, tracker, clock):
+    fleet.add("busy", 85)
+    tracker.submit("busy", {"command": "update_container", "id": "busy", "container_name": "web"})
+
+    assert scheduler(fleet, tracker, clock).schedule() == []
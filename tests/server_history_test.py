@@ -0,0 +1,35 @@
+# pylint: skip-file
+
+import json
+import zlib
+
+import pytest
+
+from server.history import decode_backlog
+
+def compressed(backlog):
+    return zlib.compress(json.dumps(backlog).encode())
+
+def test_backlog_is_decoded():
+    backlog = {"id": "device", "entries": [{"timestamp": 1, "cpu_load": 5, "memory_usage": 10}]}
+    assert decode_backlog(compressed(backlog), 1024) == backlog
+
+def test_backlog_larger_than_limit_is_rejected():
+    # Highly compressible, a few kilobytes expand to several megabytes
+    payload = zlib.compress(b" " * 8 * 1024 * 1024)
+    with pytest.raises(ValueError, match="exceeds"):
+        decode_backlog(payload, 1024 * 1024)
+
+@pytest.mark.parametrize("payload", [
+    "not binary",
+    b"not compressed",
+    zlib.compress(b"not json"),
+    zlib.compress(b"\xff\xfe"),
+    compressed(["device"]),
+    compressed({"id": "device"}),
+    compressed({"id": "device", "entries": [{"cpu_load": 5}]}),
+    compressed({"id": 1, "entries": []})
+])
+def test_invalid_backlog_is_rejected(payload):
+    with pytest.raises(ValueError):
+        decode_backlog(payload, 1024)
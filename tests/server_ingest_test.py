@@ -0,0 +1,54 @@
+# pylint: skip-file
+
+from server.ingest import TelemetryIngest
+
+class MockFleet():
+    def __init__(self) -> None:
+        self.batches = []
+
+    def add_telemetry_batch(self, telemetry_batch):
+        self.batches.append(telemetry_batch)
+
+def test_posts_are_applied_as_one_batch():
+    mock_fleet = MockFleet()
+    ingest = TelemetryIngest(mock_fleet, 0.25, 10)
+
+    assert ingest.submit({"id": "device-1"})
+    assert ingest.submit({"id": "device-2"})
+
+    assert ingest.flush() == 2
+    assert mock_fleet.batches == [[{"id": "device-1"}, {"id": "device-2"}]]
+
+def test_latest_post_from_device_is_kept():
+    mock_fleet = MockFleet()
+    ingest = TelemetryIngest(mock_fleet, 0.25, 10)
+
+    ingest.submit({"id": "device-1", "cpu_load": 1})
+    ingest.submit({"id": "device-2", "cpu_load": 2})
+    ingest.submit({"id": "device-1", "cpu_load": 3})
+
+    assert ingest.queue_depth() == 2
+    ingest.flush()
+    assert mock_fleet.batches == [[{"id": "device-2", "cpu_load": 2}, {"id": "device-1", "cpu_load": 3}]]
+
+def test_empty_queue_is_not_applied():
+    mock_fleet = MockFleet()
+    ingest = TelemetryIngest(mock_fleet, 0.25, 10)
+
+    assert ingest.flush() == 0
+    assert mock_fleet.batches == []
+
+def test_full_queue_rejects_new_devices():
+    mock_fleet = MockFleet()
+    ingest = TelemetryIngest(mock_fleet, 0.25, 2)
+
+    assert ingest.submit({"id": "device-1"})
+    assert ingest.submit({"id": "device-2"})
+    assert ingest.submit({"id": "device-3"}) is False
+    assert ingest.rejected == 1
+
+    # Devices already in the queue can still replace their post
+    assert ingest.submit({"id": "device-1"})
+
+    ingest.flush()
+    assert ingest.submit({"id": "device-3"})
@@ -0,0 +1,80 @@
+# pylint: skip-file
+
+import pytest
+
+from server.labels import LabelIndex, matches, parse_selector
+
+def test_parse_selector():
+    assert parse_selector("site=lab, arch!=arm64,gpu,!spare") == [
+        ("site", "=", "lab"),
+        ("arch", "!=", "arm64"),
+        ("gpu", "exists", None),
+        ("spare", "!exists", None)
+    ]
+
+@pytest.mark.parametrize("selector", ["", ",", "=lab", "si te=lab", "!"])
+def test_invalid_selectors_are_rejected(selector):
+    with pytest.raises(ValueError):
+        parse_selector(selector)
+
+def test_matches_without_index():
+    labels = {"site": "lab", "arch": "arm64"}
+    assert matches(parse_selector("site=lab"), labels)
+    assert matches(parse_selector("site=lab,!gpu"), labels)
+    assert not matches(parse_selector("site=lab,arch!=arm64"), labels)
+    assert not matches(parse_selector("gpu"), labels)
+
+def create_index():
+    index = LabelIndex()
+    index.update("device-1", {"site": "lab", "arch": "arm64"})
+    index.update("device-2", {"site": "lab", "arch": "amd64", "gpu": "true"})
+    index.update("device-3", {"site": "office", "arch": "arm64"})
+    index.update("device-4", {})
+    return index
+
+def test_select():
+    index = create_index()
+    assert index.select(parse_selector("site=lab")) == {"device-1", "device-2"}
+    assert index.select(parse_selector("site=lab,arch=arm64")) == {"device-1"}
+    assert index.select(parse_selector("arch!=arm64")) == {"device-2", "device-4"}
+    assert index.select(parse_selector("gpu")) == {"device-2"}
+    assert index.select(parse_selector("!site")) == {"device-4"}
+    assert index.select(parse_selector("site=unknown")) == set()
+
+def test_updates_and_removals_are_reflected():
+    index = create_index()
+    index.update("device-1", {"site": "office"})
+    index.remove("device-2")
+    assert index.select(parse_selector("site=office")) == {"device-1", "device-3"}
+    assert index.select(parse_selector("site=lab")) == set()
+    assert index.labels() == {"site": ["office"], "arch": ["arm64"]}
+
+class UntouchableDict(dict):
+    def __getitem__(self, key):
+        raise AssertionError("Device labels read during selection")
+
+    def get(self, key, default=None):
+        raise AssertionError("Device labels read during selection")
+
+    def __iter__(self):
+        raise AssertionError("Device labels iterated during selection")
+
+    def items(self):
+        raise AssertionError("Device labels iterated during selection")
+
+def test_selection_agrees_with_scan_on_large_fleet():
+    index = LabelIndex()
+    fleet = {}
+    for number in range(10000):
+        labels = {"site": f"site-{number % 20}", "arch": ("arm64", "amd64")[number % 2]}
+        if number % 7 == 0:
+            labels["gpu"] = "true"
+        fleet[f"device-{number}"] = labels
+        index.update(f"device-{number}", labels)
+
+    # The selection is made on the index alone, the labels of the devices are not looked at
+    index._labels = UntouchableDict(index._labels)
+
+    requirements = parse_selector("site=site-3,arch=arm64,!gpu")
+    assert index.select(requirements) == {device_id for device_id, labels in fleet.items()
+                                          if matches(requirements, labels)}
@@ -0,0 +1,81 @@
+# pylint: skip-file
+
+import os
+import threading
+import time
+
+import pytest
+from server.profiler import MAX_DURATION, SamplingProfiler, collapse
+
+def busy_function(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+def test_collapse_lists_outermost_frame_first():
+    def inner():
+        import sys
+        return collapse(sys._getframe())
+
+    stack = inner().split(";")
+    assert stack[-1].startswith("inner (server_profiler_test.py:")
+    assert stack[-2].startswith("test_collapse_lists_outermost_frame_first (")
+
+def test_profile_samples_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_function, args=(stop,), name="worker")
+    worker.start()
+    try:
+        collapsed = SamplingProfiler().profile(0.2, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = collapsed.splitlines()
+    assert any(line.startswith("worker;") and "busy_function" in line for line in lines)
+    assert not any(line.startswith("profiler;") for line in lines)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+
+def test_only_one_profile_at_a_time():
+    profiler = SamplingProfiler()
+    profiler.start(0.2)
+    with pytest.raises(RuntimeError):
+        profiler.start(0.2)
+    while profiler.running:
+        time.sleep(0.01)
+    assert profiler.samples > 0
+
+def test_duration_is_bounded():
+    durations = []
+    class StopClock():
+        def __init__(self):
+            self.now = 0
+        def __call__(self):
+            return self.now
+
+    clock = StopClock()
+    def sleep(interval):
+        clock.now += interval
+        durations.append(interval)
+
+    profiler = SamplingProfiler(sleep=sleep, clock=clock)
+    profiler.profile(3600, interval=10)
+    assert clock.now == MAX_DURATION
+    assert len(durations) == MAX_DURATION / 10
+
+@pytest.mark.parametrize("duration, interval", [
+    (float("inf"), 0.01), (float("nan"), 0.01), (-1, 0.01), (0, 0.01),
+    (1, float("nan")), (1, 0), (1, -0.01)
+])
+def test_invalid_parameters_are_rejected(duration, interval):
+    profiler = SamplingProfiler()
+    with pytest.raises(ValueError):
+        profiler.start(duration, interval)
+    assert not profiler.running
+
+def test_client_profiler_is_kept_identical():
+    root = os.path.join(os.path.dirname(__file__), "..")
+    with open(os.path.join(root, "server", "profiler.py"), encoding="utf-8") as stream:
+        server = stream.read().replace("client", "<other>")
+    with open(os.path.join(root, "client", "profiler.py"), encoding="utf-8") as stream:
+        client = stream.read().replace("server", "<other>")
+    assert server == client
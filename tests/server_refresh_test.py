@@ -0,0 +1,66 @@
+# pylint: skip-file
+
+import pytest
+from server.refresh import RefreshCoordinator
+from tests.mock.mock_clock import MockClock
+from tests.mock.mock_send import MockSend
+
+@pytest.fixture
+def clock():
+    return MockClock()
+
+@pytest.fixture
+def send():
+    return MockSend()
+
+@pytest.fixture
+def coordinator(send, clock):
+    return RefreshCoordinator(send, clock=clock)
+
+def test_refresh_is_sent_in_one_message(coordinator, send):
+    refresh_id = coordinator.start(["b", "a"])
+    assert send.sent == [{"refresh_id": refresh_id, "devices": ["a", "b"]}]
+
+def test_refresh_of_all_devices_has_no_device_list(coordinator, send):
+    refresh_id = coordinator.start(["a", "b"], all_devices=True)
+    assert send.sent == [{"refresh_id": refresh_id, "devices": None}]
+    assert coordinator.result(refresh_id)["missing"] == ["a", "b"]
+
+def test_gather_returns_when_all_devices_answered(coordinator, clock):
+    refresh_id = coordinator.start(["a", "b"])
+    sleeps = []
+    def sleep(duration):
+        sleeps.append(duration)
+        clock.now += duration
+        coordinator.answer(["a", "b"][len(sleeps) - 1], refresh_id)
+
+    result = coordinator.gather(refresh_id, deadline=10, sleep=sleep, poll_interval=1)
+    assert result["complete"]
+    assert result["missing"] == []
+    assert result["answered"] == {"a": 1, "b": 2}
+    assert len(sleeps) == 2
+
+def test_gather_lists_missing_devices_after_deadline(coordinator, clock):
+    refresh_id = coordinator.start(["a", "b"])
+    coordinator.answer("a", refresh_id)
+    def sleep(duration):
+        clock.now += duration
+
+    result = coordinator.gather(refresh_id, deadline=2, sleep=sleep, poll_interval=0.5)
+    assert not result["complete"]
+    assert result["missing"] == ["b"]
+    assert result["elapsed"] == 2
+
+def test_answers_to_unknown_refreshes_and_devices_are_ignored(coordinator):
+    refresh_id = coordinator.start(["a"])
+    coordinator.answer("a", "unknown")
+    coordinator.answer("c", refresh_id)
+    assert coordinator.result(refresh_id)["answered"] == {}
+    assert coordinator.result("unknown") is None
+
+def test_history_is_bounded(send, clock):
+    coordinator = RefreshCoordinator(send, history_size=2, clock=clock)
+    first = coordinator.start(["a"])
+    coordinator.start(["a"])
+    coordinator.start(["a"])
+    assert coordinator.result(first) is None
@@ -0,0 +1,61 @@
+# pylint: skip-file
+
+from http import HTTPStatus
+
+import pytest
+
+from server.docker_hub import DockerHub
+from server.registry_webhook import parse_push_notification
+from tests.mock.mock_registry_webhook import docker_hub_payload, registry_payload
+from tests.mock.mock_requests_get import MockHttpGet
+from tests.mock.mock_response import MockResponse
+
+def manifest_response(digest):
+    return lambda: MockResponse(
+        response={"config": {"digest": digest}},
+        status_code=HTTPStatus.ACCEPTED
+    )
+
+def test_parses_docker_hub_payload():
+    payload = docker_hub_payload("rikpet/fleet-manager", "fm-server")
+    assert parse_push_notification(payload) == [("rikpet/fleet-manager", "fm-server")]
+
+def test_parses_registry_payload_and_skips_untagged_pushes():
+    payload = registry_payload("rikpet/fleet-manager", "fm-client")
+    assert parse_push_notification(payload) == [("rikpet/fleet-manager", "fm-client")]
+
+def test_ignores_registry_pull_events():
+    payload = registry_payload("rikpet/fleet-manager", "fm-client")
+    for event in payload["events"]:
+        event["action"] = "pull"
+    assert parse_push_notification(payload) == []
+
+@pytest.mark.parametrize("payload", [
+    None, [], {}, {"push_data": {}, "repository": {}},
+    {"push_data": {"tag": ["beta"]}, "repository": {"repo_name": "rikpet/fleet-manager"}},
+    {"events": "push"},
+    {"events": ["push"]},
+    {"events": [{"action": "push", "target": "rikpet/fleet-manager:beta"}]},
+    {"events": [{"action": "push", "target": {"repository": None, "tag": "beta"}}]}
+])
+def test_rejects_invalid_payloads(payload):
+    with pytest.raises(ValueError):
+        parse_push_notification(payload)
+
+def test_refresh_bypasses_cache():
+    http_get = MockHttpGet(response=manifest_response("ABCDE"))
+    docker_hub = DockerHub(http_get, "username", "password", "rikpet/fleet-manager")
+    assert docker_hub.get_remote_image_sha("rikpet/fleet-manager", "fm-server") == "ABCDE"
+    version = docker_hub.version
+
+    http_get.response = manifest_response("BCDEF")
+    assert docker_hub.get_remote_image_sha("rikpet/fleet-manager", "fm-server") == "ABCDE"
+    assert docker_hub.refresh_remote_image_sha("rikpet/fleet-manager", "fm-server") == "BCDEF"
+    assert docker_hub.version == version + 1
+
+def test_reconciliation_interval_extends_cache_time():
+    http_get = MockHttpGet(response=manifest_response("ABCDE"))
+    docker_hub = DockerHub(http_get, "username", "password", "rikpet/fleet-manager")
+    docker_hub.reconciliation_interval = 3600
+    docker_hub.get_remote_image_sha("rikpet/fleet-manager", "fm-server")
+    assert docker_hub.cache_time == 3600
@@ -0,0 +1,41 @@
+# pylint: skip-file
+
+from server.tag_catalogue import TagCatalogue, parse_semver
+
+def test_parse_semver():
+    assert parse_semver("1.2.3") == ("", (1, 2, 3, True, ""))
+    assert parse_semver("v1.2.3") == ("", (1, 2, 3, True, ""))
+    assert parse_semver("fm-server-1.10.0-beta.1") == ("fm-server-", (1, 10, 0, False, "beta.1"))
+    assert parse_semver("fm-server-stable") is None
+
+def test_prefix_query():
+    catalogue = TagCatalogue()
+    catalogue.add(["fm-server-beta", "fm-client-beta", "fm-server-stable", "latest"])
+    assert catalogue.tags("fm-server-") == ["fm-server-beta", "fm-server-stable"]
+    assert catalogue.tags("fm-") == ["fm-client-beta", "fm-server-beta", "fm-server-stable"]
+    assert catalogue.tags("missing") == []
+    assert len(catalogue) == 4
+    assert "latest" in catalogue
+
+def test_versions_are_sorted_by_version():
+    catalogue = TagCatalogue()
+    catalogue.add(["1.10.0", "1.2.0", "1.2.0-rc.1", "1.9.3", "fm-server-2.0.0"])
+    assert catalogue.versions() == ["1.2.0", "1.9.3", "1.10.0"]
+    assert catalogue.versions(prereleases=True) == ["1.2.0-rc.1", "1.2.0", "1.9.3", "1.10.0"]
+    assert catalogue.latest() == "1.10.0"
+    assert catalogue.latest("fm-server-") == "fm-server-2.0.0"
+    assert catalogue.latest("fm-client-") is None
+
+def test_adding_known_tags_does_not_duplicate():
+    catalogue = TagCatalogue()
+    catalogue.add(["1.0.0", "beta"])
+    catalogue.add(["1.0.0", "beta"])
+    assert catalogue.tags() == ["1.0.0", "beta"]
+    assert catalogue.versions() == ["1.0.0"]
+
+def test_retain_removes_deleted_tags():
+    catalogue = TagCatalogue()
+    catalogue.add(["1.0.0", "1.1.0", "beta"])
+    catalogue.retain({"1.1.0"})
+    assert catalogue.tags() == ["1.1.0"]
+    assert catalogue.versions() == ["1.1.0"]
@@ -0,0 +1,147 @@
+# pylint: skip-file
+
+import json
+import time
+
+from server.tracing import MAX_SPAN_NAMES, Tracer, valid_span
+from tests.mock.mock_clock import MockClock
+
+def client_span(name, duration, device_id, trace_id="trace"):
+    return {
+        "trace_id": trace_id, "span_id": name, "parent_id": None, "name": name,
+        "service": "client", "start": 0, "duration": duration,
+        "attributes": {"device_id": device_id}, "error": None
+    }
+
+def test_nested_spans_share_trace():
+    clock = MockClock()
+    tracer = Tracer("server", clock=clock)
+
+    with tracer.span("container_command", device_id="a") as parent:
+        clock.now = 1
+        with tracer.span("send_command") as child:
+            clock.now = 3
+
+    assert child.trace_id == parent.trace_id
+    assert child.parent_id == parent.span_id
+    assert tracer.current() is None
+    summary = tracer.summary()
+    assert summary["container_command"]["sum"] == 3
+    assert summary["send_command"]["sum"] == 2
+
+def test_span_continues_propagated_context():
+    tracer = Tracer("server")
+    span = tracer.span("telemetry", {"trace_id": "trace", "span_id": "command"})
+    recorded = span.end()
+
+    assert recorded["trace_id"] == "trace"
+    assert recorded["parent_id"] == "command"
+    assert recorded["service"] == "server"
+
+def test_span_records_error():
+    tracer = Tracer("server")
+    try:
+        with tracer.span("container_command") as span:
+            raise ValueError("failed")
+    except ValueError:
+        pass
+    assert span.error == "failed"
+    assert tracer.current() is None
+
+def test_summary_per_device_and_slowest_devices():
+    tracer = Tracer("server")
+    tracer.record(client_span("pulling", 10, "slow"))
+    tracer.record(client_span("pulling", 20, "slow"))
+    tracer.record(client_span("pulling", 2, "fast"))
+    tracer.record(client_span("starting", 1, "fast"))
+
+    assert tracer.summary("slow")["pulling"]["count"] == 2
+    assert "starting" not in tracer.summary("slow")
+    assert tracer.summary()["pulling"]["count"] == 3
+    assert tracer.slowest_devices("pulling") == [
+        {"device_id": "slow", "count": 2, "mean": 15},
+        {"device_id": "fast", "count": 1, "mean": 2}
+    ]
+    assert tracer.slowest_devices("pulling", count=1)[0]["device_id"] == "slow"
+
+def test_spans_are_written_to_file(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer("server", str(path))
+    tracer.record(client_span("pulling", 10, "device"))
+    with tracer.span("container_command"):
+        pass
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["pulling", "container_command"]
+
+def test_held_root_span_ends_with_telemetry():
+    clock = MockClock()
+    tracer = Tracer("server", clock=clock)
+
+    with tracer.span("container_command", device_id="a") as root:
+        tracer.hold(root)
+    assert "container_command" not in tracer.summary()
+
+    clock.now = 5
+    tracer.finish({**root.context(), "ended": time.time() - 2}, "a")
+
+    summary = tracer.summary()
+    assert summary["container_command"]["sum"] == 5
+    assert 2 <= summary["telemetry"]["sum"] < 3
+    assert not tracer.is_held(root)
+
+    # A second post with the same context does not end the root span again
+    tracer.finish(root.context(), "a")
+    assert tracer.summary()["container_command"]["count"] == 1
+
+def test_telemetry_span_from_skewed_client_clock_is_not_negative():
+    tracer = Tracer("server")
+    tracer.finish({"trace_id": "trace", "span_id": "command", "ended": time.time() + 60}, "a")
+    assert tracer.summary()["telemetry"]["sum"] == 0
+
+def test_failed_held_span_ends_right_away():
+    tracer = Tracer("server")
+    try:
+        with tracer.span("container_command") as root:
+            tracer.hold(root)
+            raise ValueError("failed")
+    except ValueError:
+        pass
+    assert tracer.summary()["container_command"]["count"] == 1
+    assert not tracer.is_held(root)
+
+def test_held_spans_are_bounded():
+    tracer = Tracer("server", max_held=2)
+    spans = [tracer.span("container_command") for _ in range(3)]
+    for span in spans:
+        tracer.hold(span)
+    assert not tracer.is_held(spans[0])
+    assert tracer.is_held(spans[2])
+
+def test_malformed_client_spans_are_not_valid():
+    assert valid_span(client_span("pulling", 10, "device"))
+    assert not valid_span("pulling")
+    assert not valid_span({**client_span("pulling", 10, "device"), "name": None})
+    assert not valid_span({**client_span("pulling", 10, "device"), "name": "x" * 65})
+    assert not valid_span({**client_span("pulling", 10, "device"), "duration": float("nan")})
+    assert not valid_span({**client_span("pulling", 10, "device"), "duration": -1})
+    assert not valid_span({**client_span("pulling", 10, "device"), "duration": "10"})
+    assert not valid_span({**client_span("pulling", 10, "device"), "attributes": None})
+    span = client_span("pulling", 10, "device")
+    del span["trace_id"]
+    assert not valid_span(span)
+
+def test_span_names_are_bounded():
+    tracer = Tracer("server")
+    for index in range(MAX_SPAN_NAMES + 10):
+        tracer.record(client_span(f"step-{index}", 1, "device"))
+    assert len(tracer.summary()) == MAX_SPAN_NAMES
+    assert len(tracer.summary("device")) == MAX_SPAN_NAMES
+
+def test_forgotten_device_has_no_histograms():
+    tracer = Tracer("server")
+    tracer.record(client_span("pulling", 10, "device"))
+    tracer.forget("device")
+    assert tracer.summary("device") == {}
+    assert tracer.slowest_devices("pulling") == []
+    assert tracer.summary()["pulling"]["count"] == 1
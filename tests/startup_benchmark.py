@@ -0,0 +1,132 @@
+"""Benchmark of the time the server and the client take from process start to serving.
+
+The server is serving when it answers ``GET /fleet``. The client is serving when its first
+telemetry post has reached a server started by the benchmark, which needs Docker on the
+machine. The benchmark fails if the startup takes longer than the threshold.
+
+Usage: ``python tests/startup_benchmark.py server|client [--threshold seconds]``
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from http import HTTPStatus
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_PORT = 5000
+FLEET_URL = f'http://127.0.0.1:{SERVER_PORT}/fleet'
+THRESHOLDS = {"server": 5.0, "client": 10.0}
+# The server refuses to start without Docker hub settings. Nothing on the way to serving
+# talks to Docker hub, placeholders are used unless real settings are in the environment
+SERVER_ENV = {
+    name: os.getenv(name, "startup-benchmark")
+    for name in ("DOCKER_HUB_USERNAME", "DOCKER_HUB_PASSWORD", "DOCKER_HUB_REPO")
+}
+
+def start(application: str, env: dict = None) -> subprocess.Popen:
+    """Starts the server or the client as a separate process
+
+    Args:
+        application (str): ``server`` or ``client``
+        env (dict, optional): Additional environment variables. Defaults to None.
+
+    Returns:
+        subprocess.Popen: Started process
+    """
+    return subprocess.Popen(
+        [sys.executable, "app.py"], cwd=os.path.join(ROOT, application),
+        env={**os.environ, **({} if env is None else env)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def wait_for(ready: object, process: subprocess.Popen, timeout: float) -> float:
+    """Waits until a process is serving
+
+    Args:
+        ready (callable): Returns True when the process is serving
+        process (subprocess.Popen): Process, which must not exit meanwhile
+        timeout (float): Time in seconds to give up after
+
+    Raises:
+        RuntimeError: If the process exits or is not serving before the timeout
+
+    Returns:
+        float: Time in seconds until the process was serving
+    """
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f'Process exited with code {process.returncode}')
+        try:
+            if ready():
+                return time.monotonic() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f'Not serving after {timeout} seconds')
+
+def server_serving() -> bool:
+    """Checks if the server answers fleet requests
+
+    Returns:
+        bool: If the server is serving
+    """
+    return requests.get(FLEET_URL, timeout=1).status_code == HTTPStatus.OK
+
+def client_serving() -> bool:
+    """Checks if a device has posted telemetry to the server
+
+    Returns:
+        bool: If the client is serving
+    """
+    return len(requests.get(FLEET_URL, timeout=1).json()) > 0
+
+def benchmark(application: str) -> float:
+    """Measures the time from process start to serving
+
+    Args:
+        application (str): ``server`` or ``client``
+
+    Returns:
+        float: Startup time in seconds
+    """
+    processes = []
+    try:
+        server = start("server", SERVER_ENV)
+        processes.append(server)
+        server_startup = wait_for(server_serving, server, 60)
+        if application == "server":
+            return server_startup
+
+        client = start("client", {
+            "FLEET_MANAGER_SERVER_ADDRESS": "127.0.0.1",
+            "FLEET_MANAGER_SERVER_PORT": str(SERVER_PORT)
+        })
+        processes.append(client)
+        return wait_for(client_serving, client, 60)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+def main() -> int:
+    """Main function
+
+    Returns:
+        int: Exit code, 1 if the startup took longer than the threshold
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("application", choices=sorted(THRESHOLDS))
+    parser.add_argument("--threshold", type=float, help="Maximum startup time in seconds")
+    args = parser.parse_args()
+    threshold = THRESHOLDS[args.application] if args.threshold is None else args.threshold
+
+    startup = benchmark(args.application)
+    print(f'{args.application} serving after {startup:.2f} s, threshold {threshold:.2f} s')
+    return 0 if startup <= threshold else 1
+
+if __name__ == '__main__':
+    sys.exit(main())